@@ -1,10 +1,27 @@
 import io as std_io  # 重命名标准库io，避免冲突
 import torch
-import requests
-import torchaudio
 from typing_extensions import override
 from comfy_api.latest import ComfyExtension, io  # ComfyUI的io模块
-import comfy.model_management
+from . import metrics
+from .url_cache import get_cache
+from .tensor_cache import outputs as output_cache
+from .audio_resample import resample
+from .decode_pool import offload_audio
+# requests / torchaudio / soundfile 导入较慢，首次执行节点时才导入（不拖慢 ComfyUI 启动和节点注册）
+
+# 适配阿里云OSS的请求头
+_AUDIO_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "audio/mpeg,audio/wav,audio/flac,audio/ogg;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": "identity",  # 禁用压缩，避免二进制数据损坏
+}
+
+# 下载参数（输入预取使用相同的参数，与节点共享同一次下载）
+AUDIO_FETCH_OPTIONS = {
+    "headers": _AUDIO_HEADERS,
+    "timeout": 60,  # 延长超时时间（适配阿里云OSS）
+    "verify": False,  # 忽略SSL校验（阿里云OSS无需校验）
+}
 
 # 仅支持URL加载的音频节点（修复命名冲突+适配阿里云OSS）
 class LoadAudioFromURL(io.ComfyNode):
@@ -17,30 +34,63 @@ class LoadAudioFromURL(io.ComfyNode):
                 io.String.Input(
                     "audio_url",
                     default="",
-                    tooltip="音频文件的URL地址（支持MP3/WAV/FLAC等主流格式，输出将适配16000Hz采样率）"
+                    tooltip="音频文件的URL地址（支持MP3/WAV/FLAC等主流格式）"
+                ),
+                io.Int.Input(
+                    "target_sample_rate",
+                    default=16000,
+                    min=0,
+                    max=192000,
+                    optional=True,
+                    tooltip="输出采样率（Hz），默认16000适配音频编码器；0表示保持原采样率"
+                ),
+                io.Float.Input(
+                    "offset",
+                    default=0.0,
+                    min=0.0,
+                    step=0.01,
+                    optional=True,
+                    tooltip="片段起始位置（秒）"
+                ),
+                io.Float.Input(
+                    "duration",
+                    default=0.0,
+                    min=0.0,
+                    step=0.01,
+                    optional=True,
+                    tooltip="片段时长（秒），0表示读到结尾；WAV/FLAC只下载片段对应的数据"
                 ),
             ],
             outputs=[io.Audio.Output()],
         )
 
     @classmethod
-    def execute(cls, audio_url) -> io.NodeOutput:
+    @metrics.instrument("LoadAudioFromURL", "audio_url")
+    def execute(cls, audio_url, target_sample_rate=16000, offset=0.0, duration=0.0) -> io.NodeOutput:
         # 校验URL非空
         if not audio_url or not audio_url.strip():
             raise ValueError("音频URL不能为空，请填写有效的音频文件地址")
         
-        # 核心逻辑：从URL加载音频并标准化
-        waveform, sample_rate = cls._load_audio_from_url(audio_url.strip())
+        audio_url = audio_url.strip()
+        cache_key = None
+        if offset > 0 or duration > 0:
+            # 只需要片段时按字节区间读取，传输和解码量与片段长度成正比
+            waveform, sample_rate = cls._load_audio_window(audio_url, offset, duration)
+        else:
+            entry = cls._fetch_audio(audio_url)
+            
+            # 内容与参数都未变化时直接复用上次的输出（跳过解码和重采样）
+            cache_key = ("LoadAudioFromURL", entry.sha256, target_sample_rate)
+            cached = output_cache.get(cache_key)
+            if cached is not None:
+                return io.NodeOutput(cached)
+            
+            # 核心逻辑：从URL加载音频并标准化
+            waveform, sample_rate = cls._load_audio_from_url(audio_url, entry)
         
-        # 适配代码库中音频编码器的采样率（统一转为16000Hz）
-        target_sample_rate = 16000
-        if sample_rate != target_sample_rate:
-            waveform = torchaudio.functional.resample(
-                waveform,
-                orig_freq=sample_rate,
-                new_freq=target_sample_rate,
-                resampling_method="sinc_interpolation"
-            )
+        # 重采样到目标采样率（默认16000Hz适配代码库中的音频编码器；卷积核按采样率组合缓存，长音频分块处理）
+        if target_sample_rate and sample_rate != target_sample_rate:
+            waveform = resample(waveform, sample_rate, target_sample_rate)
             sample_rate = target_sample_rate
 
         # 标准化输出格式 [B, C, T]（兼容AudioInput类型定义）
@@ -50,6 +100,7 @@ class LoadAudioFromURL(io.ComfyNode):
             waveform = waveform.unsqueeze(0)  # [C,T] -> [1,C,T]
         
         # 移至合适的设备（兼容ComfyUI模型管理逻辑）
+        import comfy.model_management
         waveform = waveform.to(comfy.model_management.intermediate_device())
 
         # 输出格式严格匹配AudioInput TypedDict
@@ -57,66 +108,100 @@ class LoadAudioFromURL(io.ComfyNode):
             "waveform": waveform,
             "sample_rate": sample_rate
         }
+        if cache_key is not None:
+            output_cache.put(cache_key, audio_output)
         return io.NodeOutput(audio_output)
 
     @staticmethod
-    def _load_audio_from_url(url: str) -> tuple[torch.Tensor, int]:
-        """从URL加载音频的核心方法，适配阿里云OSS等存储服务"""
+    def _fetch_audio(url: str):
+        """下载音频到共享缓存，适配阿里云OSS等存储服务（已缓存时仅发送条件请求）"""
+        import requests
         try:
-            # 构建适配阿里云OSS的请求头
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "audio/mpeg,audio/wav,audio/flac,audio/ogg;q=0.9,*/*;q=0.8",
-                "Accept-Encoding": "identity",  # 禁用压缩，避免二进制数据损坏
-                "Range": "bytes=0-"  # 支持分块下载，适配大文件
-            }
-            # 发送HTTP请求获取音频二进制数据（增加超时重试）
+            # 下载到共享缓存（增加超时重试）
             max_retries = 2
             for retry in range(max_retries + 1):
                 try:
-                    response = requests.get(
-                        url,
-                        stream=True,
-                        timeout=60,  # 延长超时时间（适配阿里云OSS）
-                        headers=headers,
-                        verify=False,  # 忽略SSL校验（阿里云OSS无需校验）
-                        allow_redirects=True  # 允许重定向
-                    )
-                    response.raise_for_status()
-                    break  # 成功则退出重试
+                    return get_cache().fetch(url, **AUDIO_FETCH_OPTIONS)
                 except requests.exceptions.RequestException as e:
                     if retry == max_retries:
                         raise e
                     import time
                     time.sleep(1)  # 重试前等待1秒
+        except Exception as e:
+            raise _audio_load_error(e, url)
 
-            # 读取二进制数据（使用标准库io，避免命名冲突）
-            audio_bytes = std_io.BytesIO(response.content)
-            audio_bytes.seek(0)  # 重置文件指针到开头
-            
-            # 加载音频（指定格式，适配WAV文件）
-            waveform, sample_rate = torchaudio.load(
-                audio_bytes,
-                format="wav" if url.lower().endswith(".wav") else None
-            )
+    @staticmethod
+    def _load_audio_from_url(url: str, entry=None) -> tuple[torch.Tensor, int]:
+        """从URL加载音频的核心方法（entry 为已下载的缓存记录时直接解码）"""
+        if entry is None:
+            entry = LoadAudioFromURL._fetch_audio(url)
+        try:
+            with metrics.phase("decode"):
+                # MP3/M4A/FLAC 等压缩格式交给解码进程（启用时），结果直接映射为张量
+                decoded = offload_audio(entry.path)
+            if decoded is not None:
+                return decoded
+            import torchaudio
+            # 直接从缓存文件加载音频（指定格式，适配WAV文件）
+            with metrics.phase("decode"):
+                waveform, sample_rate = torchaudio.load(
+                    entry.path,
+                    format="wav" if url.lower().endswith(".wav") else None
+                )
             
             return waveform, sample_rate
-        
-        except requests.exceptions.Timeout:
-            raise RuntimeError(f"加载音频超时：URL={url}（超时时间60秒）")
-        except requests.exceptions.HTTPError as e:
-            raise RuntimeError(f"URL返回错误状态码：{e.response.status_code}，URL={url}")
-        except requests.exceptions.ConnectionError:
-            raise RuntimeError(f"无法连接到音频服务器：URL={url}")
         except Exception as e:
-            # 通用异常捕获，输出详细错误信息
-            error_detail = str(e)
-            if "metadata" in error_detail.lower() or "audio" in error_detail.lower():
-                raise RuntimeError(f"URL不是有效的音频文件：{url}，错误信息：{error_detail}")
-            elif "BytesIO" in error_detail:
-                raise RuntimeError(f"音频数据读取失败（命名冲突）：{url}，错误信息：{error_detail}")
-            else:
-                raise RuntimeError(f"从URL加载音频失败：{error_detail}，URL={url}")
+            raise _audio_load_error(e, url)
+
+
+    @staticmethod
+    def _load_audio_window(url: str, offset: float, duration: float) -> tuple[torch.Tensor, int]:
+        """加载 [offset, offset+duration) 片段：已缓存时从缓存文件读取，否则通过 Range 请求只下载所需部分"""
+        import soundfile as sf
+        from .audio_window import HTTPRangeFile, RangeNotSupported, read_window
+        if get_cache().lookup(url) is None:
+            try:
+                with HTTPRangeFile(url, headers=_AUDIO_HEADERS, timeout=60, verify=False) as fp:
+                    return read_window(fp, offset, duration)
+            except (RangeNotSupported, sf.LibsndfileError):
+                # 服务器不支持Range，或 soundfile 无法解码的格式（如M4A）：退回完整下载
+                pass
+            except Exception as e:
+                raise _audio_load_error(e, url)
+
+        entry = LoadAudioFromURL._fetch_audio(url)
+        try:
+            with open(entry.path, "rb") as fp, metrics.phase("decode"):
+                return read_window(fp, offset, duration)
+        except sf.LibsndfileError:
+            pass
+        except Exception as e:
+            raise _audio_load_error(e, url)
+
+        # 交给 torchaudio 完整解码后截取片段
+        waveform, sample_rate = LoadAudioFromURL._load_audio_from_url(url, entry)
+        first = int(round(offset * sample_rate))
+        last = first + int(round(duration * sample_rate)) if duration > 0 else waveform.shape[-1]
+        return waveform[..., first:last], sample_rate
+
+
+def _audio_load_error(e: Exception, url: str) -> RuntimeError:
+    """将下载/解码异常转换为带中文说明的错误信息"""
+    import requests
+    if isinstance(e, requests.exceptions.Timeout):
+        return RuntimeError(f"加载音频超时：URL={url}（超时时间60秒）")
+    if isinstance(e, requests.exceptions.HTTPError):
+        return RuntimeError(f"URL返回错误状态码：{e.response.status_code}，URL={url}")
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return RuntimeError(f"无法连接到音频服务器：URL={url}")
+    # 通用异常捕获，输出详细错误信息
+    error_detail = str(e)
+    if "metadata" in error_detail.lower() or "audio" in error_detail.lower():
+        return RuntimeError(f"URL不是有效的音频文件：{url}，错误信息：{error_detail}")
+    elif "BytesIO" in error_detail:
+        return RuntimeError(f"音频数据读取失败（命名冲突）：{url}，错误信息：{error_detail}")
+    else:
+        return RuntimeError(f"从URL加载音频失败：{error_detail}，URL={url}")
 
 
 # 兼容ComfyUI旧版节点映射（确保节点能被识别）
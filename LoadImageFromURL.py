@@ -1,9 +1,14 @@
-import requests
 import torch
-import numpy as np
-from PIL import Image, ImageOps
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 import folder_paths
-from io import BytesIO
+from . import metrics
+from .image_decode import download_image, decode_image, open_frames, parse_url_list
+from .decode_pool import offload_image
+from .tensor_cache import outputs as output_cache
+from .image_tensor import (OUTPUT_DTYPES, resolve_dtype, image_size, pil_to_tensor, pil_batch_to_tensor,
+                           frames_to_tensor)
+
 
 class LoadImageFromURL:
     @classmethod
@@ -13,51 +18,194 @@ class LoadImageFromURL:
                 "image_url": ("STRING", {"default": "https://example.com/image.jpg", "multiline": False}),
                 "width": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 1}),
                 "height": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 1}),
+            },
+            "optional": {
+                "fast_decode": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "指定尺寸时在解码阶段先行缩小（JPEG按DCT缩放解码），显著降低大图的解码耗时和内存"
+                }),
+                "output_dtype": (list(OUTPUT_DTYPES), {
+                    "default": "float32",
+                    "tooltip": "输出图片张量精度：float16/bfloat16 可节省一半内存（需下游节点支持）"
+                }),
+                "frame_mode": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "按帧加载 GIF/APNG/动态WebP/多页TIFF：输出 [N,H,W,C] 批次，遮罩由透明通道得到（1 - alpha）"
+                }),
+                "frame_start": ("INT", {"default": 0, "min": 0, "max": 100000, "step": 1,
+                                        "tooltip": "按帧加载时的起始帧"}),
+                "frame_stride": ("INT", {"default": 1, "min": 1, "max": 1000, "step": 1,
+                                         "tooltip": "按帧加载时每隔几帧取一帧"}),
+                "max_frames": ("INT", {"default": 0, "min": 0, "max": 100000, "step": 1,
+                                       "tooltip": "按帧加载时最多输出的帧数（0表示不限制）"}),
             }
         }
-    
+
     RETURN_TYPES = ("IMAGE", "MASK")
     RETURN_NAMES = ("image", "mask")
     FUNCTION = "load_image"
     CATEGORY = "image/loaders"
 
-    def load_image(self, image_url, width, height):
-        # 从URL下载图片
+    @metrics.instrument("LoadImageFromURL", "image_url")
+    def load_image(self, image_url, width, height, fast_decode=True, output_dtype="float32",
+                   frame_mode=False, frame_start=0, frame_stride=1, max_frames=0):
+        # 从URL下载图片（经共享缓存，重复URL仅做条件请求校验）
+        try:
+            entry, decoder = download_image(image_url, width, height, fast_decode, timeout=10,
+                                            incremental=not frame_mode)
+        except Exception as e:
+            raise Exception(f"Failed to load image from URL: {str(e)}")
+
+        # 内容与参数都未变化时直接复用上次的输出张量
+        cache_key = ("LoadImageFromURL", entry.sha256, width, height, fast_decode, output_dtype)
+        if frame_mode:
+            cache_key += (frame_start, frame_stride, max_frames)
+        cached = output_cache.get(cache_key)
+        if cached is not None:
+            decoder.close()
+            return cached
+
+        if frame_mode:
+            result = self._load_frames(entry.path, width, height, fast_decode, resolve_dtype(output_dtype),
+                                       frame_start, frame_stride, max_frames)
+            output_cache.put(cache_key, result)
+            return result
+
         try:
-            response = requests.get(image_url, timeout=10)
-            response.raise_for_status()  # 抛出HTTP错误
-            img = Image.open(BytesIO(response.content)).convert("RGB")
+            # 大尺寸PNG/TIFF/WebP交给解码进程（启用时），结果直接映射为张量
+            with metrics.phase("decode"):
+                pixels = offload_image(entry, decoder, width, height, fast_decode)
+            if pixels is None:
+                # 边下载边解码+EXIF方向+尺寸处理（0表示使用原图尺寸）
+                img = decode_image(entry, decoder, width, height, fast_decode)
         except Exception as e:
             raise Exception(f"Failed to load image from URL: {str(e)}")
-        
-        # 处理尺寸（保留原生逻辑，0表示使用原图尺寸）
-        if width > 0 and height > 0:
-            img = img.resize((width, height), Image.Resampling.LANCZOS)
-        elif width > 0:
-            ratio = width / img.width
-            height = int(img.height * ratio)
-            img = img.resize((width, height), Image.Resampling.LANCZOS)
-        elif height > 0:
-            ratio = height / img.height
-            width = int(img.width * ratio)
-            img = img.resize((width, height), Image.Resampling.LANCZOS)
-        
+
         # 转换为ComfyUI标准张量格式
-        img = ImageOps.exif_transpose(img)
-        img_np = np.array(img).astype(np.float32) / 255.0
-        img_tensor = torch.from_numpy(img_np)[None,]
-        
+        if pixels is not None:
+            img_tensor = pixels.to(resolve_dtype(output_dtype))[None,]
+        else:
+            img_tensor = pil_to_tensor(img, resolve_dtype(output_dtype))[None,]
+            del img
+
         # 创建空mask（原生接口兼容）
         mask = torch.ones((1, img_tensor.shape[1], img_tensor.shape[2]), dtype=torch.float32)
-        
+
+        output_cache.put(cache_key, (img_tensor, mask))
         return (img_tensor, mask)
 
+    @staticmethod
+    def _load_frames(path, width, height, fast_decode, dtype, start, stride, max_frames):
+        """从缓存文件按帧解码选中的帧，逐帧写入预分配的批次张量"""
+        try:
+            count, size, frames = open_frames(path, width, height, fast_decode, start, stride, max_frames)
+        except Exception as e:
+            raise Exception(f"Failed to load image from URL: {str(e)}")
+        if count == 0:
+            raise ValueError(f"No frames selected: frame_start={start} is beyond the last frame")
+        try:
+            return frames_to_tensor(frames, count, size, dtype)
+        except Exception as e:
+            raise Exception(f"Failed to load image from URL: {str(e)}")
+        finally:
+            frames.close()
+
+
+class LoadImageBatchFromURL:
+    """批量加载多个URL图片：并发下载+并行解码，输出一个 [B,H,W,C] 批次"""
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "image_urls": ("STRING", {
+                    "default": "https://example.com/image1.jpg\nhttps://example.com/image2.jpg",
+                    "multiline": True,
+                    "placeholder": "每行一个URL，或JSON数组：[\"https://...\", \"https://...\"]"
+                }),
+                "width": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 1}),
+                "height": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 1}),
+                "max_workers": ("INT", {"default": 8, "min": 1, "max": 64, "step": 1}),
+            },
+            "optional": {
+                "fast_decode": ("BOOLEAN", {"default": True}),
+                "output_dtype": (list(OUTPUT_DTYPES), {"default": "float32"}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "MASK")
+    RETURN_NAMES = ("images", "masks")
+    FUNCTION = "load_images"
+    CATEGORY = "image/loaders"
+
+    @metrics.instrument("LoadImageBatchFromURL")
+    def load_images(self, image_urls, width, height, max_workers, fast_decode=True, output_dtype="float32"):
+        urls = parse_url_list(image_urls)
+        if not urls:
+            raise ValueError("URL list is empty, please provide at least one image URL")
+
+        def download(url):
+            try:
+                return download_image(url, width, height, fast_decode, timeout=10)
+            except Exception as e:
+                raise Exception(f"Failed to load image from URL: {url}, {str(e)}")
+
+        def decode(download_result, resize_to=None):
+            """解码为PIL图片，或交给解码进程时为 float32 张量"""
+            entry, decoder = download_result
+            try:
+                with metrics.phase("decode"):
+                    pixels = offload_image(entry, decoder, width, height, fast_decode, resize_to)
+                if pixels is not None:
+                    return pixels
+                img = decode_image(entry, decoder, width, height, fast_decode)
+                return img if resize_to is None else img.resize(resize_to, Image.Resampling.LANCZOS)
+            except Exception as e:
+                raise Exception(f"Failed to load image from URL: {entry.url}, {str(e)}")
+
+        # 并发下载+解码（Pillow解码期间释放GIL，线程池即可并行）
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+            downloads = list(executor.map(metrics.bind(download), urls))
+
+            # 所有图片内容与参数都未变化时直接复用上次的输出张量
+            cache_key = ("LoadImageBatchFromURL", tuple(entry.sha256 for entry, _ in downloads),
+                         width, height, fast_decode, output_dtype)
+            cached = output_cache.get(cache_key)
+            if cached is not None:
+                for _, decoder in downloads:
+                    decoder.close()
+                return cached
+
+            images = list(executor.map(metrics.bind(decode), downloads))
+
+        # 统一尺寸：以第一张图片的输出尺寸为准
+        target_size = image_size(images[0])
+
+        def conform(img, download_result):
+            if image_size(img) == target_size:
+                return img
+            if isinstance(img, Image.Image):
+                return img.resize(target_size, Image.Resampling.LANCZOS)
+            # 解码进程输出的张量：重新解码并缩放到统一尺寸
+            return decode(download_result, target_size)
+
+        images = [conform(img, download_result) for img, download_result in zip(images, downloads)]
+        images_tensor = pil_batch_to_tensor(images, resolve_dtype(output_dtype))
+        del images
+
+        # 创建空mask（原生接口兼容）
+        masks = torch.ones((images_tensor.shape[0], target_size[1], target_size[0]), dtype=torch.float32)
+
+        output_cache.put(cache_key, (images_tensor, masks))
+        return (images_tensor, masks)
+
+
 # 节点映射（ComfyUI标准）
 NODE_CLASS_MAPPINGS = {
-    "LoadImageFromURL": LoadImageFromURL
+    "LoadImageFromURL": LoadImageFromURL,
+    "LoadImageBatchFromURL": LoadImageBatchFromURL
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "LoadImageFromURL": "🔌 Load Image From URL"
+    "LoadImageFromURL": "🔌 Load Image From URL",
+    "LoadImageBatchFromURL": "🔌 Load Image Batch From URL"
 }
-
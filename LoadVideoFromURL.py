@@ -3,14 +3,10 @@
 
 from __future__ import annotations
 import os
-import sys
-import tempfile
+import shutil
+import asyncio
 import hashlib
-
-# 将ComfyUI主目录添加到Python路径
-comfy_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
-if comfy_path not in sys.path:
-    sys.path.insert(0, comfy_path)
+import uuid
 
 # 导入ComfyUI核心模块
 try:
@@ -19,11 +15,33 @@ try:
     import folder_paths
     from comfy_api.latest import ComfyExtension, io, Input, InputImpl, Types
     import aiohttp
+    from . import metrics
+    from .url_cache import get_cache
+    from .async_download import fetch_to_cache, DEFAULT_CONNECTIONS
 except ImportError as e:
     print(f"[LoadVideoFromURL] Import error: {e}")
     print("[LoadVideoFromURL] Make sure this file is placed in ComfyUI/custom_nodes/ directory")
     raise
 
+def _temp_link(path: str) -> str:
+    """
+    将缓存文件硬链接到 ComfyUI 临时目录（按内容哈希命名，相同内容只链接一次）
+    硬链接与缓存文件共用数据，缓存淘汰只删除缓存中的文件名；跨文件系统等无法硬链接时复制
+    """
+    temp_dir = os.path.join(folder_paths.get_temp_directory(), "url-loader-video")
+    os.makedirs(temp_dir, exist_ok=True)
+    target = os.path.join(temp_dir, os.path.basename(path))
+    if os.path.exists(target):
+        return target
+    staging = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(path, staging)
+    except OSError:
+        shutil.copyfile(path, staging)
+    os.replace(staging, target)
+    return target
+
+
 # ---------------------------
 # 从URL加载视频的核心节点（修复异步循环问题）
 # ---------------------------
@@ -51,6 +69,14 @@ class ComfyVideoURLLoader(io.ComfyNode):
                     default="downloaded_video", 
                     tooltip="Filename for saved video (without extension)"
                 ),
+                io.Int.Input(
+                    "connections",
+                    default=DEFAULT_CONNECTIONS,
+                    min=1,
+                    max=16,
+                    optional=True,
+                    tooltip="Parallel connections for servers that support HTTP Range requests\nInterrupted downloads resume from where they stopped"
+                ),
             ],
             outputs=[
                 io.Video.Output(),
@@ -59,7 +85,9 @@ class ComfyVideoURLLoader(io.ComfyNode):
     
     # 关键修改：直接使用异步execute方法，而非同步包装
     @classmethod
-    async def execute(cls, video_url: str, save_to_input_folder: bool, filename: str) -> io.NodeOutput:
+    @metrics.instrument("ComfyVideoURLLoader", "video_url")
+    async def execute(cls, video_url: str, save_to_input_folder: bool, filename: str,
+                      connections: int = DEFAULT_CONNECTIONS) -> io.NodeOutput:
         """异步执行核心逻辑（直接兼容ComfyUI的异步执行环境）"""
         # 基础输入验证
         if not video_url:
@@ -68,92 +96,56 @@ class ComfyVideoURLLoader(io.ComfyNode):
         if not video_url.startswith(('http://', 'https://')):
             raise ValueError(f"Error: Invalid URL format! Must start with http:// or https:// (got: {video_url})")
         
-        temp_file = None
         video_path = ""
         
         try:
-            # 1. 创建HTTP会话并下载视频（使用ComfyUI的事件循环）
-            timeout = aiohttp.ClientTimeout(total=300)  # 5分钟超时
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(video_url) as response:
-                    # 检查HTTP响应状态
-                    response.raise_for_status()
-                    print(f"[LoadVideoFromURL] Successfully connected to {video_url}")
-                    
-                    # 2. 自动识别文件扩展名
-                    file_ext = '.mp4'  # 默认扩展名
-                    if '.' in video_url:
-                        url_ext = video_url.split('.')[-1].split('?')[0].lower()
-                        supported_exts = ['mp4', 'webm', 'mov', 'avi', 'mkv', 'flv', 'mpeg', 'mpg', 'wmv']
-                        if url_ext in supported_exts:
-                            file_ext = f'.{url_ext}'
-                    
-                    # 3. 确定保存路径
-                    if save_to_input_folder:
-                        # 保存到ComfyUI输入文件夹（永久保存）
-                        input_dir = folder_paths.get_input_directory()
-                        os.makedirs(input_dir, exist_ok=True)
-                        video_path = os.path.join(input_dir, f"{filename}{file_ext}")
-                        
-                        # 避免文件名重复
-                        counter = 1
-                        while os.path.exists(video_path):
-                            video_path = os.path.join(input_dir, f"{filename}_{counter}{file_ext}")
-                            counter += 1
-                        
-                        # 分块下载（适合大文件）
-                        with open(video_path, 'wb') as f:
-                            downloaded_size = 0
-                            while True:
-                                chunk = await response.content.read(8192)  # 8KB分块
-                                if not chunk:
-                                    break
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                        
-                        print(f"[LoadVideoFromURL] Video saved to: {video_path} ({downloaded_size/1024/1024:.2f} MB)")
-                    else:
-                        # 创建临时文件（会话结束后自动清理）
-                        temp_file = tempfile.NamedTemporaryFile(
-                            suffix=file_ext, 
-                            delete=False,
-                            mode='wb'
-                        )
-                        
-                        # 下载到临时文件
-                        with temp_file:
-                            downloaded_size = 0
-                            while True:
-                                chunk = await response.content.read(8192)
-                                if not chunk:
-                                    break
-                                temp_file.write(chunk)
-                                downloaded_size += len(chunk)
-                        
-                        video_path = temp_file.name
-                        print(f"[LoadVideoFromURL] Video downloaded to temporary file: {video_path} ({downloaded_size/1024/1024:.2f} MB)")
+            # 1~2. 下载到共享缓存：已缓存时条件请求校验；支持Range时多连接并行下载，中断后可续传
+            entry = await fetch_to_cache(get_cache(), video_url, connections)
+            print(f"[LoadVideoFromURL] Video ready in cache: {entry.path} ({entry.size/1024/1024:.2f} MB)")
+            
+            # 3. 确定视频路径
+            if save_to_input_folder:
+                # 自动识别文件扩展名
+                file_ext = '.mp4'  # 默认扩展名
+                if '.' in video_url:
+                    url_ext = video_url.split('.')[-1].split('?')[0].lower()
+                    supported_exts = ['mp4', 'webm', 'mov', 'avi', 'mkv', 'flv', 'mpeg', 'mpg', 'wmv']
+                    if url_ext in supported_exts:
+                        file_ext = f'.{url_ext}'
+                
+                # 保存到ComfyUI输入文件夹（永久保存）
+                input_dir = folder_paths.get_input_directory()
+                os.makedirs(input_dir, exist_ok=True)
+                video_path = os.path.join(input_dir, f"{filename}{file_ext}")
+                
+                # 避免文件名重复
+                counter = 1
+                while os.path.exists(video_path):
+                    video_path = os.path.join(input_dir, f"{filename}_{counter}{file_ext}")
+                    counter += 1
                 
-                # 4. 创建Video对象并返回（与原生节点完全兼容）
-                video_object = InputImpl.VideoFromFile(video_path)
-                return io.NodeOutput(video_object)
+                await asyncio.to_thread(shutil.copyfile, entry.path, video_path)
+                print(f"[LoadVideoFromURL] Video saved to: {video_path}")
+            else:
+                # 缓存文件可能在下游节点读取期间被 LRU 淘汰删除：硬链接（不可用时复制）到临时目录再交给下游
+                video_path = await asyncio.to_thread(_temp_link, entry.path)
+            
+            # 4. 创建Video对象并返回（与原生节点完全兼容）
+            video_object = InputImpl.VideoFromFile(video_path)
+            return io.NodeOutput(video_object)
                 
         except Exception as e:
-            # 异常处理：清理临时文件
-            if temp_file and os.path.exists(temp_file.name):
-                try:
-                    os.unlink(temp_file.name)
-                except:
-                    pass
+            # 未完成的分段下载保留进度记录，下次执行时继续
             raise RuntimeError(f"[LoadVideoFromURL] Failed to load video: {str(e)}")
     
     @classmethod
-    def fingerprint_inputs(cls, video_url: str, save_to_input_folder: bool, filename: str):
+    def fingerprint_inputs(cls, video_url: str, save_to_input_folder: bool, filename: str, **kwargs):
         """生成缓存指纹（ComfyUI缓存机制）"""
         fingerprint_data = f"{video_url}|{save_to_input_folder}|{filename}".encode('utf-8')
         return hashlib.md5(fingerprint_data).hexdigest()
     
     @classmethod
-    def validate_inputs(cls, video_url: str, save_to_input_folder: bool, filename: str):
+    def validate_inputs(cls, video_url: str, save_to_input_folder: bool, filename: str, **kwargs):
         """输入验证（ComfyUI节点系统要求）"""
         if not video_url:
             return "Error: Video URL cannot be empty!"
@@ -1,28 +1,34 @@
 from typing_extensions import override
 from comfy_api.latest import ComfyExtension, io
-import sys
-import os
-
-# 将当前目录加入Python路径（确保导入自定义节点）
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # ---------------------------
 # 导入各URL加载节点类（需确保对应py文件存在）
 # ---------------------------
 # 图片URL加载节点（LoadImageFromURL）
-from .LoadImageFromURL import LoadImageFromURL
+from .LoadImageFromURL import LoadImageFromURL, LoadImageBatchFromURL
 # 视频URL加载节点（LoadVideoFromURL）
 from .LoadVideoFromURL import ComfyVideoURLLoader  # 需确保该文件存在
 # 音频URL加载节点（LoadAudioFromURL）
 from .LoadAudioFromURL import LoadAudioFromURL  # 需确保该文件存在
-# OSS上传节点（OSS_Upload）
+# OSS上传节点（OSS_Upload，及其监视上传的执行回调）
 from .oss_uploader import OSS_Upload
+from . import oss_uploader
+# 排队任务的输入预取（提交 prompt 时在后台下载URL输入）
+from . import prefetch
+# 耗时统计（/url_loader/metrics 路由）
+from . import metrics
+
+# 在 ComfyUI 服务上注册回调和路由（只在加载节点包时注册，各模块导入时不访问 server）
+prefetch.register()
+metrics.register_route()
+oss_uploader.register()
 
 # ---------------------------
 # 传统节点映射（兼容旧版ComfyUI）
 # ---------------------------
 NODE_CLASS_MAPPINGS = {
     "LoadImageFromURL": LoadImageFromURL,
+    "LoadImageBatchFromURL": LoadImageBatchFromURL,
     "ComfyVideoURLLoader": ComfyVideoURLLoader,
     "LoadAudioFromURL": LoadAudioFromURL,
     "OSS_Upload": OSS_Upload
@@ -30,6 +36,7 @@ NODE_CLASS_MAPPINGS = {
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "LoadImageFromURL": "🔌 Load Image From URL",
+    "LoadImageBatchFromURL": "🔌 Load Image Batch From URL",
     "ComfyVideoURLLoader": "🔌 Load Video From URL",
     "LoadAudioFromURL": "🔌 Load Audio From URL",
     "OSS_Upload": "🔌 Upload to OSS"
@@ -44,6 +51,7 @@ class URLLoaderExtension(ComfyExtension):
         # 汇总所有URL加载节点
         return [
             LoadImageFromURL,
+            LoadImageBatchFromURL,
             ComfyVideoURLLoader,
             LoadAudioFromURL,
             OSS_Upload
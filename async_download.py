@@ -0,0 +1,390 @@
+"""
+异步下载到共享缓存（视频等大文件使用）
+- 先发送 Range: bytes=0-0 探测请求（同时携带缓存的条件请求头，304 直接复用缓存）
+- 服务器支持 Range 时按字节区间拆分，多连接并行下载到预分配的文件中
+- 下载进度记录在旁路文件（.part.json），中断后再次下载从已完成位置继续
+- 服务器不支持 Range 时退回单连接流式下载
+- 文件写入通过 AsyncFileWriter 攒成MB级缓冲区后交给线程池执行，不阻塞事件循环；
+  已知大小时预分配磁盘空间（posix_fallocate）
+
+环境变量：
+    URL_LOADER_VIDEO_CONNECTIONS   默认并行连接数（默认 4）
+    URL_LOADER_SEGMENT_MIN_BYTES   每个区间的最小字节数（默认 8MB，小文件不拆分过细）
+"""
+
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import Dict, Optional, List
+
+import aiohttp
+
+from . import metrics
+from .http_fetch import get_async_session, async_host_semaphore
+from .url_cache import URLCache, CacheEntry
+from .single_flight import downloads
+
+DEFAULT_CONNECTIONS = int(os.environ.get("URL_LOADER_VIDEO_CONNECTIONS", 4))
+SEGMENT_MIN_BYTES = int(os.environ.get("URL_LOADER_SEGMENT_MIN_BYTES", 8 * 1024 * 1024))
+SEGMENT_RETRIES = 3
+READ_CHUNK_SIZE = 256 * 1024
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024  # 写入缓冲区（攒够后一次性写入，减少系统调用）
+PROGRESS_SAVE_INTERVAL = 1.0  # 进度记录最短保存间隔（秒）
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+
+
+def _range_total(response) -> Optional[int]:
+    """从 206 响应的 Content-Range 中解析资源总大小（不支持Range时返回 None）"""
+    if response.status != 206:
+        return None
+    match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+def _validators(headers) -> Dict[str, str]:
+    return {
+        "Content-Type": headers.get("Content-Type", "") or "",
+        "ETag": headers.get("ETag", "") or "",
+        "Last-Modified": headers.get("Last-Modified", "") or "",
+    }
+
+
+def _if_range(validators: Dict[str, str]) -> str:
+    """If-Range 的值：只接受强 ETag（弱 ETag 时服务器必须返回 200 完整内容），否则使用 Last-Modified"""
+    etag = validators["ETag"]
+    return etag if etag and not etag.startswith("W/") else validators["Last-Modified"]
+
+
+class RangeNotHonored(RuntimeError):
+    """区间请求返回了完整内容（If-Range 不匹配即远端文件已变化，或服务器忽略了 Range）"""
+
+
+def _split_segments(total: int, connections: int) -> List[List[int]]:
+    """将 [0, total) 拆分为若干区间，每项为 [起始, 结束(含), 已下载字节数]"""
+    count = max(1, min(connections, total // SEGMENT_MIN_BYTES))
+    size = -(-total // count)
+    return [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+
+
+def _preallocate(path: str, total: int):
+    """创建文件并预分配磁盘空间（不支持 fallocate 的平台退回稀疏文件）"""
+    with open(path, "wb") as f:
+        if total <= 0:
+            return
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, total)
+                return
+            except OSError:
+                pass
+        f.truncate(total)
+
+
+class AsyncFileWriter:
+    """
+    异步文件写入器：将网络数据块攒成大缓冲区，在线程池中按偏移写入文件
+    上一个缓冲区写入期间继续接收下一个缓冲区的数据，写入与下载重叠
+    """
+
+    def __init__(self, f, offset: int, buffer_size: int, digest=None, on_flushed=None):
+        self._file = f
+        self._offset = offset
+        self._buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._pending: Optional[asyncio.Future] = None
+        self._digest = digest
+        self._on_flushed = on_flushed
+        self.written = 0
+
+    @classmethod
+    async def open(cls, path: str, offset: int = 0, buffer_size: int = WRITE_BUFFER_SIZE,
+                   digest=None, on_flushed=None) -> "AsyncFileWriter":
+        """
+        Args:
+            offset: 写入起始偏移（文件需已存在，分段下载时各写入器写入各自区间）
+            digest: 可选的哈希对象，按写入顺序更新（单连接下载时顺带计算内容哈希）
+            on_flushed: 每个缓冲区落盘后回调（参数为落盘字节数），用于更新续传进度
+        """
+        f = await asyncio.to_thread(open, path, "r+b")
+        return cls(f, offset, buffer_size, digest, on_flushed)
+
+    def _write_at(self, data, offset: int):
+        self._file.seek(offset)
+        self._file.write(data)
+        if self._digest is not None:
+            self._digest.update(data)
+
+    async def _wait_pending(self):
+        if self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        size = await pending
+        self.written += size
+        if self._on_flushed is not None:
+            await self._on_flushed(size)
+
+    async def _flush_buffer(self):
+        if not self._buffer:
+            return
+        await self._wait_pending()
+        data, self._buffer = self._buffer, bytearray()
+        offset = self._offset
+        self._offset += len(data)
+        loop = asyncio.get_running_loop()
+        self._pending = loop.run_in_executor(None, lambda: self._write_at(data, offset) or len(data))
+
+    async def write(self, chunk: bytes):
+        self._buffer += chunk
+        if len(self._buffer) >= self._buffer_size:
+            await self._flush_buffer()
+
+    async def close(self, flush: bool = True):
+        """写入剩余数据并关闭文件（flush=False 时丢弃未落盘的缓冲区）"""
+        try:
+            if flush:
+                await self._flush_buffer()
+            await self._wait_pending()
+        finally:
+            await asyncio.to_thread(self._file.close)
+
+
+class _Progress:
+    """分段下载进度（旁路 JSON 文件，用于断点续传）"""
+
+    def __init__(self, path: str, state: Dict):
+        self.path = path
+        self.state = state
+        self._saved_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def load(cls, path: str, url: str, total: int, validators: Dict[str, str]) -> Optional["_Progress"]:
+        """读取进度记录；资源大小或校验值（ETag/Last-Modified）变化时视为无效"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not (validators["ETag"] or validators["Last-Modified"]):
+            return None  # 无法确认远端文件未变化，不续传
+        if (state.get("url") != url or state.get("size") != total
+                or state.get("etag") != validators["ETag"]
+                or state.get("last_modified") != validators["Last-Modified"]):
+            return None
+        return cls(path, state)
+
+    @property
+    def segments(self) -> List[List[int]]:
+        return self.state["segments"]
+
+    @property
+    def completed(self) -> int:
+        return sum(segment[2] for segment in self.segments)
+
+    def _write(self, data: str):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    async def save(self, force: bool = False):
+        """保存进度（在线程池中写入，按时间间隔节流）"""
+        now = time.monotonic()
+        if not force and now - self._saved_at < PROGRESS_SAVE_INTERVAL:
+            return
+        self._saved_at = now
+        async with self._lock:
+            await asyncio.to_thread(self._write, json.dumps(self.state))
+
+    def remove(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+async def _download_segment(session, url: str, path: str, segment: List[int],
+                            headers: Dict[str, str], progress: _Progress):
+    """下载一个字节区间（失败时从已下载位置重试）"""
+    start, end = segment[0], segment[1]
+    for attempt in range(SEGMENT_RETRIES + 1):
+        if segment[2] >= end - start + 1:
+            return
+        request_headers = dict(headers)
+        request_headers["Range"] = f"bytes={start + segment[2]}-{end}"
+        try:
+            async with async_host_semaphore(url):
+                async with session.get(url, headers=request_headers) as response:
+                    if response.status != 206:
+                        # If-Range 不匹配（远端文件已变化）或服务器忽略了 Range
+                        raise RangeNotHonored(f"Range request not honored (HTTP {response.status}), remote file may have changed")
+                    async def flushed(size: int):
+                        # 只有落盘的数据才计入进度，保证续传位置正确
+                        segment[2] += size
+                        await progress.save()
+
+                    writer = await AsyncFileWriter.open(path, start + segment[2], on_flushed=flushed)
+                    completed = False
+                    received = 0
+                    try:
+                        async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+                            received += len(chunk)
+                            await writer.write(chunk)
+                        completed = True
+                    finally:
+                        await writer.close(flush=completed)
+                        metrics.add_bytes("download", received)
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == SEGMENT_RETRIES:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+
+async def _download_ranges(session, cache: URLCache, url: str, total: int, validators: Dict[str, str],
+                           connections: int, headers: Dict[str, str]) -> str:
+    """多连接并行下载到可续传的中转文件，返回文件路径"""
+    path = cache.partial_path(url)
+    progress_path = f"{path}.json"
+
+    progress = None
+    if await asyncio.to_thread(os.path.exists, path):
+        progress = await asyncio.to_thread(_Progress.load, progress_path, url, total, validators)
+    if progress is None:
+        # 预分配完整大小的文件，各区间直接写入对应偏移
+        await asyncio.to_thread(_preallocate, path, total)
+        progress = _Progress(progress_path, {
+            "url": url,
+            "size": total,
+            "etag": validators["ETag"],
+            "last_modified": validators["Last-Modified"],
+            "segments": _split_segments(total, connections),
+        })
+        await progress.save(force=True)
+    elif progress.completed:
+        print(f"[LoadVideoFromURL] Resuming download at {progress.completed/1024/1024:.2f} MB of {total/1024/1024:.2f} MB")
+
+    segment_headers = dict(headers)
+    if_range = _if_range(validators)
+    if if_range:
+        segment_headers["If-Range"] = if_range
+
+    tasks = [
+        asyncio.ensure_future(_download_segment(session, url, path, segment, segment_headers, progress))
+        for segment in progress.segments
+    ]
+    try:
+        with metrics.phase("body"):
+            await asyncio.gather(*tasks)
+    except BaseException:
+        # 任一区间失败时取消其余区间，进度记录保留已完成部分
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        await progress.save(force=True)
+
+    await asyncio.to_thread(progress.remove)
+    return path
+
+
+async def _stream_to_file(response, path: str) -> str:
+    """单连接流式下载（服务器不支持Range时使用），返回内容的 SHA-256"""
+    content_length = response.headers.get("Content-Length", "")
+    expected = int(content_length) if content_length.isdigit() else 0
+    await asyncio.to_thread(_preallocate, path, expected)
+    digest = hashlib.sha256()
+    writer = await AsyncFileWriter.open(path, digest=digest)
+    completed = False
+    try:
+        with metrics.phase("body"):
+            async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+                await writer.write(chunk)
+        completed = True
+    finally:
+        await writer.close(flush=completed)
+        metrics.add_bytes("download", writer.written)
+    if writer.written != expected:
+        # 实际长度与预分配大小不一致时截断多余的预分配空间
+        await asyncio.to_thread(os.truncate, path, writer.written)
+    return digest.hexdigest()
+
+
+async def _commit_stream(cache: URLCache, url: str, response) -> CacheEntry:
+    """单连接读取响应的完整内容并提交到缓存"""
+    staging_path = await asyncio.to_thread(cache.staging_path)
+    try:
+        sha256 = await _stream_to_file(response, staging_path)
+    except BaseException:
+        try:
+            os.unlink(staging_path)
+        except OSError:
+            pass
+        raise
+    return await asyncio.to_thread(cache.commit, url, staging_path, _validators(response.headers), sha256)
+
+
+def _discard_partial(path: str):
+    """删除中转文件及其进度记录"""
+    for name in (path, f"{path}.json"):
+        try:
+            os.unlink(name)
+        except OSError:
+            pass
+
+
+async def fetch_to_cache(cache: URLCache, url: str, connections: int = DEFAULT_CONNECTIONS,
+                         headers: Optional[Dict[str, str]] = None) -> CacheEntry:
+    """
+    下载URL到共享缓存（已缓存时条件请求校验，支持Range时多连接并行+断点续传）
+    与同步加载节点共用 single-flight 登记表，同一URL同时只下载一次
+    """
+    return await downloads.do_async(cache.flight_key(url), _fetch_to_cache, cache, url, connections, headers)
+
+
+async def _fetch_to_cache(cache: URLCache, url: str, connections: int,
+                          headers: Optional[Dict[str, str]]) -> CacheEntry:
+    session = get_async_session()
+    headers = dict(headers or {})
+    # 字节区间与预分配大小都以原始内容为准，禁用传输压缩
+    headers.setdefault("Accept-Encoding", "identity")
+    fresh = await asyncio.to_thread(cache.fresh_entry, url)
+    if fresh is not None:
+        return fresh
+    cached = await asyncio.to_thread(cache.lookup, url)
+
+    probe_headers = dict(headers)
+    probe_headers.update(cache.validator_headers(cached))
+    probe_headers["Range"] = "bytes=0-0"
+
+    async with async_host_semaphore(url):
+        async with session.get(url, headers=probe_headers) as response:
+            if response.status == 304 and cached is not None:
+                return await asyncio.to_thread(cache.touch, url) or cached
+            response.raise_for_status()
+
+            validators = _validators(response.headers)
+            total = _range_total(response)
+            if total is None:
+                # 不支持Range：直接读取本次响应的完整内容
+                return await _commit_stream(cache, url, response)
+
+    try:
+        path = await _download_ranges(session, cache, url, total, validators, max(1, connections), headers)
+    except RangeNotHonored as e:
+        # 远端文件在下载过程中变化，或服务器不按 If-Range 返回区间：丢弃已下载部分，单连接重新下载
+        print(f"[LoadVideoFromURL] {e}; restarting as a single-stream download")
+        await asyncio.to_thread(_discard_partial, cache.partial_path(url))
+        async with async_host_semaphore(url):
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                return await _commit_stream(cache, url, response)
+    # 分段并行写入无法按顺序计算哈希，提交时在线程池中计算
+    with metrics.phase("hash"):
+        return await asyncio.to_thread(cache.commit, url, path, validators)
@@ -0,0 +1,102 @@
+"""
+音频重采样（带限 sinc 插值，Hann 窗，与 torchaudio.functional.resample 默认参数结果一致）
+- 每个 (原采样率, 目标采样率) 组合的卷积核只构建一次并缓存，重复执行不再重建
+- 长音频按重叠分块做多相卷积，结果写入预分配的输出张量，峰值内存只与分块大小有关
+
+环境变量：
+    URL_LOADER_RESAMPLE_CHUNK_FRAMES  每块处理的输入采样点数（默认 1048576，约 22 秒 48kHz 音频）
+"""
+
+import functools
+import math
+import os
+import threading
+
+import torch
+import torch.nn.functional as F
+
+from . import metrics
+
+CHUNK_FRAMES = int(os.environ.get("URL_LOADER_RESAMPLE_CHUNK_FRAMES", 1024 * 1024))
+
+# 与 torchaudio 默认值一致
+LOWPASS_FILTER_WIDTH = 6
+ROLLOFF = 0.99
+
+_kernel_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=16)
+def _build_kernel(orig_freq, new_freq):
+    """构建多相 sinc 卷积核，返回 (kernel[new,1,2*width+orig], width)；频率为约分后的值"""
+    base_freq = min(orig_freq, new_freq) * ROLLOFF
+    width = math.ceil(LOWPASS_FILTER_WIDTH * orig_freq / base_freq)
+    idx = torch.arange(-width, width + orig_freq, dtype=torch.float64)[None, None] / orig_freq
+    t = torch.arange(0, -new_freq, -1, dtype=torch.float64)[:, None, None] / new_freq + idx
+    t *= base_freq
+    t = t.clamp_(-LOWPASS_FILTER_WIDTH, LOWPASS_FILTER_WIDTH)
+    window = torch.cos(t * math.pi / LOWPASS_FILTER_WIDTH / 2) ** 2
+    t *= math.pi
+    kernel = torch.where(t == 0, torch.tensor(1.0, dtype=t.dtype), t.sin() / t)
+    kernel *= window * (base_freq / orig_freq)
+    return kernel.to(torch.float32), width
+
+
+def get_kernel(orig_freq, new_freq, dtype=torch.float32, device=None):
+    """
+    取得缓存的重采样卷积核
+
+    Returns:
+        (kernel, width, 约分后的原采样率, 约分后的目标采样率)
+    """
+    gcd = math.gcd(int(orig_freq), int(new_freq))
+    orig, new = int(orig_freq) // gcd, int(new_freq) // gcd
+    with _kernel_lock:
+        kernel, width = _build_kernel(orig, new)
+    return kernel.to(dtype=dtype, device=device), width, orig, new
+
+
+def resample(waveform, orig_freq, new_freq, chunk_frames=None):
+    """
+    重采样 [..., T] 波形，返回新张量
+
+    Args:
+        chunk_frames: 每块处理的输入采样点数（默认 CHUNK_FRAMES）
+    """
+    orig_freq, new_freq = int(orig_freq), int(new_freq)
+    if orig_freq <= 0 or new_freq <= 0:
+        raise ValueError(f"采样率必须为正数：{orig_freq} -> {new_freq}")
+    if orig_freq == new_freq:
+        return waveform
+
+    with metrics.phase("resample"):
+        return _resample(waveform, orig_freq, new_freq, chunk_frames)
+
+
+def _resample(waveform, orig_freq, new_freq, chunk_frames=None):
+    shape = waveform.shape
+    dtype = waveform.dtype if waveform.is_floating_point() else torch.float32
+    waveform = waveform.reshape(-1, shape[-1])
+    kernel, width, orig, new = get_kernel(orig_freq, new_freq, dtype, waveform.device)
+
+    length = shape[-1]
+    target_length = math.ceil(new * length / orig)
+    out = torch.empty((waveform.shape[0], target_length), dtype=dtype, device=waveform.device)
+
+    # 卷积第 j 步（步长 orig）读取输入 [j*orig - width, j*orig + width + orig)，输出 new 个采样点
+    steps = math.ceil(target_length / new)
+    steps_per_chunk = max(1, (chunk_frames or CHUNK_FRAMES) // orig)
+    for first in range(0, steps, steps_per_chunk):
+        last = min(first + steps_per_chunk, steps)
+        start = first * orig - width
+        stop = last * orig + width
+        # 首尾超出原始数据的部分补零（与整段 pad 后卷积等价）
+        segment = waveform[:, max(start, 0):min(stop, length)].to(dtype)
+        segment = F.pad(segment, (max(-start, 0), max(stop - length, 0)))
+        chunk = F.conv1d(segment[:, None], kernel, stride=orig)
+        chunk = chunk.transpose(1, 2).reshape(waveform.shape[0], -1)
+        begin = first * new
+        end = min(last * new, target_length)
+        out[:, begin:end] = chunk[:, :end - begin]
+
+    return out.reshape(shape[:-1] + (target_length,))
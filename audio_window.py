@@ -0,0 +1,342 @@
+"""
+音频片段加载（offset / duration）
+只需要长音频中的一段时，按字节区间读取并解码该片段，而不是下载、解码整个文件：
+- WAV：由文件头计算片段对应的字节区间，直接读取PCM数据
+- FLAC：由 SEEKTABLE 找到片段前后的帧位置，只读取这些帧并解码
+- 其他格式：交给 soundfile 顺序解码，读完片段即停止，不再读取后续数据
+数据来源可以是已缓存的本地文件，也可以是按需发送 Range 请求的 HTTPRangeFile
+"""
+
+import io
+import re
+import struct
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from . import metrics
+from .http_fetch import open_stream
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+
+# 向前 seek 不超过该距离时读取并丢弃数据，而不是重新发起请求
+_SKIP_AHEAD_BYTES = 256 * 1024
+_READ_CHUNK = 64 * 1024
+
+
+class RangeNotSupported(Exception):
+    """服务器不支持 Range 请求（需要退回完整下载）"""
+
+
+# ---------------------------
+# 按需 Range 读取的远端文件
+# ---------------------------
+class HTTPRangeFile:
+    """
+    以 HTTP Range 请求按需读取远端文件的只读文件对象（支持 seek）
+    顺序读取复用同一个流式响应，seek 到其他位置时才重新发起请求
+    """
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: Optional[float] = None, **request_kwargs):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.request_kwargs = request_kwargs
+        self.size = 0
+        self.bytes_fetched = 0
+        self._validator = None
+        self._pos = 0
+        self._stack = None
+        self._raw = None
+        self._stream_pos = 0
+        # 首个请求：确认服务器支持 Range 并取得文件大小
+        self._open(0)
+
+    def _open(self, pos: int):
+        self._close_stream()
+        headers = dict(self.headers)
+        headers["Range"] = f"bytes={pos}-"
+        headers["Accept-Encoding"] = "identity"
+        if self._validator:
+            # 远端文件在读取过程中被替换时服务器返回 200 而不是 206
+            headers["If-Range"] = self._validator
+        stack = ExitStack()
+        try:
+            response = stack.enter_context(open_stream(self.url, headers=headers, timeout=self.timeout,
+                                                       **self.request_kwargs))
+            response.raise_for_status()
+            match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+            if response.status_code != 206 or not match:
+                if self._validator:
+                    raise RuntimeError(f"远端文件在读取过程中发生变化：{self.url}")
+                raise RangeNotSupported(self.url)
+            if self._validator is None:
+                self.size = int(match.group(1))
+                etag = response.headers.get("ETag", "")
+                # If-Range 只接受强 ETag
+                self._validator = (etag if etag and not etag.startswith("W/")
+                                   else response.headers.get("Last-Modified", ""))
+        except BaseException:
+            stack.close()
+            raise
+        self._stack = stack
+        self._raw = response.raw
+        self._stream_pos = pos
+
+    def _close_stream(self):
+        if self._stack is not None:
+            self._stack.close()
+        self._stack = None
+        self._raw = None
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self.size - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b""
+        if self._raw is not None and 0 < self._pos - self._stream_pos <= _SKIP_AHEAD_BYTES:
+            self._consume(self._pos - self._stream_pos)
+        if self._raw is None or self._stream_pos != self._pos:
+            self._open(self._pos)
+        data = self._consume(size)
+        self._pos += len(data)
+        return data
+
+    def _consume(self, size: int) -> bytes:
+        parts: List[bytes] = []
+        received = 0
+        with metrics.phase("body"):
+            while size > 0:
+                part = self._raw.read(min(size, _READ_CHUNK))
+                if not part:
+                    break
+                parts.append(part)
+                size -= len(part)
+                received += len(part)
+        self._stream_pos += received
+        self.bytes_fetched += received
+        metrics.add_bytes("download", received)
+        return b"".join(parts)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._close_stream()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------
+# WAV：由文件头计算字节区间
+# ---------------------------
+_WAV_PCM = 1
+_WAV_FLOAT = 3
+_WAV_EXTENSIBLE = 0xFFFE
+
+# (格式码, 位深) -> numpy dtype；24位整数单独处理
+_WAV_DTYPES = {
+    (_WAV_PCM, 8): np.uint8,
+    (_WAV_PCM, 16): np.dtype("<i2"),
+    (_WAV_PCM, 32): np.dtype("<i4"),
+    (_WAV_FLOAT, 32): np.dtype("<f4"),
+    (_WAV_FLOAT, 64): np.dtype("<f8"),
+}
+
+
+def _read_exact(fp, size: int) -> bytes:
+    data = fp.read(size)
+    if len(data) < size:
+        raise ValueError("音频文件不完整")
+    return data
+
+
+def _wav_layout(fp):
+    """解析WAV文件头，返回 (格式码, 声道数, 采样率, 位深, 数据起始位置, 数据字节数)；非WAV或不支持的编码返回 None"""
+    fp.seek(0)
+    riff = fp.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        return None
+    fmt = None
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id == b"fmt ":
+            body = _read_exact(fp, size)
+            fp.seek(size & 1, io.SEEK_CUR)
+            tag, channels, rate, _, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+            if tag == _WAV_EXTENSIBLE and size >= 26:
+                tag = struct.unpack("<H", body[24:26])[0]
+            if block_align != channels * bits // 8 or ((tag, bits) not in _WAV_DTYPES and (tag, bits) != (_WAV_PCM, 24)):
+                return None
+            fmt = (tag, channels, rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            start = fp.tell()
+            # 边录边写的文件 data 长度可能未回填，以实际文件大小为准
+            end = fp.seek(0, io.SEEK_END)
+            return fmt + (start, min(size, end - start))
+        else:
+            fp.seek(size + (size & 1), io.SEEK_CUR)
+
+
+def _wav_samples(raw: bytes, tag: int, bits: int) -> np.ndarray:
+    """PCM/浮点字节数据 -> 值域 -1~1 的 float32 数组（与 soundfile 的归一化方式一致）"""
+    if (tag, bits) == (_WAV_PCM, 24):
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = (b[:, 0] << 8) | (b[:, 1] << 16) | (b[:, 2] << 24)
+        return values.astype(np.float32) / np.float32(2 ** 31)
+    values = np.frombuffer(raw, dtype=_WAV_DTYPES[(tag, bits)])
+    if tag == _WAV_FLOAT:
+        return values.astype(np.float32)
+    if bits == 8:
+        return (values.astype(np.float32) - 128) / np.float32(128)
+    return values.astype(np.float32) / np.float32(2 ** (bits - 1))
+
+
+def _read_wav_window(fp, offset: float, duration: float):
+    layout = _wav_layout(fp)
+    if layout is None:
+        return None
+    tag, channels, rate, bits, data_start, data_bytes = layout
+    frame_bytes = channels * bits // 8
+    total = data_bytes // frame_bytes
+    first = min(int(round(offset * rate)), total)
+    last = min(first + int(round(duration * rate)), total) if duration > 0 else total
+    fp.seek(data_start + first * frame_bytes)
+    raw = _read_exact(fp, (last - first) * frame_bytes)
+    samples = _wav_samples(raw, tag, bits).reshape(-1, channels)
+    return torch.from_numpy(np.ascontiguousarray(samples.T)), rate
+
+
+# ---------------------------
+# FLAC：由 SEEKTABLE 定位帧
+# ---------------------------
+_FLAC_STREAMINFO = 0
+_FLAC_SEEKTABLE = 3
+_FLAC_PLACEHOLDER = 0xFFFFFFFFFFFFFFFF
+
+
+def _flac_layout(fp):
+    """解析FLAC元数据，返回 (STREAMINFO, 寻址点[(采样序号, 帧字节偏移)], 音频帧起始位置)；非FLAC返回 None"""
+    fp.seek(0)
+    magic = fp.read(4)
+    if magic[:3] == b"ID3":
+        # 跳过 ID3v2 标签（长度为 syncsafe 整数）
+        header = magic + _read_exact(fp, 6)
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        fp.seek(10 + size)
+        magic = fp.read(4)
+    if magic != b"fLaC":
+        return None
+    streaminfo = None
+    seekpoints: List[Tuple[int, int]] = []
+    while True:
+        header = _read_exact(fp, 4)
+        block_type = header[0] & 0x7F
+        length = int.from_bytes(header[1:], "big")
+        if block_type == _FLAC_STREAMINFO:
+            streaminfo = _read_exact(fp, length)
+        elif block_type == _FLAC_SEEKTABLE:
+            body = _read_exact(fp, length)
+            for i in range(0, length - length % 18, 18):
+                sample, byte_offset, _ = struct.unpack(">QQH", body[i:i + 18])
+                if sample != _FLAC_PLACEHOLDER:
+                    seekpoints.append((sample, byte_offset))
+        else:
+            fp.seek(length, io.SEEK_CUR)
+        if header[0] & 0x80:
+            break
+    if streaminfo is None or len(streaminfo) < 34:
+        return None
+    return streaminfo, sorted(seekpoints), fp.tell()
+
+
+def _read_flac_window(fp, offset: float, duration: float):
+    layout = _flac_layout(fp)
+    if layout is None:
+        return None
+    streaminfo, seekpoints, audio_start = layout
+    if not seekpoints:
+        return None
+    fields = int.from_bytes(streaminfo[10:18], "big")
+    rate = fields >> 44
+    total = fields & (2 ** 36 - 1)
+    if rate == 0 or total == 0:
+        return None
+    first = min(int(round(offset * rate)), total)
+    last = min(first + int(round(duration * rate)), total) if duration > 0 else total
+
+    # 片段之前最近的寻址点，和片段之后最近的寻址点（没有时读到文件末尾）
+    begin_sample, begin_offset = max((p for p in seekpoints if p[0] <= first), default=(0, 0))
+    end = next((p for p in seekpoints if p[0] >= last), None)
+    fp.seek(audio_start + begin_offset)
+    frames = fp.read(end[1] - begin_offset) if end is not None else fp.read()
+    covered = (end[0] if end is not None else total) - begin_sample
+
+    # 拼接成只含这部分帧的独立FLAC流：STREAMINFO 的总采样数改为实际覆盖的数量，MD5 清零（未知）
+    info = bytearray(streaminfo[:34])
+    info[13] = (info[13] & 0xF0) | ((covered >> 32) & 0x0F)
+    info[14:18] = (covered & 0xFFFFFFFF).to_bytes(4, "big")
+    info[18:34] = bytes(16)
+    stream = b"fLaC" + bytes([0x80 | _FLAC_STREAMINFO]) + (34).to_bytes(3, "big") + bytes(info) + frames
+
+    # 不能用 sf.read：它会先 seek 到开头，而这些帧的采样序号并不从0开始
+    with sf.SoundFile(io.BytesIO(stream)) as f:
+        rate = f.samplerate
+        data = f.read(dtype="float32", always_2d=True)
+    data = data[first - begin_sample:last - begin_sample]
+    return torch.from_numpy(np.ascontiguousarray(data.T)), rate
+
+
+# ---------------------------
+# 其他格式：顺序解码到片段结束
+# ---------------------------
+def _read_generic_window(fp, offset: float, duration: float):
+    fp.seek(0)
+    with sf.SoundFile(fp) as f:
+        rate = f.samplerate
+        first = int(round(offset * rate))
+        if f.frames > 0:
+            first = min(first, f.frames)
+        f.seek(first)
+        frames = int(round(duration * rate)) if duration > 0 else -1
+        data = f.read(frames, dtype="float32", always_2d=True)
+    return torch.from_numpy(np.ascontiguousarray(data.T)), rate
+
+
+def read_window(fp, offset: float = 0.0, duration: float = 0.0):
+    """
+    从可 seek 的文件对象中解码 [offset, offset + duration) 片段
+
+    Args:
+        offset: 起始位置（秒）
+        duration: 片段时长（秒，0表示读到结尾）
+    Returns:
+        (waveform [C,T] float32, 采样率)
+    """
+    for reader in (_read_wav_window, _read_flac_window):
+        result = reader(fp, offset, duration)
+        if result is not None:
+            return result
+    return _read_generic_window(fp, offset, duration)
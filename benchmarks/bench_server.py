@@ -0,0 +1,321 @@
+"""
+基准测试用的本地 HTTP 服务（代替真实的资源服务器和 OSS）
+
+资源下载：GET/HEAD /files/<名称>，通过查询参数模拟不同的服务器行为（其余参数忽略，可用于生成不同的URL）
+    latency=<秒>   响应头之前的延迟（模拟往返时间）
+    rate=<字节/秒> 限制发送速度（模拟慢速链路）
+    range=0        不支持 Range 请求
+    chunked=1      使用分块传输编码（不发送 Content-Length）
+    etag=0         不发送 ETag / Last-Modified（无法做条件请求）
+
+OSS：其余路径按 /<bucket>/<key> 处理（oss2 对 IP endpoint 使用路径形式），支持简单上传、
+分片上传（初始化 / 上传分片 / 列出分片 / 完成 / 取消）、HEAD、服务端复制和删除；
+只记录对象大小，不保存上传的数据。延迟和限速由 oss_latency / oss_rate 统一设置
+"""
+
+import hashlib
+import re
+import threading
+import time
+import urllib.parse
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+SEND_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+_PART_NUMBER_RE = re.compile(rb"<PartNumber>(\d+)</PartNumber>")
+
+
+def file_url(address: str, name: str, **params) -> str:
+    """资源的下载地址，params 为模拟参数（见模块说明）"""
+    query = urllib.parse.urlencode({k: v for k, v in params.items() if v not in (None, "")})
+    return f"http://{address}/files/{urllib.parse.quote(name)}" + (f"?{query}" if query else "")
+
+
+class BenchServer:
+    """
+    在后台线程中运行的本地服务
+
+    用法：
+        server = BenchServer()
+        server.add_file("a.png", data)
+        url = server.url("a.png", latency=0.02)
+        ...
+        server.close()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 oss_latency: float = 0.0, oss_rate: float = 0.0):
+        self.files: Dict[str, Tuple[bytes, str, str]] = {}  # 名称 -> (数据, ETag, Content-Type)
+        self.objects: Dict[str, Tuple[int, str]] = {}  # /bucket/key -> (大小, ETag)
+        self.uploads: Dict[str, Dict] = {}  # 分片上传 ID -> {"key", "parts": {序号: (大小, ETag)}}
+        self.oss_latency = oss_latency
+        self.oss_rate = oss_rate
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.last_modified = formatdate(usegmt=True)
+        self._lock = threading.Lock()
+        self._upload_seq = 0
+
+        handler = type("BenchHandler", (_Handler,), {"bench": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="bench-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def address(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def add_file(self, name: str, data: bytes, content_type: str = "application/octet-stream"):
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        self.files[name] = (data, etag, content_type)
+
+    def url(self, name: str, **params) -> str:
+        return file_url(self.address, name, **params)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+            }
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _count(self, sent: int = 0, received: int = 0):
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def _next_upload_id(self) -> str:
+        with self._lock:
+            self._upload_seq += 1
+            return f"upload-{self._upload_seq}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    bench: BenchServer = None
+
+    def log_message(self, *args):
+        pass
+
+    # ---------------------------
+    # 通用
+    # ---------------------------
+    def _parse(self):
+        parts = urllib.parse.urlsplit(self.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(parts.query, keep_blank_values=True).items()}
+        with self.bench._lock:
+            self.bench.requests += 1
+        return urllib.parse.unquote(parts.path), query
+
+    def _write(self, data: bytes, rate: float = 0.0, chunked: bool = False):
+        """按限速发送数据（rate 为 0 时不限速）"""
+        started = time.monotonic()
+        sent = 0
+        for start in range(0, len(data), SEND_CHUNK_SIZE):
+            chunk = data[start:start + SEND_CHUNK_SIZE]
+            if chunked:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            else:
+                self.wfile.write(chunk)
+            sent += len(chunk)
+            if rate > 0:
+                delay = sent / rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+        self.bench._count(sent=sent)
+
+    def _read_body(self, rate: float = 0.0) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        started = time.monotonic()
+        chunks = []
+        received = 0
+        while received < length:
+            chunk = self.rfile.read(min(SEND_CHUNK_SIZE, length - received))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+            if rate > 0:
+                delay = received / rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+        self.bench._count(received=received)
+        return b"".join(chunks)
+
+    def _respond(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None,
+                 head: bool = False):
+        self.send_response(status)
+        self.send_header("x-oss-request-id", "bench")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and not head:
+            self._write(body)
+
+    def _xml(self, status: int, body: str, headers: Optional[Dict[str, str]] = None):
+        self._respond(status, body.encode(), dict(headers or {}, **{"Content-Type": "application/xml"}))
+
+    def _oss_error(self, status: int, code: str, head: bool = False):
+        if head:
+            return self._respond(status, head=True)
+        self._xml(status, f"<Error><Code>{code}</Code><RequestId>bench</RequestId></Error>")
+
+    # ---------------------------
+    # 资源下载
+    # ---------------------------
+    def _serve_file(self, name: str, query: Dict[str, str], head: bool):
+        latency = float(query.get("latency", 0))
+        if latency > 0:
+            time.sleep(latency)
+        record = self.bench.files.get(name)
+        if record is None:
+            return self._respond(404, head=head)
+        data, etag, content_type = record
+        use_range = query.get("range", "1") != "0"
+        use_etag = query.get("etag", "1") != "0"
+        chunked = query.get("chunked", "0") == "1"
+
+        headers = {"Content-Type": content_type}
+        if use_etag:
+            headers["ETag"] = etag
+            headers["Last-Modified"] = self.bench.last_modified
+            if self.headers.get("If-None-Match") == etag:
+                return self._respond(304, headers=headers, head=True)
+        if use_range:
+            headers["Accept-Ranges"] = "bytes"
+
+        status, body = 200, data
+        match = _RANGE_RE.match(self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if use_range and match and (if_range is None or if_range == etag):
+            first, last = match.groups()
+            if first:
+                start, end = int(first), min(int(last) if last else len(data) - 1, len(data) - 1)
+            else:
+                start, end = max(len(data) - int(last or 0), 0), len(data) - 1
+            if start >= len(data):
+                return self._respond(416, headers={"Content-Range": f"bytes */{len(data)}"}, head=head)
+            status, body = 206, data[start:end + 1]
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self._write(body, float(query.get("rate", 0)), chunked)
+
+    # ---------------------------
+    # OSS
+    # ---------------------------
+    def _oss_begin(self):
+        if self.bench.oss_latency > 0:
+            time.sleep(self.bench.oss_latency)
+
+    def do_GET(self):
+        path, query = self._parse()
+        if path.startswith("/files/"):
+            return self._serve_file(path[len("/files/"):], query, head=False)
+        self._oss_begin()
+        upload = self.bench.uploads.get(query.get("uploadId", ""))
+        if "uploadId" in query:
+            if upload is None:
+                return self._oss_error(404, "NoSuchUpload")
+            parts = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><LastModified>2020-01-01T00:00:00.000Z</LastModified>"
+                f"<ETag>{etag}</ETag><Size>{size}</Size></Part>"
+                for number, (size, etag) in sorted(upload["parts"].items())
+            )
+            return self._xml(200, "<ListPartsResult><Bucket>bench</Bucket><Key>key</Key><UploadId>id</UploadId>"
+                                  "<IsTruncated>false</IsTruncated><NextPartNumberMarker>0</NextPartNumberMarker>"
+                                  f"<MaxParts>1000</MaxParts>{parts}</ListPartsResult>")
+        self._oss_error(404, "NoSuchKey")
+
+    def do_HEAD(self):
+        path, query = self._parse()
+        if path.startswith("/files/"):
+            return self._serve_file(path[len("/files/"):], query, head=True)
+        self._oss_begin()
+        record = self.bench.objects.get(path)
+        if record is None:
+            return self._oss_error(404, "NoSuchKey", head=True)
+        self.send_response(200)
+        self.send_header("x-oss-request-id", "bench")
+        self.send_header("Content-Length", str(record[0]))
+        self.send_header("ETag", record[1])
+        self.end_headers()
+
+    def do_PUT(self):
+        path, query = self._parse()
+        self._oss_begin()
+        copy_source = self.headers.get("x-oss-copy-source")
+        body = self._read_body(self.bench.oss_rate)
+        if copy_source:
+            source = "/" + urllib.parse.unquote(copy_source).lstrip("/")
+            record = self.bench.objects.get(source)
+            if record is None:
+                return self._oss_error(404, "NoSuchKey")
+            if_match = self.headers.get("x-oss-copy-source-if-match")
+            if if_match and if_match.strip('"') != record[1].strip('"'):
+                return self._oss_error(412, "PreconditionFailed")
+            self.bench.objects[path] = record
+            return self._xml(200, f"<CopyObjectResult><ETag>{record[1]}</ETag>"
+                                  "<LastModified>2020-01-01T00:00:00.000Z</LastModified></CopyObjectResult>")
+
+        etag = '"%s"' % hashlib.md5(body).hexdigest().upper()
+        if "uploadId" in query:
+            upload = self.bench.uploads.get(query["uploadId"])
+            if upload is None:
+                return self._oss_error(404, "NoSuchUpload")
+            upload["parts"][int(query["partNumber"])] = (len(body), etag)
+        else:
+            self.bench.objects[path] = (len(body), etag)
+        self._respond(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        path, query = self._parse()
+        self._oss_begin()
+        body = self._read_body()
+        if "uploads" in query:
+            upload_id = self.bench._next_upload_id()
+            self.bench.uploads[upload_id] = {"key": path, "parts": {}}
+            return self._xml(200, "<InitiateMultipartUploadResult><Bucket>bench</Bucket>"
+                                  f"<Key>{path}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+        if "uploadId" in query:
+            upload = self.bench.uploads.pop(query["uploadId"], None)
+            if upload is None:
+                return self._oss_error(404, "NoSuchUpload")
+            numbers = [int(n) for n in _PART_NUMBER_RE.findall(body)]
+            size = sum(upload["parts"][n][0] for n in numbers)
+            etag = '"%s-%d"' % (hashlib.md5(path.encode()).hexdigest().upper(), len(numbers))
+            self.bench.objects[path] = (size, etag)
+            return self._xml(200, f"<CompleteMultipartUploadResult><ETag>{etag}</ETag></CompleteMultipartUploadResult>",
+                             {"ETag": etag})
+        self._oss_error(400, "InvalidRequest")
+
+    def do_DELETE(self):
+        path, query = self._parse()
+        self._oss_begin()
+        if "uploadId" in query:
+            self.bench.uploads.pop(query["uploadId"], None)
+        else:
+            self.bench.objects.pop(path, None)
+        self._respond(204)
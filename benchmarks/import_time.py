@@ -0,0 +1,199 @@
+"""
+节点包导入与节点注册耗时的基准测试
+
+ComfyUI 启动时导入 custom_nodes 下的每个包并读取节点定义（INPUT_TYPES / define_schema），
+节点包的导入耗时直接计入 ComfyUI 的启动时间。本脚本在独立子进程中：
+    1. 预先导入 ComfyUI 启动时已加载的模块（torch、numpy、PIL、aiohttp、comfy_api 等，不计入）
+    2. 计时导入本节点包（执行包的 __init__）
+    3. 计时注册：comfy_entrypoint() -> get_node_list()，并读取每个节点的输入定义
+    4. 检查注册完成后是否已加载重量级依赖（requests、oss2、torchaudio、soundfile 等应在首次执行时才导入）
+    5. 以 ComfyUI 目录为工作目录启动一个解码进程（见 decode_pool），检查其没有导入 ComfyUI 的 server 等模块
+每次测量使用新的子进程（冷导入），结果（中位数/最小/最大耗时、已加载的重量级模块）输出为 JSON
+
+用法（需在 ComfyUI 的 Python 环境中运行，默认 ComfyUI 目录为 custom_nodes 的上一级）：
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 20 --max-ms 200 --strict
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+# 被测节点包的导入名（目录名可能含连字符，不能直接 import）
+PACKAGE_NAME = "url_loader_bench_target"
+
+# ComfyUI 加载自定义节点前已导入的模块（不计入节点包的导入耗时）
+BASELINE_MODULES = [
+    "torch", "numpy", "PIL.Image", "aiohttp", "typing_extensions",
+    "folder_paths", "comfy.model_management", "comfy_api.latest",
+]
+
+# 节点注册时不应导入的模块（首次执行节点时才导入）
+HEAVY_MODULES = ["requests", "urllib3", "oss2", "torchaudio", "soundfile", "av"]
+
+# 解码进程不应导入的模块（ComfyUI 服务及其依赖、torch）
+WORKER_FORBIDDEN_MODULES = ["server", "nodes", "execution", "folder_paths", "comfy", "comfy_api", "torch"]
+
+
+def _import_package():
+    """按包导入节点包并执行其 __init__（与 ComfyUI 加载 custom_nodes 的方式相同）"""
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(PACKAGE_DIR, "__init__.py"),
+        submodule_search_locations=[PACKAGE_DIR],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _register(package):
+    """读取全部节点的输入定义（与 ComfyUI 构建 /object_info 相同）"""
+    nodes = list(getattr(package, "NODE_CLASS_MAPPINGS", {}).values())
+    entrypoint = getattr(package, "comfy_entrypoint", None)
+    if entrypoint is not None:
+        async def node_list():
+            extension = await entrypoint()
+            return await extension.get_node_list()
+        nodes += [node for node in asyncio.run(node_list()) if node not in nodes]
+    for node in nodes:
+        if hasattr(node, "define_schema"):
+            node.define_schema()
+        else:
+            node.INPUT_TYPES()
+    return len(nodes)
+
+
+def _decode_worker_modules(package, comfyui_dir: str) -> List[str]:
+    """以 ComfyUI 目录为工作目录（与 ComfyUI 运行时相同）启动解码进程，返回其导入的禁止模块"""
+    decode_pool = importlib.import_module(f"{package.__name__}.decode_pool")
+    cwd = os.getcwd()
+    os.chdir(comfyui_dir)
+    pool = decode_pool.DecodePool(1)
+    try:
+        modules = pool.run({"kind": "modules"})["modules"]
+    finally:
+        pool.close()
+        os.chdir(cwd)
+    return sorted(name for name in modules if name.split(".")[0] in WORKER_FORBIDDEN_MODULES)
+
+
+def run_once(comfyui_dir: str, baseline: List[str], check_worker: bool = False) -> Dict[str, Any]:
+    """在当前进程中测量一次（需要全新的进程）"""
+    if comfyui_dir not in sys.path:
+        sys.path.insert(0, comfyui_dir)
+    missing = []
+    for name in baseline:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            missing.append(name)
+    already_loaded = {name for name in HEAVY_MODULES if name in sys.modules}
+
+    # 节点包的提示信息输出到 stderr，stdout 只输出结果
+    with contextlib.redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        package = _import_package()
+        imported = time.perf_counter()
+        node_count = _register(package)
+        registered = time.perf_counter()
+
+    return {
+        "decode_worker_forbidden_modules": _decode_worker_modules(package, comfyui_dir) if check_worker else [],
+        "import_ms": (imported - started) * 1000,
+        "register_ms": (registered - imported) * 1000,
+        "node_count": node_count,
+        "baseline_missing": missing,
+        "heavy_modules_loaded": sorted(name for name in HEAVY_MODULES
+                                       if name in sys.modules and name not in already_loaded),
+    }
+
+
+def _spawn(comfyui_dir: str, baseline: List[str], check_worker: bool = False) -> Dict[str, Any]:
+    args = json.dumps({"comfyui_dir": comfyui_dir, "baseline": baseline, "check_worker": check_worker})
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--once", args],
+        capture_output=True, text=True, check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import benchmark failed:\n{completed.stderr.strip()}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    return {
+        "median": round(statistics.median(values), 2),
+        "min": round(min(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="URL loader package import-time benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="测量次数（每次一个新进程）")
+    parser.add_argument("--baseline", default=",".join(BASELINE_MODULES),
+                        help="逗号分隔的预先导入模块（模拟 ComfyUI 启动时已加载的模块）")
+    parser.add_argument("--comfyui", default=os.path.abspath(os.path.join(PACKAGE_DIR, "..", "..")),
+                        help="ComfyUI 目录（导入 comfy_api、folder_paths 等）")
+    parser.add_argument("--max-ms", type=float, default=0.0,
+                        help="导入 + 注册耗时中位数的上限（毫秒），超出时返回非零退出码（0 不检查）")
+    parser.add_argument("--strict", action="store_true", help="注册时加载了重量级模块或解码进程导入了 ComfyUI 模块时返回非零退出码")
+    parser.add_argument("--output", help="JSON 报告路径（默认输出到 stdout）")
+    parser.add_argument("--once", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.once:
+        params = json.loads(args.once)
+        print(json.dumps(run_once(params["comfyui_dir"], params["baseline"], params["check_worker"])))
+        return 0
+
+    baseline = [name for name in args.baseline.split(",") if name.strip()]
+    comfyui_dir = os.path.abspath(args.comfyui)
+    # 只在第一次测量后检查解码进程（检查在计时之后进行，不影响耗时）
+    runs = [_spawn(comfyui_dir, baseline, check_worker=(i == 0)) for i in range(max(1, args.runs))]
+    total = [run["import_ms"] + run["register_ms"] for run in runs]
+    heavy = sorted({name for run in runs for name in run["heavy_modules_loaded"]})
+    report = {
+        "runs": len(runs),
+        "node_count": runs[0]["node_count"],
+        "import_ms": _stats([run["import_ms"] for run in runs]),
+        "register_ms": _stats([run["register_ms"] for run in runs]),
+        "total_ms": _stats(total),
+        "heavy_modules_loaded": heavy,
+        "decode_worker_forbidden_modules": runs[0]["decode_worker_forbidden_modules"],
+        "baseline_missing": runs[0]["baseline_missing"],
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    failed = False
+    if args.max_ms and report["total_ms"]["median"] > args.max_ms:
+        print(f"[import_time] median {report['total_ms']['median']}ms exceeds {args.max_ms}ms", file=sys.stderr)
+        failed = True
+    if args.strict and heavy:
+        print(f"[import_time] heavy modules loaded at registration: {', '.join(heavy)}", file=sys.stderr)
+        failed = True
+    if args.strict and report["decode_worker_forbidden_modules"]:
+        print(f"[import_time] decode worker imported: {', '.join(report['decode_worker_forbidden_modules'])}",
+              file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
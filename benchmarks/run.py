@@ -0,0 +1,400 @@
+"""
+URL 加载节点与 OSS 上传节点的离线基准测试
+
+启动本地模拟服务（bench_server），按 场景 × 数据大小 × 并发数 矩阵驱动各节点：
+    image     LoadImageFromURL（JPEG）
+    audio     LoadAudioFromURL（FLAC，重采样到 16kHz）
+    resource  URLResourceLoader（JPEG 图片 / WAV 音频）
+    video     ComfyVideoURLLoader（只下载到缓存，VIDEO 对象延迟解码）
+    oss       OSS_Upload（多个小文件 / 分片上传的大文件）
+
+每个用例在独立子进程中以空缓存执行（每次调用使用不同的URL，全部为冷下载），
+峰值内存和CPU时间互不影响；结果（吞吐量、p50/p99 延迟、峰值 RSS、CPU 时间）输出为 JSON，
+用于比较不同版本
+
+用法（需在 ComfyUI 的 Python 环境中运行，默认 ComfyUI 目录为 custom_nodes 的上一级）：
+    python benchmarks/run.py --output report.json
+    python benchmarks/run.py --scenarios image,audio --concurrency 1,8 --iterations 50 --latency 0.02
+    python benchmarks/run.py --quick --chunked --no-range
+"""
+
+import argparse
+import asyncio
+import importlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+# 被测节点包的导入名（目录名可能含连字符，不能直接 import）
+PACKAGE_NAME = "url_loader_bench_target"
+
+sys.path.insert(0, BENCH_DIR)
+from bench_server import BenchServer, file_url  # noqa: E402
+
+SCENARIOS = ["image", "audio", "resource", "video", "oss"]
+
+# 场景 -> {大小标签: 参数}；--quick 只使用每个场景的第一项
+MATRIX = {
+    "image": {"512px": 512, "2048px": 2048, "4096px": 4096},
+    "audio": {"10s": 10, "60s": 60, "300s": 300},
+    "resource": {"image-2048px": ("image", 2048), "audio-60s": ("audio", 60)},
+    "video": {"8MB": 8, "64MB": 64, "256MB": 256},
+    "oss": {"20x1MB": (20, 1), "1x256MB": (1, 256)},
+}
+
+OSS_BUCKET = "bench"
+
+
+# ---------------------------
+# 测试数据
+# ---------------------------
+def _make_jpeg(size: int) -> bytes:
+    from PIL import Image
+    # 渐变加噪声，压缩率接近真实照片
+    rng = np.random.default_rng(size)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    pixels = np.stack([x, y, (x + y) / 2], axis=-1) * 200 + rng.normal(0, 12, (size, size, 3))
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _make_audio(seconds: int, audio_format: str, sample_rate: int = 44100) -> bytes:
+    import soundfile as sf
+    t = np.arange(seconds * sample_rate, dtype=np.float32) / sample_rate
+    rng = np.random.default_rng(seconds)
+    left = 0.3 * np.sin(2 * np.pi * (220 + 40 * t) * t) + rng.normal(0, 0.02, t.shape)
+    right = 0.3 * np.sin(2 * np.pi * 330 * t) + rng.normal(0, 0.02, t.shape)
+    buffer = io.BytesIO()
+    sf.write(buffer, np.stack([left, right], axis=1).astype(np.float32), sample_rate,
+             format=audio_format.upper(), subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def prepare_fixtures(server: BenchServer, scenarios: List[str], sizes: Dict[str, Dict[str, Any]],
+                     work_dir: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """生成测试数据并注册到模拟服务，返回 {场景: {大小标签: 用例参数}}"""
+    fixtures: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for scenario in scenarios:
+        fixtures[scenario] = {}
+        for label, param in sizes[scenario].items():
+            if scenario == "image" or (scenario == "resource" and param[0] == "image"):
+                pixels = param if scenario == "image" else param[1]
+                name, data, content_type = f"image_{pixels}.jpg", _make_jpeg(pixels), "image/jpeg"
+            elif scenario == "audio":
+                name, data, content_type = f"audio_{param}s.flac", _make_audio(param, "flac"), "audio/flac"
+            elif scenario == "resource":
+                name, data, content_type = f"audio_{param[1]}s.wav", _make_audio(param[1], "wav"), "audio/wav"
+            elif scenario == "video":
+                # 加载节点只下载并创建延迟解码的 VIDEO 对象，内容不影响测试
+                name, data, content_type = f"video_{param}mb.mp4", os.urandom(param * 1024 * 1024), "video/mp4"
+            else:
+                count, megabytes = param
+                folder = os.path.join(work_dir, "output", label)
+                os.makedirs(folder, exist_ok=True)
+                files = []
+                for i in range(count):
+                    filename = f"file_{i:03d}.bin"
+                    with open(os.path.join(folder, filename), "wb") as f:
+                        f.write(os.urandom(megabytes * 1024 * 1024))
+                    files.append({"filename": filename, "subfolder": label})
+                fixtures[scenario][label] = {
+                    "output_dir": os.path.join(work_dir, "output"),
+                    "file_list": json.dumps({"files": files}),
+                    "bytes": count * megabytes * 1024 * 1024,
+                }
+                continue
+
+            server.add_file(name, data, content_type)
+            fixtures[scenario][label] = {"file": name, "bytes": len(data)}
+    return fixtures
+
+
+# ---------------------------
+# 子进程：执行单个用例
+# ---------------------------
+def _import_package(comfyui_dir: str):
+    """按包导入被测节点模块（不执行包的 __init__，避免注册扩展）"""
+    if comfyui_dir not in sys.path:
+        sys.path.insert(0, comfyui_dir)
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PACKAGE_DIR]
+    sys.modules[PACKAGE_NAME] = package
+
+
+def _node(module: str, name: str):
+    return getattr(importlib.import_module(f"{PACKAGE_NAME}.{module}"), name)
+
+
+def _make_call(case: Dict[str, Any]) -> Callable[[int], Any]:
+    """返回执行第 i 次调用的函数（video 返回协程）"""
+    scenario, fixture = case["scenario"], case["fixture"]
+
+    def url(i: int) -> str:
+        # 每次调用使用不同的URL，避免命中下载缓存和输出缓存
+        return file_url(case["address"], fixture.get("file", ""), n=f"{case['run_id']}-{i}", **case["server_params"])
+
+    if scenario == "image":
+        node = _node("LoadImageFromURL", "LoadImageFromURL")()
+        return lambda i: node.load_image(url(i), 0, 0)
+    if scenario == "audio":
+        node = _node("LoadAudioFromURL", "LoadAudioFromURL")
+        return lambda i: node.execute(url(i))
+    if scenario == "resource":
+        node = _node("url_resource_loader", "URLResourceLoader")()
+        return lambda i: node.load_from_url(url(i), 60)
+    if scenario == "video":
+        node = _node("LoadVideoFromURL", "ComfyVideoURLLoader")
+        return lambda i: node.execute(url(i), False, "bench")
+
+    node = _node("oss_uploader", "OSS_Upload")()
+    node.output_dir = fixture["output_dir"]
+
+    def upload(i: int):
+        result = json.loads(node.upload(
+            "bench-id", "bench-secret", "bench-token", OSS_BUCKET, case["address"],
+            f"{case['run_id']}-{i}", fixture["file_list"], delete_after_upload=False,
+        )[0])
+        if result.get("status") != "success":
+            raise RuntimeError(result.get("message") or result.get("failed_files"))
+        return result
+
+    return upload
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """线性插值百分位数（values 已排序）"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """在当前进程中执行用例并返回测量结果"""
+    _import_package(case["comfyui_dir"])
+    call = _make_call(case)
+    iterations, concurrency = case["iterations"], case["concurrency"]
+    is_async = case["scenario"] == "video"
+    errors: List[str] = []
+
+    def timed(i: int) -> float:
+        started = time.perf_counter()
+        try:
+            call(i)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        return time.perf_counter() - started
+
+    async def timed_async(i: int, semaphore: asyncio.Semaphore) -> float:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call(i)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            return time.perf_counter() - started
+
+    async def run_async(indexes) -> List[float]:
+        # 与 ComfyUI 一样在同一个事件循环中执行
+        semaphore = asyncio.Semaphore(concurrency)
+        return list(await asyncio.gather(*(timed_async(i, semaphore) for i in indexes)))
+
+    def run(indexes) -> List[float]:
+        if is_async:
+            return asyncio.run(run_async(indexes))
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(timed, indexes))
+
+    # 预热（建立连接池、加载编解码器等），不计入结果
+    run(range(-case["warmup"], 0))
+    errors.clear()
+    baseline_rss = _peak_rss_mb()
+
+    cpu_started = _cpu_time()
+    started = time.perf_counter()
+    latencies = sorted(run(range(iterations)))
+    wall = time.perf_counter() - started
+    cpu = _cpu_time() - cpu_started
+
+    total_bytes = case["fixture"]["bytes"] * (iterations - len(errors))
+    return {
+        "wall_time_s": round(wall, 4),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50) * 1000, 3),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "min": round(latencies[0] * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+        "throughput": {
+            "calls_per_s": round((iterations - len(errors)) / wall, 3),
+            "mb_per_s": round(total_bytes / wall / (1024 * 1024), 3),
+        },
+        "cpu_time_s": round(cpu, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+    }
+
+
+# ---------------------------
+# 主进程：启动服务，按矩阵执行用例
+# ---------------------------
+def _spawn_case(case: Dict[str, Any], cache_dir: str, timeout: float) -> Dict[str, Any]:
+    env = dict(os.environ, URL_LOADER_CACHE_DIR=cache_dir,
+               URL_LOADER_OSS_CHECKPOINT_DIR=os.path.join(cache_dir, "oss-upload"))
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+            env=env, capture_output=True, text=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"errors": case["iterations"], "error_samples": [f"case timed out after {timeout}s"]}
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    # 节点会向 stdout 打印日志，结果为最后一行
+    lines = completed.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {"errors": case["iterations"], "error_samples": [completed.stderr.strip()[-2000:]]}
+
+
+def _version_info() -> Dict[str, Any]:
+    try:
+        revision = subprocess.run(["git", "-C", PACKAGE_DIR, "rev-parse", "HEAD"],
+                                  capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _parse_list(value: str, convert=str) -> List[Any]:
+    return [convert(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="URL loader / OSS upload benchmarks")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"逗号分隔的场景（{', '.join(SCENARIOS)}）")
+    parser.add_argument("--concurrency", default="1,4,16", help="逗号分隔的并发调用数")
+    parser.add_argument("--iterations", type=int, default=20, help="每个用例的调用次数")
+    parser.add_argument("--warmup", type=int, default=1, help="每个用例的预热调用次数")
+    parser.add_argument("--quick", action="store_true", help="每个场景只测最小的数据")
+    parser.add_argument("--latency", type=float, default=0.0, help="资源服务器的响应延迟（秒）")
+    parser.add_argument("--rate", type=float, default=0.0, help="资源服务器每个连接的限速（字节/秒，0 不限速）")
+    parser.add_argument("--no-range", action="store_true", help="资源服务器不支持 Range")
+    parser.add_argument("--chunked", action="store_true", help="资源服务器使用分块传输编码")
+    parser.add_argument("--no-etag", action="store_true", help="资源服务器不发送 ETag")
+    parser.add_argument("--oss-latency", type=float, default=0.0, help="OSS 每个请求的延迟（秒）")
+    parser.add_argument("--oss-rate", type=float, default=0.0, help="OSS 每个连接的上传限速（字节/秒）")
+    parser.add_argument("--comfyui", default=os.path.abspath(os.path.join(PACKAGE_DIR, "..", "..")),
+                        help="ComfyUI 目录（导入 comfy_api、folder_paths 等）")
+    parser.add_argument("--case-timeout", type=float, default=1800, help="单个用例的超时时间（秒）")
+    parser.add_argument("--output", help="JSON 报告路径（默认输出到 stdout）")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    scenarios = _parse_list(args.scenarios)
+    unknown = sorted(set(scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    sizes = {s: dict(list(MATRIX[s].items())[:1]) if args.quick else MATRIX[s] for s in scenarios}
+    server_params = {
+        "latency": args.latency or None,
+        "rate": int(args.rate) or None,
+        "range": 0 if args.no_range else None,
+        "chunked": 1 if args.chunked else None,
+        "etag": 0 if args.no_etag else None,
+    }
+
+    server = BenchServer(oss_latency=args.oss_latency, oss_rate=args.oss_rate)
+    work_dir = tempfile.mkdtemp(prefix="url-loader-bench-")
+    results = []
+    try:
+        fixtures = prepare_fixtures(server, scenarios, sizes, work_dir)
+        for scenario in scenarios:
+            for label, fixture in fixtures[scenario].items():
+                for concurrency in _parse_list(args.concurrency, int):
+                    case = {
+                        "scenario": scenario,
+                        "size": label,
+                        "concurrency": concurrency,
+                        "iterations": args.iterations,
+                        "warmup": args.warmup,
+                        "fixture": fixture,
+                        "address": server.address,
+                        "server_params": server_params,
+                        "comfyui_dir": os.path.abspath(args.comfyui),
+                        "run_id": f"{scenario}-{label}-{concurrency}",
+                    }
+                    print(f"[bench] {scenario} {label} x{concurrency} ...", file=sys.stderr)
+                    measured = _spawn_case(case, tempfile.mkdtemp(dir=work_dir), args.case_timeout)
+                    results.append({
+                        "scenario": scenario,
+                        "size": label,
+                        "concurrency": concurrency,
+                        "iterations": args.iterations,
+                        "bytes_per_call": fixture["bytes"],
+                        **measured,
+                    })
+    finally:
+        server.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "version": _version_info(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("case", "output")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+多进程解码池（可选）
+大尺寸 PNG/TIFF/WebP 图片和 MP3/M4A/FLAC 等压缩音频的解码大部分在单个线程中完成，
+开启后加载节点把这类文件交给常驻的解码进程，多个节点/批量加载的多张图片可同时占用多个CPU核心：
+- 解码进程以独立解释器启动（不经过 multiprocessing 的 spawn，避免重新执行 ComfyUI 的启动脚本），
+  通过 socketpair 接收任务，只导入解码所需的模块（不导入 torch，torchaudio 仅在 soundfile 无法解码时导入）
+- 解码结果（float32 像素/波形）写入共享内存目录（/dev/shm）中的文件，
+  主进程用 torch.from_file 直接映射为张量（不拷贝数据），映射后立即删除文件名，张量释放时内存随之释放
+- 增量解码已完成、文件较小或格式解码较快（JPEG、WAV）时仍在调用线程中解码
+- 解码进程出错或退出时，该次解码回退到调用线程执行，进程在下次使用时重新启动
+
+环境变量：
+    URL_LOADER_DECODE_PROCESSES  解码进程数（默认 0，不启用）
+    URL_LOADER_DECODE_MIN_BYTES  交给解码进程的最小文件大小（字节，默认 1MB，更小的文件进程间调度的开销大于收益）
+    URL_LOADER_DECODE_SHM_DIR    解码结果的中转目录（默认 /dev/shm，不存在时使用系统临时目录）
+"""
+
+from __future__ import annotations
+import os
+import sys
+import queue
+import socket
+import atexit
+import tempfile
+import threading
+import subprocess
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DECODE_PROCESSES = max(0, int(os.environ.get("URL_LOADER_DECODE_PROCESSES", 0)))
+DECODE_MIN_BYTES = int(os.environ.get("URL_LOADER_DECODE_MIN_BYTES", 1024 * 1024))
+SHM_DIR = os.environ.get("URL_LOADER_DECODE_SHM_DIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+# 交给解码进程的图片格式（JPEG 解码较快，且缩小输出时由 draft 在解码阶段降采样）
+IMAGE_FORMATS = ("PNG", "TIFF", "WEBP")
+
+_FILE_PREFIX = "url-loader-decode-"
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 解码进程的入口：以命名空间包导入本模块（包目录名可能含连字符，且不执行包的 __init__）
+# 先从 sys.path 去掉当前目录：ComfyUI 的工作目录是其主目录，否则会导入主目录下的 server.py 等模块
+_BOOTSTRAP = (
+    "import sys, types, importlib; "
+    "sys.path[:] = [p for p in sys.path if p not in ('', '.')]; "
+    "package = types.ModuleType('url_loader_decode'); package.__path__ = [sys.argv[1]]; "
+    "sys.modules['url_loader_decode'] = package; "
+    "importlib.import_module('url_loader_decode.decode_pool').worker_main(int(sys.argv[2]))"
+)
+
+
+class DecodeError(Exception):
+    """解码进程不可用（启动失败、意外退出或通信中断）"""
+
+
+# ---------------------------
+# 解码进程侧
+# ---------------------------
+def _output_file(out_dir: str, parent_pid: int, shape: Tuple[int, ...]) -> Tuple[str, np.memmap]:
+    """创建 float32 结果文件并映射为数组（预先分配空间，共享内存不足时报错而不是在写入时崩溃）"""
+    fd, path = tempfile.mkstemp(dir=out_dir, prefix=f"{_FILE_PREFIX}{parent_pid}-")
+    try:
+        size = int(np.prod(shape)) * 4
+        if size:
+            os.posix_fallocate(fd, 0, size)
+        array = np.memmap(path, dtype=np.float32, mode="r+", shape=shape) if size else np.empty(shape, np.float32)
+    except BaseException:
+        os.close(fd)
+        os.unlink(path)
+        raise
+    os.close(fd)
+    return path, array
+
+
+def _decode_image(task: Dict[str, Any]) -> Dict[str, Any]:
+    from PIL import Image
+    from .image_decode import open_image
+
+    img = open_image(task["path"], task["width"], task["height"], task["fast_decode"])
+    if task.get("resize_to") and img.size != tuple(task["resize_to"]):
+        img = img.resize(tuple(task["resize_to"]), Image.Resampling.LANCZOS)
+    pixels = np.asarray(img)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    path, out = _output_file(task["out_dir"], task["parent_pid"], pixels.shape)
+    try:
+        np.divide(pixels, 255.0, out=out, dtype=np.float32, casting="unsafe")
+        del out
+    except BaseException:
+        os.unlink(path)
+        raise
+    return {"file": path, "shape": pixels.shape}
+
+
+def _decode_audio(task: Dict[str, Any]) -> Dict[str, Any]:
+    import soundfile as sf
+
+    try:
+        data, sample_rate = sf.read(task["path"], dtype="float32", always_2d=True)
+        data = data.T  # [T,C] -> [C,T]
+    except sf.LibsndfileError:
+        # soundfile 无法解码的格式（如M4A）：交给 torchaudio
+        import torchaudio
+        waveform, sample_rate = torchaudio.load(task["path"])
+        data = waveform.numpy()
+    path, out = _output_file(task["out_dir"], task["parent_pid"], data.shape)
+    try:
+        out[...] = data
+        del out
+    except BaseException:
+        os.unlink(path)
+        raise
+    return {"file": path, "shape": data.shape, "sample_rate": sample_rate}
+
+
+def _loaded_modules(task: Dict[str, Any]) -> Dict[str, Any]:
+    """解码进程已导入的模块（检查解码进程没有导入 ComfyUI 的 server 等模块）"""
+    return {"modules": sorted(sys.modules)}
+
+
+_HANDLERS = {
+    "image": _decode_image,
+    "audio": _decode_audio,
+    "modules": _loaded_modules,
+}
+
+
+def worker_main(fd: int):
+    """解码进程主循环：逐个接收任务并返回 ("ok", 结果) 或 ("error", 错误信息)，主进程关闭连接时退出"""
+    conn = Connection(fd)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            reply = ("ok", _HANDLERS[task["kind"]](task))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            return
+
+
+# ---------------------------
+# 主进程侧
+# ---------------------------
+class _Worker:
+    def __init__(self):
+        parent_sock, child_sock = socket.socketpair()
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, "-c", _BOOTSTRAP, _PACKAGE_DIR, str(child_sock.fileno())],
+                pass_fds=(child_sock.fileno(),),
+                stdin=subprocess.DEVNULL,
+                cwd=_PACKAGE_DIR,
+            )
+        except BaseException:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+
+    def close(self):
+        # 关闭连接后解码进程读到 EOF 自行退出
+        self.conn.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class DecodePool:
+    """常驻解码进程池（线程安全；所有进程都在解码时调用方等待空闲进程）"""
+
+    def __init__(self, processes: int, out_dir: str = SHM_DIR):
+        self.processes = processes
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._started = 0
+        self._closed = False
+        _remove_stale_files(out_dir)
+
+    def _acquire(self) -> _Worker:
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise DecodeError("decode pool is closed")
+                if self._idle.empty() and self._started < self.processes:
+                    # 按需启动，直到达到进程数上限（包括补充意外退出的进程）
+                    self._started += 1
+                    try:
+                        return _Worker()
+                    except OSError as e:
+                        self._started -= 1
+                        raise DecodeError(f"failed to start decode process: {e}")
+            try:
+                worker = self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+            if worker.process.poll() is None:
+                return worker
+            # 空闲期间已退出（例如被系统终止）：丢弃后重新获取
+            self._discard(worker)
+
+    def _discard(self, worker: _Worker):
+        worker.close()
+        with self._lock:
+            self._started -= 1
+
+    def run(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """在空闲的解码进程中执行任务；解码失败抛出 ValueError，进程不可用抛出 DecodeError"""
+        worker = self._acquire()
+        task = dict(task, out_dir=self.out_dir, parent_pid=os.getpid())
+        try:
+            worker.conn.send(task)
+            status, value = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # 解码进程意外退出（例如解码库崩溃）：丢弃该进程，下次使用时重新启动
+            self._discard(worker)
+            raise DecodeError(f"decode process exited: {e}")
+        self._idle.put(worker)
+        if status != "ok":
+            raise ValueError(value)
+        return value
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _remove_stale_files(out_dir: str):
+    """删除已退出的进程遗留的解码结果文件"""
+    try:
+        names = os.listdir(out_dir)
+    except OSError:
+        return
+    for name in names:
+        if not name.startswith(_FILE_PREFIX):
+            continue
+        pid = name[len(_FILE_PREFIX):].split("-", 1)[0]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            try:
+                os.unlink(os.path.join(out_dir, name))
+            except OSError:
+                pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_pool: Optional[DecodePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[DecodePool]:
+    """获取进程内共享的解码池（未启用时返回 None）"""
+    global _pool
+    if DECODE_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = DecodePool(DECODE_PROCESSES)
+            atexit.register(_pool.close)
+        return _pool
+
+
+def _wrap(result: Dict[str, Any]):
+    """将解码结果文件映射为 float32 张量（零拷贝），映射后删除文件名"""
+    import torch  # 解码进程也导入本模块，torch 只在主进程中使用
+
+    shape: List[int] = list(result["shape"])
+    try:
+        numel = int(np.prod(shape))
+        if numel == 0:
+            return torch.empty(shape, dtype=torch.float32)
+        return torch.from_file(result["file"], shared=False, size=numel, dtype=torch.float32).view(shape)
+    finally:
+        os.unlink(result["file"])
+
+
+def _offload(task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    pool = get_pool()
+    if pool is None:
+        return None
+    try:
+        return pool.run(task)
+    except DecodeError as e:
+        print(f"[URLLoader] 解码进程不可用，改为在当前线程解码: {e}")
+        return None
+
+
+def _large_enough(path: str) -> bool:
+    try:
+        return os.path.getsize(path) >= DECODE_MIN_BYTES
+    except OSError:
+        return False
+
+
+def offload_image(entry, decoder, width=0, height=0, fast_decode=True, resize_to=None):
+    """
+    在解码进程中解码缓存文件中的图片（与 image_decode.decode_image 的结果相同）
+
+    Args:
+        decoder: 下载时的增量解码器（增量解码已完成时不交给解码进程）
+        resize_to: 解码后再缩放到的 (宽, 高)（批量加载统一尺寸）
+
+    Returns:
+        float32 [H,W,C] 张量（值域 0~1）；未启用或不适合交给解码进程时返回 None，由调用方解码
+    """
+    if get_pool() is None or decoder.finished or not _large_enough(entry.path):
+        return None
+    from PIL import Image
+    try:
+        with Image.open(entry.path) as probe:
+            if probe.format not in IMAGE_FORMATS:
+                return None
+    except Exception:
+        return None
+    result = _offload({
+        "kind": "image", "path": entry.path, "width": width, "height": height,
+        "fast_decode": fast_decode, "resize_to": resize_to,
+    })
+    if result is None:
+        return None
+    decoder.close()
+    return _wrap(result)
+
+
+def offload_audio(path: str):
+    """
+    在解码进程中解码音频文件（WAV 等无需解码的格式和小文件返回 None，由调用方解码）
+
+    Returns:
+        (float32 [C,T] 张量, 采样率) 或 None
+    """
+    if get_pool() is None or not _large_enough(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+    except OSError:
+        return None
+    if header[:4] in (b"RIFF", b"RF64") and header[8:12] == b"WAVE":
+        return None
+    result = _offload({"kind": "audio", "path": path})
+    if result is None:
+        return None
+    return _wrap(result), result["sample_rate"]
@@ -0,0 +1,249 @@
+"""
+共享HTTP下载引擎
+所有URL加载节点通过本模块发起请求：
+- 同步请求（图片/音频/通用资源）共用一个 requests.Session，按主机维护keep-alive连接池，
+  连接复用避免每次请求重新进行 TCP + TLS 握手
+- 异步请求（视频）每个事件循环共用一个 aiohttp.ClientSession（TCPConnector 连接池 + DNS缓存）
+- 按主机限制并发数，统一默认超时
+- 记录新建连接、等待响应头等阶段耗时到当前节点调用（见 metrics）
+
+环境变量：
+    URL_LOADER_CONNECT_TIMEOUT  连接超时（秒，默认 10）
+    URL_LOADER_READ_TIMEOUT     读取超时（秒，默认 60，节点可单独指定）
+    URL_LOADER_POOL_SIZE        每个主机的连接池大小（默认 16）
+    URL_LOADER_MAX_PER_HOST     每个主机的最大并发请求数（默认 8）
+    URL_LOADER_HOST_LIMITS      按主机覆盖并发数，例如 "cdn.example.com=16,oss-cn-hangzhou.aliyuncs.com=4"
+"""
+
+from __future__ import annotations
+import os
+import time
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Optional, Iterator
+from urllib.parse import urlparse
+
+from . import metrics
+
+if TYPE_CHECKING:
+    import requests
+
+CONNECT_TIMEOUT = float(os.environ.get("URL_LOADER_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.environ.get("URL_LOADER_READ_TIMEOUT", 60))
+POOL_SIZE = int(os.environ.get("URL_LOADER_POOL_SIZE", 16))
+MAX_PER_HOST = int(os.environ.get("URL_LOADER_MAX_PER_HOST", 8))
+
+
+def _parse_host_limits(value: str) -> Dict[str, int]:
+    limits = {}
+    for item in value.split(","):
+        host, _, limit = item.strip().partition("=")
+        if host and limit.strip().isdigit():
+            limits[host.lower()] = max(1, int(limit))
+    return limits
+
+
+HOST_LIMITS = _parse_host_limits(os.environ.get("URL_LOADER_HOST_LIMITS", ""))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_async_sessions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_async_semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+def host_limit(host: str) -> int:
+    """获取主机的最大并发请求数"""
+    return HOST_LIMITS.get(host, MAX_PER_HOST)
+
+
+def resolve_timeout(timeout: Optional[float]):
+    """将节点传入的超时时间转换为 (连接超时, 读取超时)"""
+    read_timeout = READ_TIMEOUT if timeout is None else timeout
+    return (min(CONNECT_TIMEOUT, read_timeout), read_timeout)
+
+
+# ---------------------------
+# 同步请求（requests）
+# ---------------------------
+_connect_time = threading.local()  # 当前线程本次请求中新建连接的耗时（从 ttfb 中扣除）
+
+
+def _timed_connect(connect):
+    def timed(self):
+        started = time.perf_counter()
+        try:
+            return connect(self)
+        finally:
+            elapsed = time.perf_counter() - started
+            _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + elapsed
+            metrics.record("connect", elapsed)
+    return timed
+
+
+def _timed_adapter_class():
+    """
+    新建连接时记录耗时（DNS + TCP + TLS）的连接池适配器
+    requests/urllib3 导入较慢，首次发起同步请求时才导入
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _TimedHTTPConnection(HTTPConnection):
+        connect = _timed_connect(HTTPConnection.connect)
+
+    class _TimedHTTPSConnection(HTTPSConnection):
+        connect = _timed_connect(HTTPSConnection.connect)
+
+    class _TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _TimedHTTPConnection
+
+    class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = _TimedHTTPSConnection
+
+    class _TimedHTTPAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": _TimedHTTPConnectionPool,
+                "https": _TimedHTTPSConnectionPool,
+            }
+
+    return _TimedHTTPAdapter
+
+
+def get_session() -> requests.Session:
+    """获取进程内共享的 requests.Session（按主机复用keep-alive连接）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            session = requests.Session()
+            adapter = _timed_adapter_class()(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _host_semaphore(host: str) -> threading.BoundedSemaphore:
+    with _session_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(host_limit(host))
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+
+@contextmanager
+def open_stream(url: str, method: str = "GET", timeout: Optional[float] = None,
+                **kwargs) -> Iterator[requests.Response]:
+    """
+    发起流式请求，退出上下文时关闭响应、连接归还连接池
+    同一主机的并发请求数受 host_limit 限制（整个响应读取期间占用名额）
+    """
+    semaphore = _host_semaphore(host_of(url))
+    with metrics.phase("queue"):
+        semaphore.acquire()
+    try:
+        kwargs.setdefault("allow_redirects", True)
+        _connect_time.seconds = 0.0
+        started = time.perf_counter()
+        response = get_session().request(method, url, stream=True,
+                                         timeout=resolve_timeout(timeout), **kwargs)
+        metrics.record("ttfb", time.perf_counter() - started - _connect_time.seconds)
+        try:
+            yield response
+        finally:
+            response.close()
+    finally:
+        semaphore.release()
+
+
+# ---------------------------
+# 异步请求（aiohttp）
+# ---------------------------
+def get_async_session():
+    """获取当前事件循环共享的 aiohttp.ClientSession（需在事件循环中调用）"""
+    import asyncio
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_SIZE * 4,
+            limit_per_host=max([MAX_PER_HOST, *HOST_LIMITS.values()]),
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+            trace_configs=[_trace_config()],
+        )
+        _async_sessions[loop] = session
+    return session
+
+
+def _trace_config():
+    """记录 DNS 解析、新建连接和等待响应头的耗时到当前节点调用"""
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+
+    async def request_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+        ctx.setup = 0.0  # 等待连接池和新建连接的耗时（从 ttfb 中扣除）
+
+    async def mark_start(session, ctx, params):
+        ctx.mark = time.perf_counter()
+
+    async def queued_end(session, ctx, params):
+        ctx.setup += time.perf_counter() - ctx.mark
+
+    async def dns_start(session, ctx, params):
+        ctx.dns_started = time.perf_counter()
+
+    async def dns_end(session, ctx, params):
+        ctx.dns = time.perf_counter() - ctx.dns_started
+        metrics.record("dns", ctx.dns)
+
+    async def connection_end(session, ctx, params):
+        elapsed = time.perf_counter() - ctx.mark
+        ctx.setup += elapsed
+        # DNS 解析在建立连接过程中进行，已单独记录
+        metrics.record("connect", elapsed - getattr(ctx, "dns", 0.0))
+
+    async def request_end(session, ctx, params):
+        metrics.record("ttfb", time.perf_counter() - ctx.started - ctx.setup)
+
+    trace.on_request_start.append(request_start)
+    trace.on_connection_queued_start.append(mark_start)
+    trace.on_connection_queued_end.append(queued_end)
+    trace.on_connection_create_start.append(mark_start)
+    trace.on_connection_create_end.append(connection_end)
+    trace.on_dns_resolvehost_start.append(dns_start)
+    trace.on_dns_resolvehost_end.append(dns_end)
+    trace.on_request_end.append(request_end)
+    return trace
+
+
+def async_host_semaphore(url: str):
+    """获取当前事件循环中该主机的并发限制信号量（与同步请求使用相同的按主机配置）"""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    semaphores = _async_semaphores.setdefault(loop, {})
+    host = host_of(url)
+    semaphore = semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(host_limit(host))
+        semaphores[host] = semaphore
+    return semaphore
@@ -0,0 +1,250 @@
+"""
+图片解码工具（供图片加载节点共用）
+指定目标尺寸时在解码阶段先行缩小：
+- JPEG 使用 draft() 在 DCT 阶段按 1/2、1/4、1/8 缩放解码
+- 其他格式在最终 LANCZOS 缩放前先用 reduce() 做整数倍降采样（resize 的 reducing_gap）
+并在缩放前应用 EXIF 方向，保证输出尺寸与请求的宽高一致
+
+下载时可通过 StreamingImageDecoder 边接收数据边增量解码（Pillow ImageFile.Parser），
+网络传输与解码重叠，且不保留完整的压缩数据
+
+多帧图片（GIF/APNG/动态WebP/多页TIFF）可通过 open_frames 按 start/stride/max_frames 选取帧，
+只有选中的帧会被转换和缩放
+
+环境变量：
+    URL_LOADER_MAX_IMAGE_BYTES  图片下载大小上限（字节，默认 256MB，0表示不限制）
+"""
+
+import os
+import json
+from PIL import Image, ImageOps, ImageFile, ExifTags
+from . import metrics
+from .url_cache import get_cache
+
+# EXIF 方向为 5~8 时图片需要旋转90度，宽高互换
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# reduce() 之后保留的倍数余量，3.0 时结果与直接 LANCZOS 缩放几乎无差别
+REDUCING_GAP = 3.0
+
+MAX_IMAGE_BYTES = int(os.environ.get("URL_LOADER_MAX_IMAGE_BYTES", 256 * 1024 * 1024))
+
+# 累计这么多数据仍无法识别图片头时放弃增量解码（可能不是图片，避免无限缓存数据）
+_STREAM_PROBE_BYTES = 1024 * 1024
+
+
+def parse_url_list(image_urls):
+    """解析URL列表：支持JSON数组或按行分隔"""
+    text = image_urls.strip()
+    if text.startswith("["):
+        try:
+            urls = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid URL list JSON: {str(e)}")
+        if not isinstance(urls, list):
+            raise ValueError("URL list JSON must be an array of strings")
+        return [str(url).strip() for url in urls if str(url).strip()]
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def target_size(size, width, height):
+    """计算输出尺寸（保留原生逻辑，0表示使用原图尺寸，单边指定时按比例缩放）"""
+    src_width, src_height = size
+    if width > 0 and height > 0:
+        return (width, height)
+    if width > 0:
+        return (width, int(src_height * width / src_width))
+    if height > 0:
+        return (int(src_width * height / src_height), height)
+    return (src_width, src_height)
+
+
+def _oriented_size(img):
+    """返回 (EXIF方向, 应用方向后的图片尺寸)"""
+    orientation = img.getexif().get(ExifTags.Base.Orientation, 1)
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        return orientation, img.size[::-1]
+    return orientation, img.size
+
+
+def open_image(fp, width=0, height=0, fast_decode=True):
+    """
+    打开并解码图片为RGB，应用EXIF方向后缩放到目标尺寸
+
+    Args:
+        fp: 文件路径或文件对象
+        width / height: 目标尺寸（0表示使用原图尺寸）
+        fast_decode: 指定目标尺寸时是否在解码阶段先行缩小
+    """
+    img = Image.open(fp)
+    orientation, source_size = _oriented_size(img)
+
+    if (width > 0 or height > 0) and fast_decode and img.format == "JPEG":
+        # draft 选择不小于目标尺寸的最大缩放比例，在解码时完成降采样
+        size = target_size(source_size, width, height)
+        img.draft("RGB", size if img.size == source_size else size[::-1])
+
+    return finalize_image(img, width, height, fast_decode, source_size, orientation)
+
+
+def finalize_image(img, width=0, height=0, fast_decode=True, source_size=None, orientation=None):
+    """
+    将已打开（或已增量解码）的图片转为RGB，应用EXIF方向后缩放到目标尺寸
+
+    Args:
+        source_size: 应用方向后的原图尺寸（draft 解码后 img.size 已缩小，需用原图尺寸计算目标尺寸）
+        orientation: EXIF方向（已读取时传入，避免重复解析）
+    """
+    if source_size is None or orientation is None:
+        orientation, source_size = _oriented_size(img)
+    size = target_size(source_size, width, height)
+
+    img = img.convert("RGB")
+    if orientation != 1:
+        img = ImageOps.exif_transpose(img)
+
+    if (width > 0 or height > 0) and img.size != size:
+        img = img.resize(size, Image.Resampling.LANCZOS,
+                         reducing_gap=REDUCING_GAP if fast_decode else None)
+    return img
+
+
+def frame_indices(n_frames, start=0, stride=1, max_frames=0):
+    """按 start（起始帧）/ stride（间隔）/ max_frames（最多帧数，0表示不限制）选取的帧序号"""
+    indices = range(min(max(start, 0), n_frames), n_frames, max(stride, 1))
+    return indices[:max_frames] if max_frames > 0 else indices
+
+
+def open_frames(fp, width=0, height=0, fast_decode=True, start=0, stride=1, max_frames=0):
+    """
+    打开多帧图片并选取帧（单帧图片视为只有一帧）
+
+    Returns:
+        (选中的帧数, 输出尺寸, 逐帧生成RGBA图片的迭代器)
+        迭代器按需解码：只有选中的帧会被转换、应用EXIF方向并缩放到输出尺寸（以第一帧的尺寸计算）；
+        GIF/APNG 等依赖前一帧的格式由 Pillow 在 seek 时依次合成中间帧
+    """
+    img = Image.open(fp)
+    orientation, source_size = _oriented_size(img)
+    size = target_size(source_size, width, height)
+    indices = frame_indices(getattr(img, "n_frames", 1), start, stride, max_frames)
+    if not indices:
+        img.close()
+
+    def frames():
+        try:
+            for index in indices:
+                with metrics.phase("decode"):
+                    img.seek(index)
+                    frame = img.convert("RGBA")
+                    if orientation != 1:
+                        frame = ImageOps.exif_transpose(frame)
+                    if frame.size != size:
+                        frame = frame.resize(size, Image.Resampling.LANCZOS,
+                                             reducing_gap=REDUCING_GAP if fast_decode else None)
+                yield frame
+        finally:
+            img.close()
+
+    return len(indices), size, frames()
+
+
+class StreamingImageDecoder:
+    """
+    边下载边解码的增量图片解码器（作为 URLCache.fetch 的 on_chunk 回调）
+    数据不是图片、格式不支持增量解码或解码出错时自动停用，调用方改为从缓存文件解码；
+    PNG/WebP/GIF/TIFF 等格式 Pillow 没有增量解码器（Parser 只会不断拼接缓冲区，每块都复制一次），
+    识别出格式后即停用，只有 JPEG 等真正增量解码的格式边下载边解码；
+    JPEG 需要缩小输出时同样停用，改由 open_image 的 draft 缩放解码（比完整增量解码更快）
+    """
+
+    def __init__(self, width=0, height=0, fast_decode=True):
+        self._parser = ImageFile.Parser()
+        self._fed = 0
+        self._skip_jpeg = (width > 0 or height > 0) and fast_decode
+        self.active = True
+        # 识别出的图片格式（停用增量解码后仍保留，未识别为图片时为 None）
+        self.format = None
+
+    def __call__(self, chunk):
+        if not self.active:
+            return
+        try:
+            self._parser.feed(chunk)
+        except Exception:
+            self._disable()
+            return
+        self._fed += len(chunk)
+        image = self._parser.image
+        if image is None:
+            if self._fed > _STREAM_PROBE_BYTES:
+                self._disable()
+            return
+        self.format = image.format
+        if self._parser.decoder is None or (self._skip_jpeg and image.format == "JPEG"):
+            self._disable()
+
+    @property
+    def has_image(self):
+        """是否正在增量解码已识别出的图片（结束时可取得增量解码结果）"""
+        return self.active and self._parser.image is not None
+
+    @property
+    def finished(self):
+        """增量解码是否已完成（整幅图片都已解码，结束时直接取得结果）"""
+        return self.active and self._parser.image is not None and bool(self._parser.finished)
+
+    def _disable(self):
+        self.active = False
+        self._parser = None
+
+    def close(self):
+        """结束增量解码，返回解码完成的图片；不可用时返回 None"""
+        if not self.active or self._parser.image is None:
+            self._disable()
+            return None
+        try:
+            img = self._parser.close()
+        except Exception:
+            img = None
+        self._disable()
+        return img
+
+
+def download_image(url, width=0, height=0, fast_decode=True, timeout=None, headers=None, incremental=True):
+    """
+    下载图片到共享缓存，新下载时边接收边增量解码
+    超过 MAX_IMAGE_BYTES 的图片会在下载过程中中止
+
+    Args:
+        incremental: 是否边下载边解码（按帧加载时只需要缓存文件，增量解码只能得到第一帧）
+
+    Returns:
+        (缓存记录, 增量解码器)，交给 decode_image 取得最终图片
+    """
+    decoder = StreamingImageDecoder(width, height, fast_decode)
+    if not incremental:
+        decoder.close()
+    entry = get_cache().fetch(url, headers=headers, timeout=timeout,
+                              max_bytes=MAX_IMAGE_BYTES, on_chunk=decoder if incremental else None)
+    return entry, decoder
+
+
+def decode_image(entry, decoder, width=0, height=0, fast_decode=True):
+    """取得增量解码结果；缓存命中或无法增量解码时从缓存文件解码"""
+    with metrics.phase("decode"):
+        img = decoder.close()
+        if img is None:
+            return open_image(entry.path, width, height, fast_decode)
+        return finalize_image(img, width, height, fast_decode)
+
+
+def fetch_image(url, width=0, height=0, fast_decode=True, timeout=None, headers=None):
+    """
+    下载并解码图片（经共享缓存）
+
+    Returns:
+        (缓存记录, RGB图片)
+    """
+    entry, decoder = download_image(url, width, height, fast_decode, timeout, headers)
+    return entry, decode_image(entry, decoder, width, height, fast_decode)
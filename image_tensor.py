@@ -0,0 +1,99 @@
+"""
+图片 -> ComfyUI IMAGE 张量转换（所有图片输出共用）
+直接从 PIL 像素缓冲区构建张量：只分配一次目标张量，uint8 -> 浮点的类型转换在拷贝中完成，
+归一化（/255）原地进行，避免 np.array().astype() / 255.0 产生的多份中间副本
+可选输出 float16 / bfloat16，供接受半精度输入的工作流节省一半内存
+"""
+
+import warnings
+import numpy as np
+import torch
+
+from . import metrics
+
+OUTPUT_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+}
+
+
+def resolve_dtype(name):
+    """将节点输入的dtype名称转换为 torch.dtype（未知名称回退为 float32）"""
+    return OUTPUT_DTYPES.get(name, torch.float32)
+
+
+def _pixels(img):
+    """以零拷贝方式将 PIL 图片的像素缓冲区包装为 uint8 张量 [H,W,C]"""
+    pixels = np.asarray(img)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    with warnings.catch_warnings():
+        # Pillow 导出的缓冲区只读，这里只作为拷贝源读取，不会写入
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.from_numpy(pixels)
+
+
+def pil_to_tensor(img, dtype=torch.float32, out=None):
+    """
+    PIL图片 -> [H,W,C] 浮点张量（值域 0~1）
+
+    Args:
+        dtype: 输出精度（out 给定时以 out 为准）
+        out: 预分配的目标张量（例如批次张量的一个切片），为空时新建
+    """
+    with metrics.phase("tensor"):
+        pixels = _pixels(img)
+        if out is None:
+            out = torch.empty(pixels.shape, dtype=dtype)
+        out.copy_(pixels)
+        return out.div_(255.0)
+
+
+def frames_to_tensor(frames, count, size, dtype=torch.float32):
+    """
+    多帧RGBA图片 -> [N,H,W,3] 图片张量和 [N,H,W] 遮罩（遮罩 = 1 - 透明度，与 ComfyUI 的 LoadImage 相同）
+    两个张量一次性分配，frames 按需逐帧解码并写入，每帧写入后即可释放
+
+    Args:
+        frames: 同尺寸 RGBA 图片的迭代器（见 image_decode.open_frames）
+        count / size: 帧数和 (宽, 高)
+    """
+    width, height = size
+    images = torch.empty((count, height, width, 3), dtype=dtype)
+    masks = torch.empty((count, height, width), dtype=torch.float32)
+    written = 0
+    for i, frame in enumerate(frames):
+        with metrics.phase("tensor"):
+            pixels = _pixels(frame)
+            images[i].copy_(pixels[:, :, :3]).div_(255.0)
+            masks[i].copy_(pixels[:, :, 3]).div_(-255.0).add_(1.0)
+        written = i + 1
+    if written != count:
+        raise ValueError(f"Expected {count} frames, decoded {written}")
+    return images, masks
+
+
+def image_size(image):
+    """PIL图片或 [H,W,C] 张量的 (宽, 高)"""
+    if isinstance(image, torch.Tensor):
+        return (image.shape[1], image.shape[0])
+    return image.size
+
+
+def pil_batch_to_tensor(images, dtype=torch.float32):
+    """
+    多张同尺寸图片 -> [B,H,W,C] 张量（一次性分配批次张量，逐张写入）
+    images 中可以包含解码进程输出的 float32 [H,W,C] 张量（值域已是 0~1，直接写入）
+    """
+    width, height = image_size(images[0])
+    first = images[0]
+    channels = first.shape[2] if isinstance(first, torch.Tensor) else len(first.getbands())
+    with metrics.phase("tensor"):
+        batch = torch.empty((len(images), height, width, channels), dtype=dtype)
+        for i, img in enumerate(images):
+            if isinstance(img, torch.Tensor):
+                batch[i].copy_(img)
+            else:
+                batch[i].copy_(_pixels(img)).div_(255.0)
+        return batch
@@ -0,0 +1,335 @@
+"""
+节点调用耗时统计（所有URL加载节点和OSS上传节点共用）
+每次节点调用按阶段累计耗时，按 节点类型 + 主机 汇总为直方图，
+通过 ComfyUI 服务的 /url_loader/metrics 路由以 Prometheus 文本格式输出
+
+阶段：
+    queue     等待按主机并发名额
+    dns       DNS 解析（仅异步请求单独记录）
+    connect   新建连接（同步请求包含 DNS 解析和 TLS 握手；连接池复用时没有该阶段）
+    ttfb      发出请求到收到响应头（不含 connect）
+    body      接收响应数据
+    decode    图片/音频解码（含边下载边解码）
+    resample  音频重采样
+    tensor    转换为输出张量
+    encode    OSS 上传前的内存编码
+    hash      内容哈希（去重）
+    upload    OSS 上传（含重试）
+多线程并行执行的阶段累计各线程的耗时，可能超过调用总耗时
+
+环境变量：
+    URL_LOADER_METRICS            是否汇总到直方图（默认 1，0 关闭；节点输出中的耗时摘要不受影响）
+    URL_LOADER_METRICS_MAX_HOSTS  区分的主机数上限（默认 100，超出的主机记为 "other"）
+"""
+
+from __future__ import annotations
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+METRICS_ENABLED = os.environ.get("URL_LOADER_METRICS", "1") != "0"
+MAX_HOSTS = int(os.environ.get("URL_LOADER_METRICS_MAX_HOSTS", 100))
+
+METRICS_ROUTE = "/url_loader/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 直方图桶上限（秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def host_label(url_or_host: str) -> str:
+    """URL 或 endpoint（可不带协议）中的主机名"""
+    if not url_or_host:
+        return ""
+    if "://" not in url_or_host:
+        url_or_host = f"//{url_or_host}"
+    return (urlparse(url_or_host).hostname or "").lower()
+
+
+# ---------------------------
+# 汇总（Prometheus）
+# ---------------------------
+class _Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # 最后一项为超出所有桶（+Inf）
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+
+class MetricsRegistry:
+    """进程内的阶段耗时直方图、调用次数和传输字节数（线程安全）"""
+
+    def __init__(self, max_hosts: int = MAX_HOSTS):
+        self.max_hosts = max_hosts
+        self._lock = threading.Lock()
+        self._hosts = set()
+        self._phases: Dict[Tuple[str, str, str], _Histogram] = {}
+        self._calls: Dict[Tuple[str, str, str], int] = {}
+        self._bytes: Dict[Tuple[str, str, str], int] = {}
+
+    def _host(self, host: str) -> str:
+        # 限制标签基数，避免任意URL撑大指标
+        if host in self._hosts:
+            return host
+        if len(self._hosts) < self.max_hosts:
+            self._hosts.add(host)
+            return host
+        return "other"
+
+    def observe(self, node: str, host: str, phase: str, seconds: float):
+        with self._lock:
+            key = (node, self._host(host), phase)
+            histogram = self._phases.get(key)
+            if histogram is None:
+                histogram = self._phases[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def count_call(self, node: str, host: str, status: str):
+        with self._lock:
+            key = (node, self._host(host), status)
+            self._calls[key] = self._calls.get(key, 0) + 1
+
+    def add_bytes(self, node: str, host: str, direction: str, size: int):
+        with self._lock:
+            key = (node, self._host(host), direction)
+            self._bytes[key] = self._bytes.get(key, 0) + size
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            phases = {key: (list(h.counts), h.sum) for key, h in self._phases.items()}
+            calls = dict(self._calls)
+            transferred = dict(self._bytes)
+
+        lines = [
+            "# HELP url_loader_phase_seconds Time spent per phase of URL loader / OSS upload node calls.",
+            "# TYPE url_loader_phase_seconds histogram",
+        ]
+        for (node, host, phase), (counts, total) in sorted(phases.items()):
+            labels = _labels(node=node, host=host, phase=phase)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f'url_loader_phase_seconds_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'url_loader_phase_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"url_loader_phase_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"url_loader_phase_seconds_count{{{labels}}} {cumulative}")
+
+        lines += [
+            "# HELP url_loader_calls_total Node calls by result.",
+            "# TYPE url_loader_calls_total counter",
+        ]
+        for (node, host, status), count in sorted(calls.items()):
+            lines.append(f"url_loader_calls_total{{{_labels(node=node, host=host, status=status)}}} {count}")
+
+        lines += [
+            "# HELP url_loader_bytes_total Bytes downloaded or uploaded by node calls.",
+            "# TYPE url_loader_bytes_total counter",
+        ]
+        for (node, host, direction), size in sorted(transferred.items()):
+            lines.append(f"url_loader_bytes_total{{{_labels(node=node, host=host, direction=direction)}}} {size}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# ---------------------------
+# 单次调用的计时
+# ---------------------------
+class CallTimer:
+    """
+    一次节点调用的各阶段累计耗时（可在多个线程中同时记录）
+    同一阶段多次记录的耗时累加，调用结束时（track 退出）每个阶段汇总为直方图的一次观测
+    """
+
+    def __init__(self, node: str, host: str = ""):
+        self.node = node
+        self.host = host
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_bytes(self, direction: str, size: int):
+        if METRICS_ENABLED and size:
+            registry.add_bytes(self.node, self.host, direction, size)
+
+    def merge(self, other: "CallTimer"):
+        """并入另一个计时的阶段耗时（如后台监视上传的耗时，随本次调用一同汇总到直方图）"""
+        with other._lock:
+            phases = dict(other.phases)
+        with self._lock:
+            for phase, seconds in phases.items():
+                self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def observe(self):
+        """将各阶段的累计耗时汇总到直方图（每次调用只调用一次）"""
+        with self._lock:
+            phases = dict(self.phases)
+        for phase, seconds in phases.items():
+            registry.observe(self.node, self.host, phase, seconds)
+        registry.observe(self.node, self.host, "total", self.elapsed())
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> Dict[str, float]:
+        """{阶段: 毫秒}，包含 total"""
+        with self._lock:
+            phases = dict(self.phases)
+        result = {"total": round(self.elapsed() * 1000, 1)}
+        result.update((phase, round(seconds * 1000, 1)) for phase, seconds in phases.items())
+        return result
+
+    def format(self) -> str:
+        """紧凑的单行摘要，例如 "total=70.2ms ttfb=12.3ms body=40.1ms decode=8.0ms" """
+        return " ".join(f"{phase}={ms:.1f}ms" for phase, ms in self.summary().items() if ms >= 0.1 or phase == "total")
+
+
+_current: ContextVar[Optional[CallTimer]] = ContextVar("url_loader_call_timer", default=None)
+
+
+def current() -> Optional[CallTimer]:
+    """当前节点调用的计时（不在节点调用中时为 None）"""
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """记录代码块的耗时到当前调用（不在节点调用中时不记录）"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+def record(name: str, seconds: float):
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+def add_bytes(direction: str, size: int):
+    timer = _current.get()
+    if timer is not None:
+        timer.add_bytes(direction, size)
+
+
+@contextmanager
+def track(node: str, url_or_host: str = "") -> Iterator[CallTimer]:
+    """计时一次节点调用，结束时汇总各阶段耗时、调用总耗时（phase="total"）和结果"""
+    timer = CallTimer(node, host_label(url_or_host))
+    token = _current.set(timer)
+    status = "error"
+    try:
+        yield timer
+        status = "ok"
+    finally:
+        _current.reset(token)
+        if METRICS_ENABLED:
+            timer.observe()
+            registry.count_call(timer.node, timer.host, status)
+
+
+def instrument(node: str, url_param: Optional[str] = None) -> Callable:
+    """
+    节点执行函数的装饰器：整个调用在 track 中执行（支持异步函数）
+    url_param 为提供主机标签的参数名
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def host_of_call(args, kwargs) -> str:
+            if url_param is None:
+                return ""
+            try:
+                value = signature.bind_partial(*args, **kwargs).arguments.get(url_param)
+            except TypeError:
+                return ""
+            return value if isinstance(value, str) else ""
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with track(node, host_of_call(args, kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track(node, host_of_call(args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def bind(fn: Callable, timer: Optional[CallTimer] = None) -> Callable:
+    """包装函数，在其他线程中执行时记录到当前（或指定的）调用"""
+    timer = timer or _current.get()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _current.set(timer)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+# ---------------------------
+# ComfyUI 服务路由
+# ---------------------------
+def register_route() -> bool:
+    """
+    在 ComfyUI 服务上注册 Prometheus 指标路由（不在 ComfyUI 服务中运行时返回 False）
+    由包的 __init__ 调用：解码进程等只导入本模块的场合不能导入 ComfyUI 的 server
+    """
+    try:
+        from aiohttp import web
+        from server import PromptServer
+        routes = PromptServer.instance.routes
+    except Exception:
+        return False
+
+    @routes.get(METRICS_ROUTE)
+    async def url_loader_metrics(request):
+        return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    return True
@@ -9,19 +9,195 @@ import os
 import sys
 import json
 import time
+import random
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
-# 导入ComfyUI核心模块
-try:
-    from typing_extensions import override
-    from comfy_api.latest import ComfyExtension, io as ComfyIO
-    import oss2
-    HAVE_OSS2 = True
-except ImportError as e:
-    HAVE_OSS2 = False
-    # 允许模块加载，但在使用时才报错
+# oss2（及 requests）导入较慢，首次上传时才导入，不拖慢 ComfyUI 启动；未安装时允许模块加载，在使用时才报错
+oss2 = None
+requests = None
+
+
+def _import_oss2() -> bool:
+    """导入 oss2，未安装时返回 False"""
+    global oss2, requests
+    if oss2 is None:
+        try:
+            import oss2 as oss2_module
+            import requests as requests_module
+        except ImportError:
+            return False
+        oss2, requests = oss2_module, requests_module
+    return True
+
+
+from .output_encode import (
+    IMAGE_FORMATS, AUDIO_FORMATS, image_extension, audio_extension,
+    encode_image, encode_audio, video_source,
+)
+from . import metrics
+from . import prompt_hooks
+from .upload_watcher import DirectoryWatcher, MAX_WATCH_SECONDS, file_signature, scan_directory
+
+# 上传失败重试的退避时间（秒）：第 n 次重试前等待 min(BASE * 2^n, MAX)，并附加随机抖动
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8.0
+
+# 分片上传断点记录目录（任务崩溃或重试后从已完成的分片继续上传）
+OSS_CHECKPOINT_DIR = os.environ.get("URL_LOADER_OSS_CHECKPOINT_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "comfyui-url-resource-loader", "oss-upload"
+)
+
+# 内容去重：记录每个内容哈希首次上传的对象，重复上传改为从该对象服务端复制
+OSS_DEDUP_INDEX = os.path.join(OSS_CHECKPOINT_DIR, "dedup-index.json")
+DEDUP_MODES = ["off", "md5", "crc64"]
+_DEDUP_INDEX_MAX_ENTRIES = 100000
+# copy_object 单次复制的大小上限（更大的文件不参与去重）
+_COPY_OBJECT_MAX_BYTES = 1024 ** 3
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# 每个 endpoint 的连接池大小（连接池在多次执行之间保持，复用 keep-alive 连接）
+OSS_POOL_SIZE = int(os.environ.get("URL_LOADER_OSS_POOL_SIZE", 32))
+
+# 可重试的 HTTP 状态码（其余 4xx 如 403 权限错误重试也不会成功）
+_RETRYABLE_STATUS = (408, 429)
+
+
+class UploadTimeout(Exception):
+    """单个文件上传超时或整批上传超过总超时时间"""
+
+
+@dataclass
+class UploadOptions:
+    """单个文件的上传选项（deadline 可在上传过程中收紧，如监视上传在节点执行时改为节点的总超时）"""
+    deadline: float
+    delete_after_upload: bool = True
+    file_timeout_seconds: float = 120
+    max_retries: int = 2
+    multipart_threshold: int = 100 * 1024 * 1024
+    part_size: int = 10 * 1024 * 1024
+    part_threads: int = 4
+    dedup: str = "off"
+
+
+# ---------------------------
+# 内容去重索引
+# ---------------------------
+class DedupIndex:
+    """
+    内容哈希 -> 首次上传该内容的对象（路径、ETag、大小），作为之后相同内容的复制源（线程安全，持久化为JSON）
+    复制时要求源对象 ETag 不变，源对象被覆盖或删除后该记录失效
+    """
+    
+    def __init__(self, path: str = OSS_DEDUP_INDEX):
+        self.path = path
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                # 忽略旧版本索引中只记录大小的条目（其复制源为已不再使用的 dedup/ 对象）
+                self._keys = {key: value for key, value in json.load(f).items() if isinstance(value, dict)}
+        except (OSError, ValueError, AttributeError):
+            pass
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._keys.get(key)
+    
+    def add(self, key: str, source: str, etag: str, size: int):
+        with self._lock:
+            self._keys.pop(key, None)
+            self._keys[key] = {"source": source, "etag": etag, "size": size}
+            while len(self._keys) > _DEDUP_INDEX_MAX_ENTRIES:
+                del self._keys[next(iter(self._keys))]
+            self._save()
+    
+    def discard(self, key: str):
+        with self._lock:
+            if self._keys.pop(key, None) is not None:
+                self._save()
+    
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._keys, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+_dedup_index: Optional[DedupIndex] = None
+
+
+def get_dedup_index() -> DedupIndex:
+    global _dedup_index
+    with _clients_lock:
+        if _dedup_index is None:
+            _dedup_index = DedupIndex()
+        return _dedup_index
+
+
+def content_digest(data: Any, algorithm: str) -> str:
+    """
+    计算内容哈希（MD5 或 CRC64-ECMA，与 OSS 的 x-oss-hash-crc64ecma 一致），返回十六进制字符串
+    本地文件按 _HASH_CHUNK_SIZE 分块读取计算，不整体读入内存
+    """
+    if algorithm == "crc64":
+        hasher = oss2.utils.Crc64(0)
+    else:
+        hasher = hashlib.md5()
+    
+    if isinstance(data, bytes):
+        hasher.update(data)
+    else:
+        with open(data, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+    
+    return format(hasher.crc, "016x") if algorithm == "crc64" else hasher.hexdigest()
+
+
+def _dedup_size(data: Any) -> int:
+    """去重前检查的内容大小（本地文件不存在时返回 -1，由上传步骤报告错误）"""
+    if isinstance(data, bytes):
+        return len(data)
+    try:
+        return os.path.getsize(data)
+    except OSError:
+        return -1
+
+
+# ---------------------------
+# 进程级 OSS 客户端登记表
+# ---------------------------
+_clients_lock = threading.Lock()
+_sessions: Dict[str, Any] = {}  # endpoint -> oss2.Session（连接池）
+
+
+def get_bucket(access_key_id: str, access_key_secret: str, security_token: str,
+               endpoint: str, bucket_name: str, timeout_seconds: Optional[float] = None):
+    """
+    创建 Bucket 客户端（同一 endpoint 共用一个连接池）
+    每次调用创建独立的 Bucket（创建不发送请求），凭证和超时不在并发的上传之间共享：
+    新凭证或新超时不会作用到其他任务仍在使用的 Bucket 上
+    """
+    if "://" not in endpoint:
+        endpoint = f"http://{endpoint}"
+    with _clients_lock:
+        session = _sessions.get(endpoint)
+        if session is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=OSS_POOL_SIZE)
+            session = _sessions[endpoint] = oss2.Session(adapter=adapter)
+    auth = oss2.StsAuth(access_key_id, access_key_secret, security_token)
+    timeout = oss2.defaults.get(timeout_seconds, oss2.defaults.connect_timeout)
+    return oss2.Bucket(auth, endpoint, bucket_name, session=session, connect_timeout=timeout)
 
 
 class OSS_Upload:
@@ -64,6 +240,25 @@ class OSS_Upload:
                 # 选项
                 "delete_after_upload": ("BOOLEAN", {"default": True}),
                 "timeout_seconds": ("INT", {"default": 300}),
+                "max_workers": ("INT", {"default": 8, "min": 1, "max": 64}),
+                "file_timeout_seconds": ("INT", {"default": 120, "min": 1}),
+                "max_retries": ("INT", {"default": 2, "min": 0, "max": 10}),
+                
+                # 内容去重（重复内容改为服务端复制）
+                "dedup": (DEDUP_MODES, {"default": "off"}),
+                
+                # 大文件分片上传
+                "multipart_threshold_mb": ("INT", {"default": 100, "min": 1}),
+                "part_size_mb": ("INT", {"default": 10, "min": 1, "max": 5120}),
+                "part_threads": ("INT", {"default": 4, "min": 1, "max": 32}),
+                
+                # 直接传入的张量在内存中编码后上传
+                "image_format": (IMAGE_FORMATS, {"default": "png"}),
+                "image_quality": ("INT", {"default": 95, "min": 1, "max": 100}),
+                "audio_format": (AUDIO_FORMATS, {"default": "flac"}),
+                
+                # 边生成边上传：任务开始时监视 output_dir/<watch_subfolder>，文件写完即上传
+                "watch_subfolder": ("STRING", {"default": ""}),
             }
         }
     
@@ -73,6 +268,7 @@ class OSS_Upload:
     CATEGORY = "storage/oss"
     OUTPUT_NODE = True  # 这是一个输出节点
     
+    @metrics.instrument("OSS_Upload", "endpoint")
     def upload(
         self,
         access_key_id: str,
@@ -87,6 +283,17 @@ class OSS_Upload:
         audios=None,
         delete_after_upload: bool = True,
         timeout_seconds: int = 300,
+        max_workers: int = 8,
+        file_timeout_seconds: int = 120,
+        max_retries: int = 2,
+        multipart_threshold_mb: int = 100,
+        part_size_mb: int = 10,
+        part_threads: int = 4,
+        image_format: str = "png",
+        image_quality: int = 95,
+        audio_format: str = "flac",
+        dedup: str = "off",
+        watch_subfolder: str = "",
     ) -> Tuple[str]:
         """
         主上传函数
@@ -100,11 +307,23 @@ class OSS_Upload:
             task_id: 任务 ID
             file_list: 文件列表 JSON
             delete_after_upload: 上传后是否删除本地文件
-            timeout_seconds: 上传超时时间
+            timeout_seconds: 整批上传的总超时时间
+            max_workers: 并行上传的文件数
+            file_timeout_seconds: 单个文件每次上传尝试的超时时间
+            max_retries: 单个文件失败后的重试次数（指数退避）
+            multipart_threshold_mb: 超过该大小（MB）的文件使用可断点续传的并行分片上传
+            part_size_mb: 分片大小（MB）
+            part_threads: 单个文件的并行分片数
+            images / audios / videos: 直接传入的输出，在内存中编码后上传（不写入磁盘）
+            image_format / image_quality: 图片编码格式与质量（WebP/JPEG）
+            audio_format: 音频编码格式
+            dedup: 内容去重使用的哈希（off 表示关闭），相同内容改为服务端复制，不再发送数据
+            watch_subfolder: 监视上传的输出子目录（空表示不监视），任务开始时已在后台上传写完的文件，
+                             这里只等待剩余文件上传完成；目录中的文件无需列在 file_list 中
         """
         
         try:
-            if not HAVE_OSS2:
+            if not _import_oss2():
                 return (json.dumps({
                     "status": "error",
                     "message": "oss2 module not found, please install: pip install oss2"
@@ -115,28 +334,60 @@ class OSS_Upload:
                 access_key_id,
                 access_key_secret,
                 security_token,
-                endpoint
+                endpoint,
+                bucket_name,
+                file_timeout_seconds
             )
             
             # 解析文件列表
             try:
-                files_info = json.loads(file_list)
+                files_info = json.loads(file_list) if file_list.strip() else {}
             except json.JSONDecodeError:
                 return (json.dumps({
                     "status": "error",
                     "message": f"Invalid file_list JSON: {file_list}"
                 }),)
             
+            # 直接传入的张量：编码在上传线程中进行，与其他文件的上传重叠
+            memory_outputs = self._memory_outputs(
+                images, audios, videos, image_format, image_quality, audio_format
+            )
+            
+            options = UploadOptions(
+                deadline=time.monotonic() + timeout_seconds,
+                delete_after_upload=delete_after_upload,
+                file_timeout_seconds=file_timeout_seconds,
+                max_retries=max_retries,
+                multipart_threshold=multipart_threshold_mb * 1024 * 1024,
+                part_size=part_size_mb * 1024 * 1024,
+                part_threads=part_threads,
+                dedup=dedup
+            )
+            
+            # 监视上传：取得后台上传的结果，未启动监视时上传目录中本任务开始执行后修改的文件
+            streamed, output_files, watch_timer = {}, [], None
+            if watch_subfolder:
+                streamed, output_files, watch_timer = self._finish_watch(task_id, watch_subfolder, options.deadline)
+            
             # 执行上传
             upload_result = self._upload_files(
                 oss_client,
-                bucket_name,
                 task_id,
                 files_info,
-                delete_after_upload,
-                timeout_seconds
+                options,
+                max_workers,
+                memory_outputs,
+                output_files,
+                streamed
             )
             
+            # 各阶段耗时（含监视上传在后台的耗时）
+            timer = metrics.current()
+            if timer is not None:
+                if watch_timer is not None:
+                    timer.merge(watch_timer)
+                upload_result["timing"] = timer.summary()
+            
             return (json.dumps(upload_result),)
         
         except Exception as e:
@@ -149,29 +400,43 @@ class OSS_Upload:
     
     @staticmethod
     def _init_oss_client(access_key_id: str, access_key_secret: str, 
-                        security_token: str, endpoint: str):
-        """初始化 OSS 客户端（STS 临时凭证）"""
-        auth = oss2.Auth(
+                        security_token: str, endpoint: str, bucket_name: str,
+                        timeout_seconds: Optional[float] = None):
+        """取得 OSS 客户端（STS 临时凭证，跨执行复用连接池，Bucket 可在多个上传线程间共享）"""
+        return get_bucket(
             access_key_id,
             access_key_secret,
-            security_token  # STS Token
+            security_token,  # STS Token
+            endpoint,
+            bucket_name,
+            timeout_seconds
         )
-        return oss2.Bucket(auth, f"http://{endpoint}", "")
     
     def _upload_files(
         self,
         oss_client,
-        bucket_name: str,
         task_id: str,
         files_info: Dict[str, List[Dict]],
-        delete_after_upload: bool,
-        timeout_seconds: int
+        options: UploadOptions,
+        max_workers: int = 8,
+        memory_outputs: Optional[List[Tuple[str, Any]]] = None,
+        output_files: Optional[List[Tuple[str, str]]] = None,
+        streamed: Optional[Dict[str, Future]] = None
     ) -> Dict[str, Any]:
-        """上传文件到 OSS"""
+        """
+        并行上传文件到 OSS（结果顺序与 file_list 一致，之后依次是 memory_outputs、output_files 和其余监视上传的文件）
         
-        uploaded_files = []
-        failed_files = []
-        total_size = 0
+        Args:
+            memory_outputs: [(文件名, 数据源)]，数据源为字节数据、源文件路径或返回字节数据的编码函数
+            output_files: [(文件名, 本地路径)]，额外上传的输出文件（上传后按选项删除）
+            streamed: {本地路径: 结果Future}，监视上传已提交的文件，不再重复上传
+        """
+        
+        streamed = dict(streamed or {})
+        streamed_count = sum(1 for future in streamed.values() if future.done())
+        listed = set()
+        jobs = []
+        results: List[Any] = []
         
         # 遍历所有文件类型
         for file_type, file_list in files_info.items():
@@ -185,70 +450,294 @@ class OSS_Upload:
                 if not filename:
                     continue
                 
-                try:
-                    # 构建本地路径
-                    if subfolder:
-                        local_path = os.path.join(self.output_dir, subfolder, filename)
-                    else:
-                        local_path = os.path.join(self.output_dir, filename)
-                    
-                    # 检查文件是否存在
-                    if not os.path.exists(local_path):
-                        failed_files.append({
-                            "filename": filename,
-                            "reason": "File not found"
-                        })
-                        continue
-                    
-                    # 构建 OSS 路径
-                    oss_path = f"outputs/{task_id}/{filename}"
-                    
-                    # 获取文件大小和 Content-Type
-                    file_size = os.path.getsize(local_path)
-                    content_type = self._get_content_type(filename)
-                    
-                    # 上传文件
-                    with open(local_path, "rb") as f:
-                        oss_client.put_object(
-                            bucket_name,
-                            oss_path,
-                            f,
-                            headers={"Content-Type": content_type}
-                        )
-                    
-                    total_size += file_size
-                    
-                    # 删除本地文件（可选）
-                    if delete_after_upload:
-                        try:
-                            os.remove(local_path)
-                        except:
-                            pass
-                    
-                    uploaded_files.append({
-                        "filename": filename,
-                        "oss_path": oss_path,
-                        "size": file_size,
-                        "content_type": content_type
-                    })
-                    
-                except Exception as e:
-                    failed_files.append({
+                # 构建本地路径
+                if subfolder:
+                    local_path = os.path.join(self.output_dir, subfolder, filename)
+                else:
+                    local_path = os.path.join(self.output_dir, filename)
+                
+                # 已由监视上传处理（上传后可能已被删除）
+                abs_path = os.path.abspath(local_path)
+                listed.add(abs_path)
+                if abs_path in streamed:
+                    results.append(streamed.pop(abs_path))
+                    continue
+                
+                # 检查文件是否存在
+                if not os.path.exists(local_path):
+                    results.append({
                         "filename": filename,
-                        "reason": str(e)
+                        "reason": "File not found"
                     })
+                    continue
+                
+                # 构建 OSS 路径
+                oss_path = f"outputs/{task_id}/{filename}"
+                jobs.append((len(results), filename, local_path, oss_path, True))
+                results.append(None)
+        
+        for filename, encode in memory_outputs or []:
+            jobs.append((len(results), filename, encode, f"outputs/{task_id}/{filename}", False))
+            results.append(None)
+        
+        for filename, local_path in output_files or []:
+            if os.path.abspath(local_path) in listed:
+                continue
+            jobs.append((len(results), filename, local_path, f"outputs/{task_id}/{filename}", True))
+            results.append(None)
+        
+        results.extend(streamed[path] for path in sorted(streamed))
+        
+        def upload_job(job):
+            index, filename, source, oss_path, is_output_file = job
+            results[index] = self._upload_source(oss_client, filename, source, oss_path, options, is_output_file)
+        
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+                list(executor.map(metrics.bind(upload_job), jobs))
+        
+        # 监视上传的结果（每个文件的上传受 options.deadline 限制，不会无限等待）
+        results = [r.result() if isinstance(r, Future) else r for r in results]
+        
+        uploaded_files = [r for r in results if "oss_path" in r]
+        failed_files = [r for r in results if "oss_path" not in r]
+        total_size = sum(r["size"] for r in uploaded_files)
+        dedup_saved_bytes = sum(r["size"] for r in uploaded_files if r.get("deduplicated"))
         
         return {
             "status": "success" if not failed_files else "partial",
             "task_id": task_id,
             "uploaded_count": len(uploaded_files),
             "failed_count": len(failed_files),
+            "streamed_count": streamed_count,
             "total_size": total_size,
+            "dedup_saved_bytes": dedup_saved_bytes,
             "uploaded_files": uploaded_files,
             "failed_files": failed_files,
             "timestamp": datetime.utcnow().isoformat()
         }
     
+    def _upload_source(self, oss_client, filename: str, source: Any, oss_path: str,
+                       options: UploadOptions, is_output_file: bool) -> Dict[str, Any]:
+        """编码（如需）、去重并上传单个数据源，返回上传记录或失败记录（不抛出异常）"""
+        try:
+            if callable(source):
+                with metrics.phase("encode"):
+                    data = source()
+            else:
+                data = source
+            result = None
+            index_key = None
+            # 超过服务端复制上限的内容无法去重，不计算哈希（省去一次完整读取）
+            if options.dedup != "off" and 0 <= _dedup_size(data) <= _COPY_OBJECT_MAX_BYTES:
+                with metrics.phase("hash"):
+                    digest = content_digest(data, options.dedup)
+                index_key = (f"{oss_client.endpoint}/{oss_client.bucket_name}/"
+                             f"{digest}{Path(filename).suffix.lower()}")
+                result = self._dedup_copy(oss_client, filename, data, oss_path, index_key)
+            
+            if result is None:
+                with metrics.phase("upload"):
+                    result = self._upload_one(oss_client, filename, data, oss_path, options)
+                metrics.add_bytes("upload", result["size"])
+                if index_key is not None and result["etag"]:
+                    # 本次上传的对象即为之后相同内容的复制源，不另存副本
+                    get_dedup_index().add(index_key, oss_path, result["etag"], result["size"])
+            
+            # 删除本地文件（可选）
+            if options.delete_after_upload and is_output_file:
+                try:
+                    os.remove(source)
+                except:
+                    pass
+            return result
+        except Exception as e:
+            return {
+                "filename": filename,
+                "reason": str(e)
+            }
+    
+    def _upload_one(
+        self,
+        oss_client,
+        filename: str,
+        data: Any,
+        oss_path: str,
+        options: UploadOptions
+    ) -> Dict[str, Any]:
+        """
+        上传单个文件（data 为本地文件路径或内存中的字节数据），失败时按指数退避重试
+        每次尝试的时限为 file_timeout_seconds，且不超过截止时间 options.deadline：
+        发送数据期间由进度回调检查并中止，等待响应期间由客户端的 socket 超时（同为 file_timeout_seconds）兜底
+        
+        超过 multipart_threshold 的文件使用并行分片上传，断点记录在 OSS_CHECKPOINT_DIR，
+        重试或任务重新执行时只上传未完成的分片；此时 file_timeout_seconds 作用于单个分片请求
+        """
+        # 获取文件大小和 Content-Type
+        in_memory = isinstance(data, bytes)
+        file_size = len(data) if in_memory else os.path.getsize(data)
+        content_type = self._get_content_type(filename)
+        file_timeout_seconds = options.file_timeout_seconds
+        
+        for attempt in range(options.max_retries + 1):
+            if time.monotonic() >= options.deadline:
+                raise UploadTimeout("Total upload timeout exceeded")
+            multipart = not in_memory and file_size >= options.multipart_threshold
+            attempt_deadline = float("inf") if multipart else time.monotonic() + file_timeout_seconds
+            
+            def check_deadline(consumed, total):
+                # 上传过程中按数据进度回调检查超时，超时即中止本次上传
+                now = time.monotonic()
+                if now > options.deadline:
+                    raise UploadTimeout("Total upload timeout exceeded")
+                if now > attempt_deadline:
+                    raise UploadTimeout(f"Upload timed out after {file_timeout_seconds}s")
+            
+            try:
+                # 上传文件
+                if multipart:
+                    response = oss2.resumable_upload(
+                        oss_client,
+                        oss_path,
+                        data,
+                        store=oss2.ResumableStore(root=OSS_CHECKPOINT_DIR),
+                        headers={"Content-Type": content_type},
+                        multipart_threshold=options.multipart_threshold,
+                        part_size=options.part_size,
+                        num_threads=options.part_threads,
+                        progress_callback=check_deadline
+                    )
+                elif in_memory:
+                    response = oss_client.put_object(
+                        oss_path,
+                        data,
+                        headers={"Content-Type": content_type},
+                        progress_callback=check_deadline
+                    )
+                else:
+                    with open(data, "rb") as f:
+                        response = oss_client.put_object(
+                            oss_path,
+                            f,
+                            headers={"Content-Type": content_type},
+                            progress_callback=check_deadline
+                        )
+                break
+            except Exception as e:
+                if attempt == options.max_retries or not self._is_retryable(e):
+                    raise
+                delay = min(RETRY_BACKOFF_BASE * 2 ** attempt, RETRY_BACKOFF_MAX)
+                time.sleep(min(delay * random.uniform(0.5, 1.0), max(0.0, options.deadline - time.monotonic())))
+        
+        return {
+            "filename": filename,
+            "oss_path": oss_path,
+            "size": file_size,
+            "content_type": content_type,
+            "etag": response.etag
+        }
+    
+    def _finish_watch(self, task_id: str, watch_subfolder: str, deadline: float
+                      ) -> Tuple[Dict[str, Future], List[Tuple[str, str]], Optional[metrics.CallTimer]]:
+        """
+        结束任务的监视上传，剩余上传的截止时间收紧为 deadline
+        
+        未启动监视时只上传目录中本任务开始执行后修改的文件（目录中可能留有其他任务的输出）；
+        不在 ComfyUI 服务中运行时无法得知任务开始时间，上传目录中的全部文件
+        
+        Returns:
+            (监视上传已提交的 {本地路径: 结果Future}, 未启动监视时需要上传的 [(文件名, 本地路径)],
+             监视上传的阶段耗时)
+        """
+        directory = _watch_directory(self.output_dir, watch_subfolder)
+        with _watches_lock:
+            watch = _watches.pop(task_id, None)
+        
+        if watch is None or watch.directory != directory:
+            if watch is not None:
+                watch.stop()
+            execution = prompt_hooks.current_execution()
+            since_ns = execution.started_ns if execution is not None else 0
+            paths = [path for path, (_, mtime_ns) in scan_directory(directory).items() if mtime_ns >= since_ns]
+            return {}, [(_watch_filename(directory, path), path) for path in sorted(paths)], None
+        
+        watch.options.deadline = min(watch.options.deadline, deadline)
+        return watch.finish(), [], watch.timer
+    
+    def _dedup_copy(self, oss_client, filename: str, data: Any, oss_path: str,
+                    index_key: str) -> Optional[Dict[str, Any]]:
+        """相同内容已上传过时从首次上传的对象服务端复制到目标路径并返回上传记录；未上传过时返回 None"""
+        size = len(data) if isinstance(data, bytes) else os.path.getsize(data)
+        if size > _COPY_OBJECT_MAX_BYTES:
+            return None
+        
+        index = get_dedup_index()
+        record = index.get(index_key)
+        if record is None:
+            return None
+        try:
+            # 源对象 ETag 变化（已被其他内容覆盖）时服务端拒绝复制
+            response = oss_client.copy_object(oss_client.bucket_name, record["source"], oss_path,
+                                              headers={"x-oss-copy-source-if-match": record["etag"]})
+        except (oss2.exceptions.NoSuchKey, oss2.exceptions.PreconditionFailed):
+            # 复制源已被删除或覆盖，索引失效，改为正常上传（上传后以本次对象作为新的复制源）
+            index.discard(index_key)
+            return None
+        except oss2.exceptions.OssError as e:
+            # 去重只是优化：复制失败（权限不足、限流等）时改为正常上传
+            print(f"[OSS_Upload] 去重复制失败，改为正常上传: {filename}, {e}")
+            return None
+        
+        return {
+            "filename": filename,
+            "oss_path": oss_path,
+            "size": size,
+            "content_type": self._get_content_type(filename),
+            "etag": response.etag,
+            "deduplicated": True
+        }
+    
+    @staticmethod
+    def _memory_outputs(images, audios, videos, image_format: str, image_quality: int,
+                        audio_format: str) -> List[Tuple[str, Any]]:
+        """将直接传入的 IMAGE/AUDIO/VIDEO 转为 [(文件名, 数据源)]，编码延迟到上传线程中执行"""
+        outputs = []
+        
+        if images is not None:
+            ext = image_extension(image_format)
+            for i in range(images.shape[0]):
+                outputs.append((
+                    f"image_{i:05d}.{ext}",
+                    lambda image=images[i]: encode_image(image, image_format, image_quality)
+                ))
+        
+        if audios is not None:
+            ext = audio_extension(audio_format)
+            waveform, sample_rate = audios["waveform"], audios["sample_rate"]
+            if waveform.dim() == 2:
+                waveform = waveform.unsqueeze(0)
+            for i in range(waveform.shape[0]):
+                outputs.append((
+                    f"audio_{i:05d}.{ext}",
+                    lambda w=waveform[i]: encode_audio(w, sample_rate, audio_format)
+                ))
+        
+        if videos is not None:
+            for i, video in enumerate(videos if isinstance(videos, (list, tuple)) else [videos]):
+                source, ext = video_source(video)
+                outputs.append((f"video_{i:05d}.{ext}", source))
+        
+        return outputs
+    
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """网络错误、超时、服务端错误（5xx）和限流可以重试"""
+        if isinstance(error, UploadTimeout):
+            return True
+        if oss2 is not None and isinstance(error, oss2.exceptions.OssError):
+            return error.status < 0 or error.status >= 500 or error.status in _RETRYABLE_STATUS
+        return False
+    
     @staticmethod
     def _get_content_type(filename: str) -> str:
         """根据文件扩展名获取 Content-Type"""
@@ -284,6 +773,7 @@ class OSS_Upload:
             ".flac": "audio/flac",
             ".ogg": "audio/ogg",
             ".m4a": "audio/mp4",
+            ".opus": "audio/opus",
             ".wma": "audio/x-ms-wma",
             ".aiff": "audio/aiff",
             
@@ -299,6 +789,172 @@ class OSS_Upload:
         return content_types.get(ext, "application/octet-stream")
 
 
+# ---------------------------
+# 边生成边上传
+# ---------------------------
+_watches_lock = threading.Lock()
+_watches: Dict[str, "_OutputWatch"] = {}  # task_id -> 监视上传
+
+
+def _watch_directory(output_dir: str, subfolder: str) -> str:
+    """监视目录（限定在输出目录内）"""
+    output_dir = os.path.abspath(output_dir)
+    directory = os.path.abspath(os.path.join(output_dir, subfolder))
+    if os.path.commonpath([output_dir, directory]) != output_dir:
+        raise ValueError(f"watch_subfolder 超出输出目录: {subfolder}")
+    return directory
+
+
+def _watch_filename(directory: str, path: str) -> str:
+    """监视目录中文件的上传文件名（保留子目录结构）"""
+    return os.path.relpath(path, directory).replace(os.sep, "/")
+
+
+class _OutputWatch:
+    """
+    单个任务的监视上传：DirectoryWatcher 发现写完的文件后提交到上传线程池
+    上传过程中不删除本地文件（文件之后可能继续写入并重新上传）；delete_after_upload 时，
+    上传节点执行时（图已执行完）文件与最后一次上传的内容一致才删除
+    """
+    
+    def __init__(self, node: OSS_Upload, oss_client, task_id: str, directory: str,
+                 options: UploadOptions, max_workers: int, since_ns: int = 0):
+        self.directory = directory
+        self.options = options
+        # 后台上传的阶段耗时单独记录，上传节点执行时并入节点调用的耗时摘要
+        self.timer = metrics.CallTimer("OSS_Upload", metrics.host_label(oss_client.endpoint))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="oss-upload")
+        upload_source = metrics.bind(node._upload_source, self.timer)
+        
+        def upload(path, previous):
+            # 重新上传：等待上一次上传完成，避免旧内容晚于新内容写入 OSS
+            # （上一次上传先提交，已在其他线程中执行，不会死锁）
+            if previous is not None:
+                previous.exception()
+            filename = _watch_filename(directory, path)
+            return upload_source(oss_client, filename, path, f"outputs/{task_id}/{filename}", options, False)
+        
+        def submit(path, previous):
+            return self._executor.submit(upload, path, previous)
+        
+        self._watcher = DirectoryWatcher(directory, submit, since_ns=since_ns)
+    
+    @property
+    def expired(self) -> bool:
+        return self._watcher.expired
+    
+    def finish(self) -> Dict[str, Future]:
+        """停止监视并提交剩余文件（已提交的上传在后台继续完成）"""
+        futures = self._watcher.finish()
+        self._executor.shutdown(wait=False)
+        if self.options.delete_after_upload:
+            futures = {path: _delete_after(future, path, self._watcher.submitted[path])
+                       for path, future in futures.items()}
+        return futures
+    
+    def stop(self):
+        self._watcher.stop()
+        self._executor.shutdown(wait=False)
+
+
+def _delete_after(upload: Future, path: str, signature: Tuple[int, int]) -> Future:
+    """上传成功且本地文件与上传时一致时删除文件，返回上传记录在删除后才完成的 Future"""
+    done = Future()
+    
+    def on_done(future):
+        try:
+            result = future.result()
+        except BaseException as e:
+            done.set_exception(e)
+            return
+        if "oss_path" in result and file_signature(path) == signature:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        done.set_result(result)
+    
+    upload.add_done_callback(on_done)
+    return done
+
+
+def _literal_input(inputs: Dict[str, Any], name: str, default: Any = None) -> Any:
+    """prompt 中的常量输入值（连接到其他节点输出的输入为 [节点ID, 输出序号]，此时返回默认值）"""
+    value = inputs.get(name, default)
+    return default if isinstance(value, list) else value
+
+
+def start_watch(inputs: Dict[str, Any], since_ns: int = 0) -> bool:
+    """
+    按 OSS_Upload 节点的输入启动监视上传（凭证、bucket、task_id 和 watch_subfolder 需为常量输入）
+    since_ns 为任务开始执行时间（time.time_ns()），此后修改的已有文件同样视为任务的输出
+    
+    Returns:
+        是否启动了监视
+    """
+    subfolder = _literal_input(inputs, "watch_subfolder", "")
+    if not subfolder or not _import_oss2():
+        return False
+    names = ("access_key_id", "access_key_secret", "security_token", "bucket_name", "endpoint", "task_id")
+    values = [_literal_input(inputs, name) for name in names]
+    if not all(isinstance(value, str) and value for value in values):
+        return False
+    access_key_id, access_key_secret, security_token, bucket_name, endpoint, task_id = values
+    
+    node = OSS_Upload()
+    directory = _watch_directory(node.output_dir, subfolder)
+    file_timeout_seconds = _literal_input(inputs, "file_timeout_seconds", 120)
+    options = UploadOptions(
+        deadline=time.monotonic() + MAX_WATCH_SECONDS,
+        delete_after_upload=_literal_input(inputs, "delete_after_upload", True),
+        file_timeout_seconds=file_timeout_seconds,
+        max_retries=_literal_input(inputs, "max_retries", 2),
+        multipart_threshold=_literal_input(inputs, "multipart_threshold_mb", 100) * 1024 * 1024,
+        part_size=_literal_input(inputs, "part_size_mb", 10) * 1024 * 1024,
+        part_threads=_literal_input(inputs, "part_threads", 4),
+        dedup=_literal_input(inputs, "dedup", "off")
+    )
+    oss_client = get_bucket(access_key_id, access_key_secret, security_token,
+                            endpoint, bucket_name, file_timeout_seconds)
+    
+    with _watches_lock:
+        # 清理任务失败后未执行上传节点而过期的监视
+        for key in [key for key, watch in _watches.items() if watch.expired]:
+            _watches.pop(key).stop()
+        if task_id in _watches:
+            return False
+        _watches[task_id] = _OutputWatch(node, oss_client, task_id, directory, options,
+                                         _literal_input(inputs, "max_workers", 8), since_ns)
+    return True
+
+
+def _on_execution_start(execution: prompt_hooks.Execution):
+    """任务开始执行时启动其中设置了 watch_subfolder 的 OSS_Upload 节点的监视上传"""
+    with _watches_lock:
+        # 同一时间只执行一个任务：之前任务遗留的监视（任务失败或中断，未执行上传节点）不再需要
+        for watch in _watches.values():
+            watch.stop()
+        _watches.clear()
+    for node in execution.prompt.values():
+        if not isinstance(node, dict) or node.get("class_type") != "OSS_Upload":
+            continue
+        inputs = node.get("inputs") or {}
+        if not _literal_input(inputs, "watch_subfolder", ""):
+            continue
+        try:
+            start_watch(inputs, execution.started_ns)
+        except Exception as e:
+            print(f"[OSS_Upload] 启动监视上传失败: {e}")
+
+
+def register() -> bool:
+    """
+    任务开始执行时启动监视上传（由包的 __init__ 调用）
+    不在 ComfyUI 服务中运行时返回 False：上传节点执行时直接上传监视目录中的全部文件
+    """
+    return prompt_hooks.add_execution_start_handler(_on_execution_start)
+
+
 # 节点导出
 NODE_CLASS_MAPPINGS = {
     "OSS_Upload": OSS_Upload
@@ -0,0 +1,129 @@
+"""
+节点输出的内存编码（供 OSS 上传节点直接上传张量，不经过磁盘）
+- 图片：IMAGE 张量 [B,H,W,C] -> PNG / WebP / JPEG
+- 音频：AUDIO 字典 {"waveform": [B,C,T], "sample_rate"} -> WAV / FLAC / Opus
+- 视频：VIDEO 对象优先直接使用其源文件或源数据（扩展名按容器格式），否则在内存中重新编码为 MP4
+"""
+
+import io
+import os
+import numpy as np
+from PIL import Image
+
+from .audio_resample import resample
+
+IMAGE_FORMATS = ["png", "webp", "jpeg"]
+AUDIO_FORMATS = ["flac", "wav", "opus"]
+
+# PIL 保存格式与扩展名
+_IMAGE_SAVE = {
+    "png": ("PNG", "png"),
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+
+# soundfile 容器/编码与扩展名
+_AUDIO_SAVE = {
+    "wav": ("WAV", "PCM_16", "wav"),
+    "flac": ("FLAC", "PCM_16", "flac"),
+    "opus": ("OGG", "OPUS", "opus"),
+}
+
+# Opus 只支持这些采样率，其余采样率先重采样到 48kHz
+_OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def image_extension(image_format):
+    return _IMAGE_SAVE[image_format][1]
+
+
+def audio_extension(audio_format):
+    return _AUDIO_SAVE[audio_format][2]
+
+
+def encode_image(image, image_format="png", quality=95):
+    """
+    编码单张图片张量 [H,W,C]（值域 0~1）
+
+    Returns:
+        编码后的字节数据
+    """
+    pixels = np.clip(255.0 * image.cpu().float().numpy(), 0, 255).astype(np.uint8)
+    if pixels.shape[-1] == 1:
+        pixels = pixels[:, :, 0]
+    img = Image.fromarray(pixels)
+    pil_format = _IMAGE_SAVE[image_format][0]
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        # 与 ComfyUI 保存图片节点相同的压缩级别
+        img.save(buffer, format="PNG", compress_level=4)
+    else:
+        img.save(buffer, format=pil_format, quality=quality)
+    return buffer.getvalue()
+
+
+def encode_audio(waveform, sample_rate, audio_format="flac"):
+    """
+    编码单条音频 [C,T]
+
+    Returns:
+        编码后的字节数据
+    """
+    import soundfile as sf  # 导入较慢，首次编码音频时才导入
+    waveform = waveform.cpu().float()
+    if audio_format == "opus" and sample_rate not in _OPUS_SAMPLE_RATES:
+        waveform = resample(waveform, sample_rate, 48000)
+        sample_rate = 48000
+    container, subtype, _ = _AUDIO_SAVE[audio_format]
+
+    buffer = io.BytesIO()
+    data = waveform.clamp(-1.0, 1.0).T.numpy()
+    with sf.SoundFile(buffer, "w", sample_rate, data.shape[1], format=container, subtype=subtype) as f:
+        # 分块写入（libsndfile 的 Vorbis/Opus 编码器一次写入过多数据时不稳定）
+        for start in range(0, data.shape[0], 65536):
+            f.write(data[start:start + 65536])
+    return buffer.getvalue()
+
+
+def sniff_video_extension(data, default="mp4"):
+    """按文件头判断视频容器格式的扩展名（无法识别时返回 default）"""
+    head = data[:64]
+    if head[4:8] == b"ftyp":
+        # ISO BMFF：QuickTime 的主品牌为 "qt  "
+        return "mov" if head[8:12] == b"qt  " else "mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm" if b"webm" in head else "mkv"
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return "avi"
+    if head.startswith(b"GIF8"):
+        return "gif"
+    return default
+
+
+def video_source(video):
+    """
+    取得视频的上传数据源
+
+    Returns:
+        (源文件路径 / 字节数据 / 返回字节数据的编码函数, 扩展名)
+    """
+    get_source = getattr(video, "get_stream_source", None)
+    source = get_source() if get_source is not None else None
+    if isinstance(source, str):
+        ext = os.path.splitext(source)[1].lstrip(".").lower()
+        return source, ext or "mp4"
+    if isinstance(source, io.BytesIO):
+        data = source.getvalue()
+        return data, sniff_video_extension(data)
+
+    def encode():
+        # 由帧组成的视频：在内存中重新编码为 MP4（写入内存缓冲区时无法从文件名推断容器格式，需显式指定）
+        from comfy_api.latest import Types
+        buffer = io.BytesIO()
+        video.save_to(buffer, format=Types.VideoContainer.MP4)
+        return buffer.getvalue()
+
+    return encode, "mp4"
@@ -0,0 +1,237 @@
+"""
+排队任务的输入预取
+提交 prompt 时扫描其中 URL 加载节点的常量URL输入，在后台按排队顺序下载到共享缓存，
+节点执行时输入已在本地磁盘，前面的任务占用 GPU 期间即可完成下载
+- 按节点类型读取的输入：见 PREFETCH_INPUTS（连接到其他节点输出的输入在提交时未知，不预取）
+- 后台线程并发下载，按排队位置优先（插队到队首的任务优先预取）；只预取正在执行的任务之后
+  URL_LOADER_PREFETCH_MAX_AHEAD 个任务的输入，队列很长时不会挤出缓存中即将用到的文件
+- 证书校验和下载大小上限与节点执行时相同（图片节点为 URL_LOADER_MAX_IMAGE_BYTES，URLResourceLoader 见
+  DOWNLOAD_MAX_BYTES，LoadAudioFromURL 见 AUDIO_FETCH_OPTIONS），节点执行时可共享同一次下载
+- 与节点共用 single-flight 登记表：节点执行时预取仍在进行，则直接等待同一次下载
+- LoadAudioFromURL 设置了 offset/duration 时不预取（节点只按 Range 请求读取所需片段）
+- 节点执行时默认仍发送条件请求校验预取的文件（一次往返，内容未变时不重新下载）；
+  设置 URL_LOADER_PREFETCH_FRESH_SECONDS 后，有效期内的预取结果直接使用，期间源文件的变化不会被发现
+- 预取失败只记录日志，节点执行时照常下载（并报告错误）
+
+环境变量：
+    URL_LOADER_PREFETCH                是否启用（默认 1，0 关闭）
+    URL_LOADER_PREFETCH_WORKERS        并发下载数（默认 4）
+    URL_LOADER_PREFETCH_FRESH_SECONDS  预取结果免校验的有效期（秒，默认 0 即节点执行时照常校验）
+    URL_LOADER_PREFETCH_MAX_AHEAD      预取的排队任务数（从正在执行的任务往后数，默认 4，0 不限制）
+"""
+
+from __future__ import annotations
+import os
+import queue
+import asyncio
+import itertools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+from . import prompt_hooks
+from .url_cache import get_cache
+from .single_flight import normalize_url
+
+PREFETCH_ENABLED = os.environ.get("URL_LOADER_PREFETCH", "1") != "0"
+PREFETCH_WORKERS = max(1, int(os.environ.get("URL_LOADER_PREFETCH_WORKERS", 4)))
+FRESH_SECONDS = float(os.environ.get("URL_LOADER_PREFETCH_FRESH_SECONDS", 0))
+MAX_AHEAD = int(os.environ.get("URL_LOADER_PREFETCH_MAX_AHEAD", 4))
+
+# 节点类型 -> (URL输入名, 是否为URL列表)
+PREFETCH_INPUTS = {
+    "LoadImageFromURL": ("image_url", False),
+    "LoadImageBatchFromURL": ("image_urls", True),
+    "LoadAudioFromURL": ("audio_url", False),
+    "ComfyVideoURLLoader": ("video_url", False),
+    "URLResourceLoader": ("url", False),
+}
+
+# 下载时有大小上限的节点类型（预取使用相同的上限，避免绕过节点的限制）
+_IMAGE_NODES = ("LoadImageFromURL", "LoadImageBatchFromURL")
+
+# 预取请求头（与音频/通用加载节点相同的浏览器 User-Agent，部分存储服务拒绝默认 UA）
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+}
+READ_TIMEOUT = 60
+
+
+def prompt_urls(prompt: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """prompt 中可预取的 (节点类型, URL)，按节点在 prompt 中的顺序"""
+    found = []
+    for node in prompt.values():
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type")
+        if class_type not in PREFETCH_INPUTS:
+            continue
+        name, is_list = PREFETCH_INPUTS[class_type]
+        inputs = node.get("inputs") or {}
+        value = inputs.get(name)
+        if not isinstance(value, str):
+            # 未填写或连接到其他节点的输出
+            continue
+        if class_type == "LoadAudioFromURL" and any(inputs.get(key, 0) != 0 for key in ("offset", "duration")):
+            # 只需要片段（或片段参数连接到其他节点的输出）时节点按 Range 请求读取所需部分，不预取整个文件
+            continue
+        if is_list:
+            from .image_decode import parse_url_list
+            try:
+                urls = parse_url_list(value)
+            except ValueError:
+                continue  # 格式错误由节点执行时报告
+        else:
+            urls = [value.strip()]
+        for url in urls:
+            if url.startswith(("http://", "https://")):
+                found.append((class_type, url))
+    return found
+
+
+class Prefetcher:
+    """
+    按优先级在后台线程中下载URL到共享缓存（线程安全）
+    优先级即排队序号：超出正在执行的任务之后 max_ahead 个任务的URL暂缓，任务开始执行（started）时再放行
+    """
+
+    def __init__(self, workers: int = PREFETCH_WORKERS, fresh_seconds: float = FRESH_SECONDS,
+                 max_ahead: int = MAX_AHEAD):
+        self.workers = workers
+        self.fresh_seconds = fresh_seconds
+        self.max_ahead = max_ahead
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[float, int]] = {}  # 规范化URL -> 当前优先级
+        self._deferred: List[tuple] = []  # 超出预取范围、等待任务开始执行后放行的队列项
+        self._order = itertools.count()  # 同一优先级内按加入顺序
+        self._executing = 0.0  # 已开始执行的任务中最大的排队序号
+        self._threads: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def submit_prompt(self, prompt: Dict[str, Any], number: float) -> int:
+        """
+        加入一个排队 prompt 的全部可预取URL（number 为 ComfyUI 的排队序号，插队到队首的任务为负数）
+
+        Returns:
+            新加入的URL数
+        """
+        return sum(self.submit(class_type, url, number) for class_type, url in prompt_urls(prompt))
+
+    def started(self, number: float):
+        """排队序号为 number 的任务开始执行：预取范围后移，放行暂缓的URL"""
+        with self._lock:
+            if number <= self._executing:
+                return
+            self._executing = number
+            deferred, self._deferred = self._deferred, []
+        for item in deferred:
+            self._queue.put(item)
+
+    def _within_range(self, priority: float) -> bool:
+        return self.max_ahead <= 0 or priority <= self._executing + self.max_ahead
+
+    def submit(self, class_type: str, url: str, priority: float) -> bool:
+        key = normalize_url(url)
+        with self._lock:
+            item_priority = (priority, next(self._order))
+            current = self._pending.get(key)
+            if current is not None and current <= item_priority:
+                return False
+            # 已在队列中但优先级更低：加入新的条目，旧条目取出时跳过
+            self._pending[key] = item_priority
+            self._queue.put((item_priority, key, class_type, url))
+            self._start_workers()
+        return current is None
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"url-loader-prefetch-{len(self._threads)}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            item_priority, key, class_type, url = item
+            with self._lock:
+                if self._pending.get(key) != item_priority:
+                    continue
+                if not self._within_range(item_priority[0]):
+                    self._deferred.append(item)
+                    continue
+            try:
+                self._fetch(class_type, url)
+            except Exception as e:
+                print(f"[URLPrefetch] 预取失败（节点执行时重新下载）: {url}, {e}")
+            finally:
+                with self._lock:
+                    if self._pending.get(key) == item_priority:
+                        del self._pending[key]
+
+    def _fetch(self, class_type: str, url: str):
+        cache = get_cache()
+        if class_type == "ComfyVideoURLLoader":
+            # 视频与节点相同走异步多连接下载（支持断点续传）
+            asyncio.run_coroutine_threadsafe(self._fetch_async(url), self._event_loop()).result()
+        else:
+            # 证书校验和大小上限与节点相同，节点执行时才能共享同一次下载（并发去重的键）
+            options = {"headers": _HEADERS, "timeout": READ_TIMEOUT}
+            if class_type in _IMAGE_NODES:
+                from .image_decode import MAX_IMAGE_BYTES
+                options["max_bytes"] = MAX_IMAGE_BYTES
+            elif class_type == "URLResourceLoader":
+                from .url_resource_loader import DOWNLOAD_MAX_BYTES
+                options["max_bytes"] = DOWNLOAD_MAX_BYTES
+            elif class_type == "LoadAudioFromURL":
+                from .LoadAudioFromURL import AUDIO_FETCH_OPTIONS
+                options = dict(AUDIO_FETCH_OPTIONS)
+            with metrics.track("URLPrefetch", url):
+                cache.fetch(url, **options)
+        if self.fresh_seconds > 0:
+            cache.mark_fresh(url, self.fresh_seconds)
+
+    @staticmethod
+    async def _fetch_async(url: str):
+        from .async_download import fetch_to_cache
+        with metrics.track("URLPrefetch", url):
+            return await fetch_to_cache(get_cache(), url, headers=_HEADERS)
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        """预取专用的事件循环（后台线程中常驻，复用其 aiohttp 连接池）"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="url-loader-prefetch-loop",
+                                 daemon=True).start()
+            return self._loop
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+prefetcher = Prefetcher()
+
+
+# ---------------------------
+# ComfyUI 服务：提交 prompt 时预取
+# ---------------------------
+def _on_prompt(json_data):
+    """提交 prompt 时加入其中 URL 加载节点的输入（只入队，不阻塞提交）"""
+    try:
+        prefetcher.submit_prompt(json_data.get("prompt") or {}, prompt_hooks.queue_number(json_data))
+    except Exception as e:
+        print(f"[URLPrefetch] 解析 prompt 失败: {e}")
+    return json_data
+
+
+def register() -> bool:
+    """注册 prompt 提交和任务开始执行的回调（未启用或不在 ComfyUI 服务中运行时返回 False；由包的 __init__ 调用）"""
+    if not PREFETCH_ENABLED or not prompt_hooks.add_execution_start_handler(
+            lambda execution: prefetcher.started(execution.number)):
+        return False
+    from server import PromptServer
+    PromptServer.instance.add_on_prompt_handler(_on_prompt)
+    return True
@@ -0,0 +1,119 @@
+"""
+ComfyUI 执行队列的回调（输入预取和监视上传共用）
+ComfyUI 的 execution_start 事件只通过 websocket 发给提交任务的客户端（且 prompt 带 client_id 时才发送），
+服务端没有订阅接口：后台线程定期读取执行队列的快照（只读，不修改队列对象），
+发现新开始执行的任务时调用已注册的回调
+提交时的记录与执行时的任务按排队序号对应：on_prompt 回调中用 queue_number 读取 ComfyUI 即将分配的序号，
+不修改提交的 json_data
+
+环境变量：
+    URL_LOADER_QUEUE_POLL_INTERVAL  查询执行队列的间隔（秒，默认 0.25）
+"""
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+POLL_INTERVAL = float(os.environ.get("URL_LOADER_QUEUE_POLL_INTERVAL", 0.25))
+
+
+class Execution(NamedTuple):
+    """正在执行的任务"""
+    prompt_id: str
+    number: float  # 排队序号（插队到队首的任务为负数）
+    prompt: Dict[str, Any]
+    started_ns: int  # 开始执行时间的下界（time.time_ns()，即上一次查询队列时仍未执行）
+
+
+_lock = threading.Lock()
+_handlers: List[Callable[[Execution], None]] = []
+_thread: Optional[threading.Thread] = None
+_current: Optional[Execution] = None
+_last_poll_ns = 0
+
+
+def _server():
+    """ComfyUI 服务实例（不在 ComfyUI 服务中运行时为 None）"""
+    try:
+        from server import PromptServer
+        return PromptServer.instance
+    except Exception:
+        return None
+
+
+def queue_number(json_data: Dict[str, Any]) -> float:
+    """
+    在 prompt 提交回调中调用：返回 ComfyUI 将为该 prompt 分配的排队序号（与执行时 Execution.number 相同）
+    ComfyUI 在调用提交回调后、处理下一个请求前按 server.number 分配序号（插队的任务取负数）
+    """
+    if "number" in json_data:
+        return float(json_data["number"])
+    number = float(getattr(_server(), "number", 0))
+    return -number if json_data.get("front") else number
+
+
+def add_execution_start_handler(handler: Callable[[Execution], None]) -> bool:
+    """
+    注册任务开始执行的回调 handler(execution)（在查询线程中调用，应尽快返回）
+
+    Returns:
+        是否注册成功（不在 ComfyUI 服务中运行时为 False）
+    """
+    global _thread
+    with _lock:
+        if _thread is None:
+            server = _server()
+            if server is None or getattr(server, "prompt_queue", None) is None:
+                return False
+            _thread = threading.Thread(target=_run, args=(server.prompt_queue,),
+                                       name="url-loader-queue-poll", daemon=True)
+            _thread.start()
+        _handlers.append(handler)
+    return True
+
+
+def current_execution() -> Optional[Execution]:
+    """立即查询正在执行的任务（节点执行时调用；不在 ComfyUI 服务中运行时为 None）"""
+    server = _server()
+    if server is None or getattr(server, "prompt_queue", None) is None:
+        return None
+    return _poll(server.prompt_queue)
+
+
+def _running(prompt_queue) -> List[tuple]:
+    """执行中的队列项 (序号, prompt_id, prompt, ...)；优先使用不深拷贝 prompt 的快照接口"""
+    snapshot = getattr(prompt_queue, "get_current_queue_volatile", None) or prompt_queue.get_current_queue
+    running, _ = snapshot()
+    return list(running)
+
+
+def _poll(prompt_queue) -> Optional[Execution]:
+    global _current, _last_poll_ns
+    with _lock:
+        now = time.time_ns()
+        running = _running(prompt_queue)
+        started = None
+        if not running:
+            _current = None
+        elif _current is None or str(running[0][1]) != _current.prompt_id:
+            item = running[0]
+            started = _current = Execution(str(item[1]), float(item[0]), item[2], _last_poll_ns)
+        _last_poll_ns = now
+        current, handlers = _current, list(_handlers)
+    if started is not None:
+        for handler in handlers:
+            try:
+                handler(started)
+            except Exception as e:
+                print(f"[URLLoader] 任务开始执行的回调出错: {e}")
+    return current
+
+
+def _run(prompt_queue):
+    while True:
+        try:
+            _poll(prompt_queue)
+        except Exception as e:
+            print(f"[URLLoader] 查询执行队列出错: {e}")
+        time.sleep(POLL_INTERVAL)
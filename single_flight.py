@@ -0,0 +1,107 @@
+"""
+同一URL的并发下载去重（single-flight）
+多个节点/多个排队任务同时请求同一URL时，只有第一个请求者（leader）实际下载，
+其余请求者等待并共享其结果（或异常）。同步调用（图片/音频/通用节点）与异步调用（视频节点）
+共用同一登记表，跨节点类型同样生效
+"""
+
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """规范化URL作为去重键：协议/主机名小写、去掉默认端口和片段（#...），保留路径和查询参数原样"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username or parts.password:
+        host = f"{parts.username or ''}:{parts.password or ''}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+class _LeaderCancelled(Exception):
+    """leader 被取消（例如任务被中断），等待者应重新发起请求而不是失败"""
+
+
+class SingleFlight:
+    """进程内的 single-flight 登记表（线程安全，同时支持同步与异步调用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Tuple[Future, int]] = {}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool, int]:
+        """返回 (共享结果, 是否为leader, leader所在线程)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call[0], False, call[1]
+            future = Future()
+            self._calls[key] = (future, threading.get_ident())
+            return future, True, threading.get_ident()
+
+    def _finish(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._calls.get(key, (None,))[0] is future:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """同步执行：同一 key 同时只执行一次 fn，其余调用者等待并共享结果"""
+        while True:
+            future, leader, owner = self._join(key)
+            if not leader:
+                if owner == threading.get_ident():
+                    # leader 是同一线程上的异步下载（事件循环被当前调用阻塞），等待会死锁，直接执行
+                    return fn(*args, **kwargs)
+                try:
+                    return future.result()
+                except _LeaderCancelled:
+                    continue
+
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._finish(key, future)
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """异步执行：fn 为协程函数，语义与 do 相同"""
+        while True:
+            future, leader, _ = self._join(key)
+            if not leader:
+                try:
+                    # shield：等待者自身被取消时不能连带取消共享结果
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except _LeaderCancelled:
+                    continue
+
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.set_exception(_LeaderCancelled())
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._finish(key, future)
+
+
+# 所有URL加载节点共用的登记表
+downloads = SingleFlight()
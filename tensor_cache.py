@@ -0,0 +1,110 @@
+"""
+解码结果（输出张量）的内存LRU缓存
+键 = 节点类型 + 内容校验值（缓存文件 SHA-256，远端变化时自动失效）+ 节点的尺寸/采样率/声道等参数，
+重复加载同一资源时跳过解码、缩放、重采样，直接返回上次输出张量的副本
+缓存保存和返回的都是副本：下游节点原地修改输出张量不会影响缓存内容（复制远快于重新解码）
+
+环境变量：
+    URL_LOADER_TENSOR_CACHE_MAX_BYTES       缓存张量总大小上限（字节，默认 2GB，0表示禁用）
+    URL_LOADER_TENSOR_CACHE_MIN_FREE_BYTES  系统可用内存低于该值时主动淘汰（默认 4GB，需要 psutil）
+"""
+
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import torch
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MAX_BYTES = int(os.environ.get("URL_LOADER_TENSOR_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+MIN_FREE_BYTES = int(os.environ.get("URL_LOADER_TENSOR_CACHE_MIN_FREE_BYTES", 4 * 1024 ** 3))
+
+
+def tensor_bytes(value: Any) -> int:
+    """统计输出值（张量 / 元组 / 字典）中所有张量占用的字节数"""
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement()
+    if isinstance(value, dict):
+        return sum(tensor_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(tensor_bytes(v) for v in value)
+    return 0
+
+
+def clone_tensors(value: Any) -> Any:
+    """复制输出值（张量 / 元组 / 字典）中的所有张量，其余值原样保留"""
+    if isinstance(value, torch.Tensor):
+        return value.clone()
+    if isinstance(value, dict):
+        return {k: clone_tensors(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(clone_tensors(v) for v in value)
+    return value
+
+
+class TensorCache:
+    """按张量总字节数限制容量的LRU缓存（线程安全）"""
+
+    def __init__(self, max_bytes: int = MAX_BYTES, min_free_bytes: int = MIN_FREE_BYTES):
+        self.max_bytes = max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.total_bytes = 0
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """返回缓存值的副本（调用方可任意修改）"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+        return clone_tensors(item[0])
+
+    def put(self, key: Hashable, value: Any):
+        """保存 value 的副本（之后修改 value 不影响缓存）"""
+        size = tensor_bytes(value)
+        if self.max_bytes <= 0 or size > self.max_bytes:
+            return
+        value = clone_tensors(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._items[key] = (value, size)
+            self.total_bytes += size
+            self._evict()
+
+    def _memory_low(self) -> bool:
+        if psutil is None or self.min_free_bytes <= 0:
+            return False
+        return psutil.virtual_memory().available < self.min_free_bytes
+
+    def _evict(self):
+        """超出容量或系统内存不足时淘汰最久未使用的项（调用方需持有锁）"""
+        while self._items and self.total_bytes > self.max_bytes:
+            self._pop_oldest()
+        if self._memory_low():
+            # 内存紧张时释放一半缓存，避免挤占模型推理所需内存
+            target = self.total_bytes // 2
+            while self._items and self.total_bytes > target:
+                self._pop_oldest()
+
+    def _pop_oldest(self):
+        _, (_, size) = self._items.popitem(last=False)
+        self.total_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+
+# 所有URL加载节点共用的缓存实例
+outputs = TensorCache()
@@ -0,0 +1,61 @@
+"""
+测试公共设置
+
+被测模块按包导入（模块间使用相对导入），但不执行包的 __init__（其中注册节点需要完整的 ComfyUI），
+只依赖 ComfyUI 的用例（OSS 上传节点等）在 ComfyUI 模块不可用时跳过。
+ComfyUI 目录默认为 custom_nodes 的上一级，可用环境变量 COMFYUI_DIR 指定。
+HTTP 资源和 OSS 由 benchmarks/bench_server.py 的本地服务模拟。
+
+运行：python -m pytest tests
+"""
+
+import importlib
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TESTS_DIR)
+PACKAGE_NAME = "url_loader_under_test"
+COMFYUI_DIR = os.environ.get("COMFYUI_DIR") or os.path.abspath(os.path.join(PACKAGE_DIR, "..", ".."))
+
+# 下载缓存、OSS 断点记录和去重索引写入临时目录（模块导入时读取）
+_STATE_DIR = tempfile.mkdtemp(prefix="url-loader-tests-")
+os.environ["URL_LOADER_CACHE_DIR"] = os.path.join(_STATE_DIR, "cache")
+os.environ["URL_LOADER_OSS_CHECKPOINT_DIR"] = os.path.join(_STATE_DIR, "oss-upload")
+
+sys.path.insert(0, os.path.join(PACKAGE_DIR, "benchmarks"))
+if COMFYUI_DIR not in sys.path:
+    sys.path.append(COMFYUI_DIR)
+
+if PACKAGE_NAME not in sys.modules:
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PACKAGE_DIR]
+    sys.modules[PACKAGE_NAME] = package
+
+
+def load(name: str):
+    """导入被测包中的模块"""
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
+
+
+def load_comfy(name: str):
+    """导入依赖 ComfyUI 模块（folder_paths 等）的被测模块，不可用时跳过用例"""
+    pytest.importorskip("folder_paths")
+    return load(name)
+
+
+@pytest.fixture
+def server():
+    from bench_server import BenchServer
+    bench = BenchServer()
+    yield bench
+    bench.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return load("url_cache").URLCache(root=str(tmp_path / "cache"))
@@ -0,0 +1,40 @@
+import math
+
+import pytest
+import torch
+
+from conftest import load
+
+resample = load("audio_resample").resample
+
+
+@pytest.mark.parametrize("orig, new", [(44100, 16000), (16000, 48000), (48000, 44100)])
+def test_chunked_matches_single_pass(orig, new):
+    waveform = torch.randn(2, orig)
+    whole = resample(waveform, orig, new, chunk_frames=10 ** 9)
+    chunked = resample(waveform, orig, new, chunk_frames=4096)
+    assert whole.shape == (2, math.ceil(new * orig / orig))
+    torch.testing.assert_close(chunked, whole, rtol=0, atol=1e-5)
+
+
+def test_preserves_tone():
+    orig, new, freq = 44100, 16000, 1000.0
+    t = torch.arange(orig) / orig
+    out = resample(torch.sin(2 * math.pi * freq * t)[None], orig, new)[0]
+    spectrum = torch.fft.rfft(out[new // 10:-new // 10])
+    peak = spectrum.abs().argmax().item() * new / (len(out) - 2 * (new // 10))
+    assert abs(peak - freq) < 5
+    assert abs(out[new // 10:-new // 10].abs().max().item() - 1.0) < 0.02
+
+
+@pytest.mark.parametrize("orig, new", [(44100, 16000), (22050, 48000)])
+def test_matches_torchaudio(orig, new):
+    functional = pytest.importorskip("torchaudio.functional")
+    waveform = torch.randn(2, orig // 2)
+    expected = functional.resample(waveform, orig, new)
+    torch.testing.assert_close(resample(waveform, orig, new, chunk_frames=3000), expected, rtol=0, atol=1e-5)
+
+
+def test_same_rate_returns_input():
+    waveform = torch.randn(1, 100)
+    assert resample(waveform, 16000, 16000) is waveform
@@ -0,0 +1,49 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from conftest import load
+
+audio_window = load("audio_window")
+
+SAMPLE_RATE = 8000
+
+
+def _encode(audio_format, subtype, seconds=6):
+    samples = (np.random.default_rng(0).standard_normal((SAMPLE_RATE * seconds, 2)) * 0.2).astype(np.float32)
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, SAMPLE_RATE, format=audio_format, subtype=subtype)
+    data = buffer.getvalue()
+    expected, _ = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    return data, expected
+
+
+@pytest.mark.parametrize("audio_format, subtype", [("WAV", "PCM_16"), ("WAV", "FLOAT"), ("FLAC", "PCM_16")])
+@pytest.mark.parametrize("offset, duration", [(0.0, 1.0), (2.5, 1.25), (4.0, 0.0)])
+def test_window_matches_full_decode(audio_format, subtype, offset, duration):
+    data, expected = _encode(audio_format, subtype)
+    waveform, sample_rate = audio_window.read_window(io.BytesIO(data), offset, duration)
+    start = int(round(offset * SAMPLE_RATE))
+    stop = start + int(round(duration * SAMPLE_RATE)) if duration else len(expected)
+    assert sample_rate == SAMPLE_RATE
+    np.testing.assert_allclose(waveform.numpy().T, expected[start:stop], atol=1e-6)
+
+
+def test_wav_window_over_http_reads_only_the_range(server):
+    data, expected = _encode("WAV", "PCM_16", seconds=60)
+    server.add_file("a.wav", data, "audio/wav")
+    with audio_window.HTTPRangeFile(server.url("a.wav")) as fp:
+        waveform, _ = audio_window.read_window(fp, 40.0, 0.5)
+        fetched = fp.bytes_fetched
+    np.testing.assert_allclose(waveform.numpy().T, expected[40 * SAMPLE_RATE:int(40.5 * SAMPLE_RATE)], atol=1e-6)
+    # 文件头 + 片段 + 预读，远小于整个文件
+    assert fetched < len(data) // 4
+
+
+def test_range_not_supported(server):
+    data, _ = _encode("WAV", "PCM_16")
+    server.add_file("a.wav", data, "audio/wav")
+    with pytest.raises(audio_window.RangeNotSupported):
+        audio_window.HTTPRangeFile(server.url("a.wav", range=0))
@@ -0,0 +1,45 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import load
+
+decode_pool = load("decode_pool")
+image_decode = load("image_decode")
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(decode_pool, "DECODE_PROCESSES", 1)
+    monkeypatch.setattr(decode_pool, "DECODE_MIN_BYTES", 1024)
+    monkeypatch.setattr(decode_pool, "_pool", None)
+    yield decode_pool.get_pool()
+    decode_pool._pool.close()
+
+
+def _png(size=(640, 480)):
+    pixels = np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    return buffer.getvalue(), pixels
+
+
+def test_fresh_png_download_is_decoded_in_pool(server, pool, monkeypatch):
+    data, pixels = _png()
+    server.add_file("a.png", data, "image/png")
+    tasks = []
+    run = pool.run
+    monkeypatch.setattr(pool, "run", lambda task: tasks.append(task["kind"]) or run(task))
+
+    entry, decoder = image_decode.download_image(server.url("a.png"))
+    tensor = decode_pool.offload_image(entry, decoder)
+    assert tasks == ["image"]
+    assert tensor is not None
+    np.testing.assert_allclose(tensor.numpy(), pixels / 255.0, atol=1e-6)
+
+
+def test_worker_does_not_import_comfyui(pool):
+    modules = pool.run({"kind": "modules"})["modules"]
+    assert not {"server", "nodes", "execution", "folder_paths", "torch"} & {name.split(".")[0] for name in modules}
@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import load
+
+image_decode = load("image_decode")
+
+
+def _encode(image_format, size=(256, 192)):
+    pixels = np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def _feed(decoder, data, chunk_size=4096):
+    for start in range(0, len(data), chunk_size):
+        decoder(data[start:start + chunk_size])
+
+
+@pytest.mark.parametrize("image_format", ["PNG", "WEBP", "JPEG"])
+def test_stops_for_formats_without_incremental_decoder(image_format):
+    # Pillow 对这些格式不做增量解码，继续喂数据只会反复拼接缓冲区
+    decoder = image_decode.StreamingImageDecoder()
+    _feed(decoder, _encode(image_format))
+    assert not decoder.active and not decoder.has_image
+    assert decoder.close() is None
+
+
+@pytest.mark.parametrize("image_format", ["BMP", "TIFF"])
+def test_incremental_decode_matches_file_decode(image_format):
+    data = _encode(image_format)
+    decoder = image_decode.StreamingImageDecoder()
+    _feed(decoder, data)
+    image = decoder.close()
+    if image is None:
+        pytest.skip(f"Pillow has no incremental decoder for {image_format}")
+    with Image.open(io.BytesIO(data)) as expected:
+        assert np.array_equal(np.asarray(image.convert("RGB")), np.asarray(expected.convert("RGB")))
+
+
+def test_non_image_data_disables_decoder():
+    decoder = image_decode.StreamingImageDecoder()
+    _feed(decoder, b"\0" * (image_decode._STREAM_PROBE_BYTES + 8192))
+    assert not decoder.active
+
+
+def test_download_respects_image_cap(server, monkeypatch):
+    server.add_file("a.png", _encode("PNG"), "image/png")
+    monkeypatch.setattr(image_decode, "MAX_IMAGE_BYTES", 1000)
+    with pytest.raises(ValueError, match="too large"):
+        image_decode.download_image(server.url("a.png"))
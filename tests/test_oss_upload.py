@@ -0,0 +1,150 @@
+import json
+import os
+import time
+
+import pytest
+
+from conftest import load_comfy
+
+oss2 = pytest.importorskip("oss2")
+oss_uploader = load_comfy("oss_uploader")
+prompt_hooks = load_comfy("prompt_hooks")
+
+
+@pytest.fixture
+def node(tmp_path, monkeypatch):
+    monkeypatch.setattr(oss_uploader, "_dedup_index", oss_uploader.DedupIndex(str(tmp_path / "dedup-index.json")))
+    upload_node = oss_uploader.OSS_Upload()
+    upload_node.output_dir = str(tmp_path / "output")
+    (tmp_path / "output").mkdir()
+    return upload_node
+
+
+def _upload(node, server, task_id, names, **kwargs):
+    file_list = json.dumps({"files": [{"filename": name} for name in names]})
+    kwargs.setdefault("delete_after_upload", False)
+    result = node.upload("ak", "sk", "token", "bench", server.address, task_id, file_list, **kwargs)
+    return json.loads(result[0])
+
+
+def test_uploads_and_reports_missing_files(node, server, tmp_path):
+    (tmp_path / "output" / "a.png").write_bytes(b"a" * 1000)
+    result = _upload(node, server, "T1", ["a.png", "missing.png"])
+    assert result["status"] == "partial"
+    assert [f["oss_path"] for f in result["uploaded_files"]] == ["outputs/T1/a.png"]
+    assert server.objects["/bench/outputs/T1/a.png"][0] == 1000
+
+
+def test_delete_after_upload(node, server, tmp_path):
+    path = tmp_path / "output" / "a.png"
+    path.write_bytes(b"a" * 1000)
+    assert _upload(node, server, "T1", ["a.png"], delete_after_upload=True)["uploaded_count"] == 1
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("algorithm", ["md5", "crc64"])
+def test_identical_content_is_copied_server_side(node, server, tmp_path, algorithm):
+    (tmp_path / "output" / "a.png").write_bytes(b"a" * 5000)
+    first = _upload(node, server, "T1", ["a.png"], dedup=algorithm)
+    received = server.stats()["bytes_received"]
+    second = _upload(node, server, "T2", ["a.png"], dedup=algorithm)
+
+    assert not first["uploaded_files"][0].get("deduplicated")
+    assert second["uploaded_files"][0]["deduplicated"] is True
+    assert second["dedup_saved_bytes"] == 5000
+    assert server.stats()["bytes_received"] - received < 5000
+    assert server.objects["/bench/outputs/T2/a.png"][0] == 5000
+    # 复制源为首次上传的对象，bucket 中不另存去重副本
+    assert sorted(server.objects) == ["/bench/outputs/T1/a.png", "/bench/outputs/T2/a.png"]
+
+
+def test_dedup_uploads_again_when_source_was_overwritten(node, server, tmp_path):
+    (tmp_path / "output" / "a.png").write_bytes(b"a" * 5000)
+    _upload(node, server, "T1", ["a.png"], dedup="md5")
+    server.objects["/bench/outputs/T1/a.png"] = (10, '"OTHER"')
+    result = _upload(node, server, "T2", ["a.png"], dedup="md5")
+    assert not result["uploaded_files"][0].get("deduplicated")
+    assert server.objects["/bench/outputs/T2/a.png"][0] == 5000
+    # 之后以本次上传的对象作为复制源
+    assert _upload(node, server, "T3", ["a.png"], dedup="md5")["uploaded_files"][0]["deduplicated"] is True
+
+
+def test_dedup_falls_back_to_upload_on_oss_errors(node, server, tmp_path, monkeypatch):
+    (tmp_path / "output" / "a.png").write_bytes(b"a" * 5000)
+    _upload(node, server, "T1", ["a.png"], dedup="md5")
+
+    def denied(*args, **kwargs):
+        raise oss2.exceptions.ServerError(403, {}, b"", {"Code": "AccessDenied"})
+
+    monkeypatch.setattr(oss2.Bucket, "copy_object", denied)
+    result = _upload(node, server, "T2", ["a.png"], dedup="md5")
+    assert result["status"] == "success"
+    assert not result["uploaded_files"][0].get("deduplicated")
+    assert server.objects["/bench/outputs/T2/a.png"][0] == 5000
+
+
+def test_content_digest_streams_files(tmp_path, monkeypatch):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"ab" * 5000)
+    monkeypatch.setattr(oss_uploader, "_HASH_CHUNK_SIZE", 1000)
+    assert oss_uploader.content_digest(str(path), "md5") == oss_uploader.content_digest(b"ab" * 5000, "md5")
+
+
+def test_dedup_skips_hashing_above_copy_limit(node, server, tmp_path, monkeypatch):
+    (tmp_path / "output" / "a.png").write_bytes(b"a" * 5000)
+    monkeypatch.setattr(oss_uploader, "_COPY_OBJECT_MAX_BYTES", 1000)
+    monkeypatch.setattr(oss_uploader, "content_digest", pytest.fail)
+    assert _upload(node, server, "T1", ["a.png"], dedup="md5")["uploaded_count"] == 1
+
+
+def _output_files(tmp_path, started_ns):
+    """监视目录中任务开始前写入的旧文件和开始后写入的新文件"""
+    directory = tmp_path / "output" / "sub"
+    directory.mkdir()
+    old = directory / "old.png"
+    old.write_bytes(b"o" * 100)
+    os.utime(old, ns=(started_ns - 10 ** 9, started_ns - 10 ** 9))
+    (directory / "new.png").write_bytes(b"n" * 100)
+    return old
+
+
+def _uploaded(result):
+    return sorted(f["oss_path"] for f in result["uploaded_files"])
+
+
+def test_watch_fallback_uploads_only_files_of_the_running_task(node, server, tmp_path, monkeypatch):
+    started_ns = time.time_ns() - 10 ** 6
+    execution = prompt_hooks.Execution("p1", 1, {}, started_ns)
+    monkeypatch.setattr(prompt_hooks, "current_execution", lambda: execution)
+    old = _output_files(tmp_path, started_ns)
+    result = _upload(node, server, "T1", [], watch_subfolder="sub", delete_after_upload=True)
+    assert _uploaded(result) == ["outputs/T1/new.png"]
+    assert old.exists()
+
+
+def test_watch_fallback_outside_comfyui_uploads_whole_directory(node, server, tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_hooks, "current_execution", lambda: None)
+    _output_files(tmp_path, time.time_ns())
+    result = _upload(node, server, "T1", [], watch_subfolder="sub")
+    assert _uploaded(result) == ["outputs/T1/new.png", "outputs/T1/old.png"]
+
+
+def test_watch_started_late_still_uploads_files_written_after_start(node, server, tmp_path, monkeypatch):
+    started_ns = time.time_ns() - 10 ** 6
+    _output_files(tmp_path, started_ns)
+    monkeypatch.setattr(oss_uploader.OSS_Upload, "__init__",
+                        lambda self: setattr(self, "output_dir", node.output_dir))
+    inputs = {"access_key_id": "ak", "access_key_secret": "sk", "security_token": "token",
+              "bucket_name": "bench", "endpoint": server.address, "task_id": "T1",
+              "watch_subfolder": "sub", "delete_after_upload": False}
+    assert oss_uploader.start_watch(inputs, started_ns)
+    result = _upload(node, server, "T1", [], watch_subfolder="sub")
+    assert _uploaded(result) == ["outputs/T1/new.png"]
+
+
+def test_buckets_share_the_connection_pool_but_not_credentials(server):
+    first = oss_uploader.get_bucket("ak1", "sk1", "token1", server.address, "bench", 30)
+    second = oss_uploader.get_bucket("ak2", "sk2", "token2", server.address, "bench", 5)
+    assert first.session is second.session
+    assert first.auth is not second.auth
+    assert (first.timeout, second.timeout) == (30, 5)
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from conftest import load, load_comfy
+
+prefetch = load("prefetch")
+
+
+def _node(class_type, **inputs):
+    return {"class_type": class_type, "inputs": inputs}
+
+
+def test_prompt_urls():
+    prompt = {
+        "1": _node("LoadImageBatchFromURL", image_urls='["http://a/1.png", " http://a/2.png ", ""]'),
+        "2": _node("LoadImageBatchFromURL", image_urls="[not json"),
+        "3": _node("LoadAudioFromURL", audio_url="http://a/full.wav", offset=0.0, duration=0.0),
+        "4": _node("LoadAudioFromURL", audio_url="http://a/window.wav", offset=5.0, duration=0.0),
+        "5": _node("LoadAudioFromURL", audio_url="http://a/linked.wav", duration=["9", 0]),
+        "6": _node("URLResourceLoader", url=["7", 0]),
+    }
+    assert prefetch.prompt_urls(prompt) == [
+        ("LoadImageBatchFromURL", "http://a/1.png"),
+        ("LoadImageBatchFromURL", "http://a/2.png"),
+        ("LoadAudioFromURL", "http://a/full.wav"),
+    ]
+
+
+def test_audio_prefetch_shares_the_node_download(server):
+    audio = load_comfy("LoadAudioFromURL").LoadAudioFromURL
+    server.add_file("a.wav", b"x" * 200_000, "audio/wav")
+    url = server.url("a.wav", latency=0.3)
+    prefetcher = prefetch.Prefetcher(fresh_seconds=0)
+    thread = threading.Thread(target=prefetcher._fetch, args=("LoadAudioFromURL", url))
+    thread.start()
+    time.sleep(0.1)
+    audio._fetch_audio(url)
+    thread.join()
+    assert server.stats()["requests"] == 1
+
+    # 未设置免校验有效期：节点执行时照常发送条件请求
+    audio._fetch_audio(url)
+    assert server.stats()["requests"] == 2
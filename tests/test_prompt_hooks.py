@@ -0,0 +1,66 @@
+import time
+import types
+
+import pytest
+
+from conftest import load
+
+prompt_hooks = load("prompt_hooks")
+prefetch = load("prefetch")
+
+
+class FakeQueue:
+    """只提供 ComfyUI 执行队列的快照接口"""
+
+    def __init__(self):
+        self.running = []
+
+    def get_current_queue_volatile(self):
+        return list(self.running), []
+
+
+@pytest.fixture
+def server(monkeypatch):
+    instance = types.SimpleNamespace(number=7, prompt_queue=FakeQueue())
+    monkeypatch.setattr(prompt_hooks, "_server", lambda: instance)
+    monkeypatch.setattr(prompt_hooks, "_current", None)
+    monkeypatch.setattr(prompt_hooks, "_handlers", [])
+    return instance
+
+
+def test_queue_number_matches_comfyui_numbering(server):
+    json_data = {"prompt": {}}
+    assert prompt_hooks.queue_number(json_data) == 7
+    assert prompt_hooks.queue_number({"prompt": {}, "front": True}) == -7
+    assert prompt_hooks.queue_number({"prompt": {}, "number": 3}) == 3
+    assert json_data == {"prompt": {}}
+
+
+def test_reports_each_execution_start_once(server, monkeypatch):
+    started = []
+    monkeypatch.setattr(prompt_hooks, "_thread", object())  # 不启动后台查询线程
+    assert prompt_hooks.add_execution_start_handler(started.append)
+
+    assert prompt_hooks.current_execution() is None
+    before = time.time_ns()
+    prompt = {"1": {"class_type": "SaveImage", "inputs": {}}}
+    server.prompt_queue.running = [(7, "p7", prompt, {}, [])]
+    execution = prompt_hooks.current_execution()
+    prompt_hooks.current_execution()
+
+    assert [e.prompt_id for e in started] == ["p7"]
+    assert execution.number == 7 and execution.prompt is prompt
+    assert execution.started_ns <= before
+
+    server.prompt_queue.running = [(8, "p8", {}, {}, [])]
+    prompt_hooks.current_execution()
+    assert [e.prompt_id for e in started] == ["p7", "p8"]
+
+
+def test_prefetch_window_follows_queue_numbers():
+    prefetcher = prefetch.Prefetcher(max_ahead=2)
+    assert prefetcher._within_range(2) and not prefetcher._within_range(3)
+    prefetcher.started(5)
+    assert prefetcher._within_range(7) and not prefetcher._within_range(8)
+    prefetcher.started(-1)  # 插队任务不使预取范围后退
+    assert prefetcher._within_range(7)
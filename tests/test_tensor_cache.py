@@ -0,0 +1,33 @@
+import torch
+
+from conftest import load
+
+tensor_cache = load("tensor_cache")
+
+
+def test_in_place_edits_do_not_change_the_cache():
+    cache = tensor_cache.TensorCache(max_bytes=1 << 20, min_free_bytes=0)
+    image = torch.zeros(1, 4, 4, 3)
+    audio = {"waveform": torch.zeros(1, 100), "sample_rate": 16000}
+    cache.put("image", (image, "info"))
+    cache.put("audio", audio)
+
+    image += 1  # 节点返回的输出在保存后被下游修改
+    first, info = cache.get("image")
+    first.mul_(0).add_(5)
+    cache.get("audio")["waveform"].fill_(1)
+
+    second, _ = cache.get("image")
+    assert info == "info" and torch.count_nonzero(second) == 0
+    assert torch.count_nonzero(cache.get("audio")["waveform"]) == 0
+    assert cache.get("audio")["sample_rate"] == 16000
+
+
+def test_evicts_by_tensor_bytes():
+    cache = tensor_cache.TensorCache(max_bytes=1000, min_free_bytes=0)
+    cache.put("a", torch.zeros(100))  # 400 字节
+    cache.put("b", torch.zeros(100))
+    cache.get("a")
+    cache.put("c", torch.zeros(100))
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.total_bytes == 800
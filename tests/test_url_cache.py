@@ -0,0 +1,117 @@
+import os
+import threading
+
+import pytest
+
+from conftest import load
+
+
+def test_revalidates_with_conditional_request(server, cache):
+    server.add_file("a.bin", b"a" * 1000)
+    url = server.url("a.bin")
+    first = cache.fetch(url)
+    requests = server.stats()["requests"]
+
+    second = cache.fetch(url)
+    assert server.stats()["requests"] == requests + 1  # 304
+    assert second.path == first.path and second.sha256 == first.sha256
+
+    server.add_file("a.bin", b"b" * 1200)
+    changed = cache.fetch(url)
+    assert changed.size == 1200 and changed.sha256 != first.sha256
+    with open(changed.path, "rb") as f:
+        assert f.read() == b"b" * 1200
+
+
+def test_without_validators_downloads_again(server, cache):
+    server.add_file("a.bin", b"a" * 1000)
+    url = server.url("a.bin", etag=0)
+    cache.fetch(url)
+    sent = server.stats()["bytes_sent"]
+    cache.fetch(url)
+    assert server.stats()["bytes_sent"] - sent >= 1000
+
+
+def test_evicts_least_recently_used(server, tmp_path):
+    cache = load("url_cache").URLCache(root=str(tmp_path / "cache"), max_bytes=2500)
+    for name in ("a", "b", "c"):
+        server.add_file(name, name.encode() * 1000)
+    a = cache.fetch(server.url("a"))
+    b = cache.fetch(server.url("b"))
+    cache.fetch(server.url("a"))  # a 最近使用过，淘汰 b
+    cache.fetch(server.url("c"))
+    assert cache.lookup(server.url("a")).path == a.path
+    assert cache.lookup(server.url("b")) is None
+    assert not os.path.exists(b.path)
+
+
+def test_shared_blob_survives_eviction_of_one_url(server, tmp_path):
+    cache = load("url_cache").URLCache(root=str(tmp_path / "cache"), max_bytes=3500)
+    server.add_file("a", b"x" * 1000)
+    server.add_file("b", b"y" * 2000)
+    server.add_file("c", b"z" * 1000)
+    first = cache.fetch(server.url("a", n=1))
+    cache.fetch(server.url("a", n=2))
+    cache.fetch(server.url("b"))
+    cache.fetch(server.url("a", n=2))
+    cache.fetch(server.url("c"))
+    # 淘汰最早的 a?n=1 时内容仍被 a?n=2 引用，文件保留；之后淘汰 b
+    assert cache.lookup(server.url("a", n=1)) is None
+    assert cache.lookup(server.url("b")) is None
+    assert cache.lookup(server.url("a", n=2)).path == first.path
+    assert os.path.exists(first.path)
+
+
+@pytest.mark.parametrize("chunked", [0, 1])
+def test_max_bytes_aborts_download(server, cache, chunked):
+    server.add_file("big.bin", b"x" * 300_000)
+    url = server.url("big.bin", chunked=chunked)
+    with pytest.raises(ValueError, match="too large"):
+        cache.fetch(url, max_bytes=100_000)
+    assert cache.lookup(url) is None
+
+
+def test_max_bytes_applies_to_cached_entries(server, cache):
+    server.add_file("big.bin", b"x" * 300_000)
+    url = server.url("big.bin")
+    cache.fetch(url)
+    with pytest.raises(ValueError, match="too large"):
+        cache.fetch(url, max_bytes=100_000)  # 304
+    cache.mark_fresh(url, 60)
+    with pytest.raises(ValueError, match="too large"):
+        cache.fetch(url, max_bytes=100_000)  # 免校验有效期内
+    assert cache.fetch(url).size == 300_000
+
+
+def test_concurrent_requests_download_once(server, cache):
+    server.add_file("a.bin", b"a" * 200_000)
+    url = server.url("a.bin", latency=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.fetch(url))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({entry.sha256 for entry in results}) == 1
+    assert server.stats()["requests"] == 1
+
+
+def test_different_limits_do_not_share_a_download(server, cache):
+    server.add_file("a.bin", b"a" * 200_000)
+    url = server.url("a.bin", latency=0.2)
+    results = {}
+
+    def fetch(name, max_bytes):
+        try:
+            results[name] = cache.fetch(url, max_bytes=max_bytes).size
+        except ValueError as e:
+            results[name] = e
+
+    threads = [threading.Thread(target=fetch, args=("small", 1000)),
+               threading.Thread(target=fetch, args=("unlimited", 0))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert isinstance(results["small"], ValueError)
+    assert results["unlimited"] == 200_000
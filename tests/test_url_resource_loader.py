@@ -0,0 +1,37 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+from PIL import Image
+
+from conftest import load_comfy
+
+url_resource_loader = load_comfy("url_resource_loader")
+
+
+@pytest.fixture
+def node(monkeypatch):
+    monkeypatch.setattr(url_resource_loader, "MAX_IMAGE_BYTES", 100_000)
+    monkeypatch.setattr(url_resource_loader, "DOWNLOAD_MAX_BYTES", 0)
+    return url_resource_loader.URLResourceLoader()
+
+
+def test_image_cap_does_not_apply_to_audio(server, node):
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros((8000 * 20, 1), dtype=np.float32), 8000, format="WAV", subtype="PCM_16")
+    server.add_file("a.wav", buffer.getvalue(), "audio/wav")
+    _, audio, info = node.load_from_url(server.url("a.wav"), 10)
+    assert audio is not None, info
+    assert audio["waveform"].shape == (1, 8000 * 20)
+
+
+def test_image_cap_aborts_image_download(server, node):
+    pixels = np.random.default_rng(0).integers(0, 255, (400, 400, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    server.add_file("a.png", buffer.getvalue(), "image/png")
+    url = server.url("a.png")
+    image, _, info = node.load_from_url(url, 10)
+    assert image is None and "too large" in info
+    assert load_comfy("url_cache").get_cache().lookup(url) is None
@@ -0,0 +1,107 @@
+"""
+输出目录监视（边生成边上传）
+任务开始时监视 output_dir/<subfolder>，新文件写入完成后立即提交上传，
+上传节点执行时只需等待剩余的上传完成，上传时间大部分隐藏在生成过程中
+
+写入完成的判断：文件大小和修改时间连续多次轮询不再变化（轮询方式，不依赖 inotify，跨平台可用）
+提交上传后文件又发生变化（写入中途暂停超过判断时间）时，再次写完后重新上传，覆盖之前上传的内容
+
+环境变量：
+    URL_LOADER_OSS_WATCH_INTERVAL     轮询间隔（秒，默认 1）
+    URL_LOADER_OSS_WATCH_QUIET_POLLS  视为写入完成所需的连续无变化轮询次数（默认 3）
+    URL_LOADER_OSS_WATCH_MAX_SECONDS  监视的最长时间（秒，默认 21600；任务失败未执行上传节点时自动停止）
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+POLL_INTERVAL = float(os.environ.get("URL_LOADER_OSS_WATCH_INTERVAL", 1.0))
+QUIET_POLLS = max(1, int(os.environ.get("URL_LOADER_OSS_WATCH_QUIET_POLLS", 3)))
+MAX_WATCH_SECONDS = float(os.environ.get("URL_LOADER_OSS_WATCH_MAX_SECONDS", 6 * 3600))
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """文件的 (大小, 修改时间)，文件不存在时为 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def scan_directory(directory: str) -> Dict[str, Tuple[int, int]]:
+    """返回目录（含子目录）中的 {文件路径: (大小, 修改时间)}，目录不存在时为空"""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            signature = file_signature(path)
+            if signature is not None:
+                files[path] = signature
+    return files
+
+
+class DirectoryWatcher:
+    """
+    轮询监视目录（含子目录）中新出现的文件，写入完成后调用 submit(path, previous) 提交上传
+    监视开始时已存在且之后未被修改的文件不会提交（since_ns 之后修改的文件除外，用于监视晚于任务开始时启动的情况）；
+    提交后又被修改的文件再次写完后重新提交，
+    previous 为该文件上一次提交的上传（None 表示首次提交），重新提交的上传应在其完成后再开始
+    """
+
+    def __init__(self, directory: str, submit: Callable[[str, Optional[Future]], Future],
+                 poll_interval: float = POLL_INTERVAL, max_seconds: float = MAX_WATCH_SECONDS,
+                 quiet_polls: int = QUIET_POLLS, since_ns: int = 0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.quiet_polls = quiet_polls
+        self.started = time.monotonic()
+        self.expires = self.started + max_seconds
+        self.futures: Dict[str, Future] = {}
+        self.submitted: Dict[str, Tuple[int, int]] = {}  # 文件路径 -> 最近一次提交时的 (大小, 修改时间)
+        self._submit = submit
+        self._existing = {path: signature for path, signature in scan_directory(directory).items()
+                          if not since_ns or signature[1] < since_ns}
+        self._pending: Dict[str, Tuple[Tuple[int, int], int]] = {}  # 文件路径 -> (大小和修改时间, 连续无变化次数)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="oss-upload-watcher", daemon=True)
+        self._thread.start()
+
+    def _poll(self, final: bool = False):
+        for path, signature in scan_directory(self.directory).items():
+            if self._existing.get(path) == signature or self.submitted.get(path) == signature:
+                continue
+            # 连续 quiet_polls 次轮询没有变化视为写入完成；final 时图已执行完，剩余文件都已写完
+            seen, quiet = self._pending.get(path, (None, -1))
+            quiet = quiet + 1 if seen == signature else 0
+            if final or quiet >= self.quiet_polls:
+                self._pending.pop(path, None)
+                self.futures[path] = self._submit(path, self.futures.get(path))
+                self.submitted[path] = signature
+            else:
+                self._pending[path] = (signature, quiet)
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval) and time.monotonic() < self.expires:
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"[OSS_Upload] 输出目录监视出错: {e}")
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def stop(self):
+        """停止监视（不再提交新文件）"""
+        self._stop.set()
+        self._thread.join()
+
+    def finish(self) -> Dict[str, Future]:
+        """停止监视并提交剩余文件（含提交后又被修改的文件），返回 {文件路径: 最后一次上传的结果Future}"""
+        self.stop()
+        self._poll(final=True)
+        return dict(self.futures)
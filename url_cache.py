@@ -0,0 +1,319 @@
+"""
+URL资源下载缓存（内容寻址的磁盘缓存）
+所有URL加载节点（图片/音频/视频/通用资源）共用同一缓存层：
+- 下载内容按 SHA-256 存储，相同内容只保存一份
+- 再次请求时使用 ETag / Last-Modified 发送条件请求，304 直接复用本地文件
+- 总容量超过上限时按 LRU（最近最少使用）淘汰
+- 预取（见 prefetch）刚校验过的记录在有效期内直接使用，不再发送条件请求
+
+环境变量：
+    URL_LOADER_CACHE_DIR        缓存目录（默认 ~/.cache/comfyui-url-resource-loader）
+    URL_LOADER_CACHE_MAX_BYTES  缓存容量上限（字节，默认 10GB）
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Mapping, Callable
+from urllib.parse import urlparse
+
+from . import metrics
+from .http_fetch import open_stream
+from .single_flight import downloads, normalize_url
+
+CACHE_DIR = os.environ.get("URL_LOADER_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "comfyui-url-resource-loader"
+)
+CACHE_MAX_BYTES = int(os.environ.get("URL_LOADER_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+STREAM_CHUNK_SIZE = 64 * 1024  # 下载分块（64KB，便于边下载边解码）
+
+
+@dataclass
+class CacheEntry:
+    """缓存命中/写入后的结果，path 指向本地缓存文件"""
+    url: str
+    path: str
+    sha256: str
+    size: int
+    content_type: str = ""
+    etag: str = ""
+    last_modified: str = ""
+
+
+def url_extension(url: str) -> str:
+    """从URL路径中提取扩展名（用于缓存文件命名，便于解码器识别格式）"""
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    if 1 < len(ext) <= 8 and ext[1:].isalnum():
+        return ext
+    return ""
+
+
+class URLCache:
+    """内容寻址的URL下载缓存（线程安全）"""
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, "blobs")
+        self.staging_dir = os.path.join(root, "staging")
+        self.index_path = os.path.join(root, "index.json")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        self._fresh: Dict[str, float] = {}  # url -> 免校验截止时间（time.monotonic）
+
+    # ---------------------------
+    # 索引读写
+    # ---------------------------
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        # 先写临时文件再原子替换，避免进程中断导致索引损坏
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _entry(self, url: str, record: Dict[str, Any]) -> CacheEntry:
+        return CacheEntry(
+            url=url,
+            path=os.path.join(self.blob_dir, record["blob"]),
+            sha256=record["sha256"],
+            size=record["size"],
+            content_type=record.get("content_type", ""),
+            etag=record.get("etag", ""),
+            last_modified=record.get("last_modified", ""),
+        )
+
+    # ---------------------------
+    # 缓存查询 / 写入
+    # ---------------------------
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """查询URL对应的缓存记录（缓存文件已被删除时视为未命中）"""
+        with self._lock:
+            record = self._index.get(url)
+            if record is None:
+                return None
+            if not os.path.exists(os.path.join(self.blob_dir, record["blob"])):
+                del self._index[url]
+                self._save_index()
+                return None
+            return self._entry(url, record)
+
+    @staticmethod
+    def validator_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """根据缓存记录构建条件请求头"""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def touch(self, url: str) -> Optional[CacheEntry]:
+        """条件请求返回 304 时调用：刷新访问时间并返回缓存记录"""
+        with self._lock:
+            record = self._index.get(url)
+            if record is None:
+                return None
+            record["last_access"] = time.time()
+            self._save_index()
+            return self._entry(url, record)
+
+    def mark_fresh(self, url: str, seconds: float):
+        """标记URL的缓存记录刚校验过：seconds 秒内的下载请求直接使用缓存文件"""
+        with self._lock:
+            self._fresh[url] = time.monotonic() + seconds
+
+    def fresh_entry(self, url: str) -> Optional[CacheEntry]:
+        """免校验有效期内的缓存记录（未标记、已过期或缓存文件已被删除时返回 None）"""
+        with self._lock:
+            deadline = self._fresh.get(url)
+            if deadline is None:
+                return None
+            if deadline < time.monotonic():
+                del self._fresh[url]
+                return None
+        return self.touch(url) if self.lookup(url) is not None else None
+
+    def staging_path(self, suffix: str = "") -> str:
+        """创建一个下载中转文件（与缓存文件同一文件系统，提交时可直接重命名）"""
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, suffix=suffix)
+        os.close(fd)
+        return path
+
+    def partial_path(self, url: str) -> str:
+        """可断点续传的下载中转文件路径（同一URL固定，中断后再次下载可继续）"""
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.staging_dir, f"{name}.part")
+
+    def commit(self, url: str, staging_path: str, response_headers: Mapping[str, str],
+               sha256: Optional[str] = None) -> CacheEntry:
+        """将下载完成的中转文件存入缓存（按内容哈希去重）"""
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(staging_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+
+        blob = f"{sha256}{url_extension(url)}"
+        blob_path = os.path.join(self.blob_dir, blob)
+        size = os.path.getsize(staging_path)
+
+        with self._lock:
+            if os.path.exists(blob_path):
+                # 相同内容已存在，丢弃本次下载的副本
+                os.unlink(staging_path)
+            else:
+                os.replace(staging_path, blob_path)
+
+            self._index[url] = {
+                "blob": blob,
+                "sha256": sha256,
+                "size": size,
+                "content_type": response_headers.get("Content-Type", "") or "",
+                "etag": response_headers.get("ETag", "") or "",
+                "last_modified": response_headers.get("Last-Modified", "") or "",
+                "last_access": time.time(),
+            }
+            self._evict(keep=url)
+            self._save_index()
+            return self._entry(url, self._index[url])
+
+    def _evict(self, keep: str):
+        """按最近访问时间淘汰，直到缓存总大小不超过上限（调用方需持有锁）"""
+        blob_sizes: Dict[str, int] = {}
+        for record in self._index.values():
+            blob_sizes[record["blob"]] = record["size"]
+        total = sum(blob_sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        for url, record in sorted(self._index.items(), key=lambda item: item[1].get("last_access", 0)):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            del self._index[url]
+            blob = record["blob"]
+            # 同一内容可能被多个URL引用，只有最后一个引用被淘汰时才删除文件
+            if any(r["blob"] == blob for r in self._index.values()):
+                continue
+            try:
+                os.unlink(os.path.join(self.blob_dir, blob))
+            except OSError:
+                pass
+            total -= blob_sizes.get(blob, 0)
+
+    # ---------------------------
+    # 同步下载（图片/音频/通用加载节点使用）
+    # ---------------------------
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None,
+              verify: bool = True, max_bytes: int = 0,
+              on_chunk: Optional[Callable[[bytes], None]] = None) -> CacheEntry:
+        """
+        下载URL到缓存（已缓存时发送条件请求重新校验），经共享连接池发起请求
+        同一URL（且 verify、max_bytes 相同）的并发请求只下载一次，其余请求等待并共享结果
+
+        Args:
+            max_bytes: 下载大小上限（0表示不限制），超出时立即中止下载
+            on_chunk: 每收到一个数据块时回调（用于边下载边解码），缓存命中或共享他人下载结果时不会调用
+        """
+        return downloads.do(self.flight_key(url, verify, max_bytes), self._fetch,
+                            url, headers, timeout, verify, max_bytes, on_chunk)
+
+    def flight_key(self, url: str, verify: bool = True, max_bytes: int = 0):
+        """
+        并发下载去重的键（同一缓存目录 + 规范化URL + 证书校验和大小上限）
+        限制不同的请求不共享结果：不校验证书的下载不能交给要求校验的请求，
+        上限较小的请求失败也不能让上限较大的请求一同失败
+        """
+        return (self.root, normalize_url(url), bool(verify), max_bytes or 0)
+
+    def _fetch(self, url: str, headers: Optional[Dict[str, str]], timeout: Optional[float],
+               verify: bool, max_bytes: int, on_chunk: Optional[Callable[[bytes], None]]) -> CacheEntry:
+        fresh = self.fresh_entry(url)
+        if fresh is not None:
+            return _within_limit(fresh, max_bytes)
+        cached = self.lookup(url)
+        request_headers = dict(headers or {})
+        request_headers.update(self.validator_headers(cached))
+
+        with open_stream(url, headers=request_headers, timeout=timeout, verify=verify) as response:
+            if response.status_code == 304 and cached is not None:
+                return _within_limit(self.touch(url) or cached, max_bytes)
+            response.raise_for_status()
+
+            content_length = response.headers.get("Content-Length", "")
+            if max_bytes and content_length.isdigit() and int(content_length) > max_bytes:
+                raise ValueError(f"Resource too large: {int(content_length)} bytes (limit {max_bytes} bytes)")
+
+            staging_path = self.staging_path()
+            digest = hashlib.sha256()
+            downloaded = 0
+            decode_time = 0.0
+            started = time.perf_counter()
+            try:
+                with open(staging_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        downloaded += len(chunk)
+                        if max_bytes and downloaded > max_bytes:
+                            raise ValueError(f"Resource too large: exceeded limit of {max_bytes} bytes")
+                        f.write(chunk)
+                        digest.update(chunk)
+                        if on_chunk is not None:
+                            chunk_started = time.perf_counter()
+                            on_chunk(chunk)
+                            decode_time += time.perf_counter() - chunk_started
+            except BaseException:
+                try:
+                    os.unlink(staging_path)
+                except OSError:
+                    pass
+                raise
+            finally:
+                # 边下载边解码的耗时计入 decode，其余为接收数据
+                metrics.record("body", time.perf_counter() - started - decode_time)
+                if decode_time:
+                    metrics.record("decode", decode_time)
+                metrics.add_bytes("download", downloaded)
+            return self.commit(url, staging_path, response.headers, sha256=digest.hexdigest())
+
+
+def _within_limit(entry: CacheEntry, max_bytes: int) -> CacheEntry:
+    """缓存命中时同样检查大小上限（缓存可能由不限制大小的调用方写入）"""
+    if max_bytes and entry.size > max_bytes:
+        raise ValueError(f"Resource too large: {entry.size} bytes (limit {max_bytes} bytes)")
+    return entry
+
+
+_cache: Optional[URLCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> URLCache:
+    """获取进程内共享的缓存实例"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = URLCache()
+        return _cache
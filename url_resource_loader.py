@@ -1,17 +1,68 @@
-import requests
+import os
 import numpy as np
 import torch
 import io
 from PIL import Image
-import soundfile as sf
-import os
-import tempfile
 import folder_paths  # ComfyUI核心模块，用于路径管理
+from . import metrics
+from .url_cache import get_cache
+from .image_decode import StreamingImageDecoder, MAX_IMAGE_BYTES
+from .image_tensor import OUTPUT_DTYPES, resolve_dtype, pil_to_tensor
+from .tensor_cache import outputs as output_cache
 
 # 确保中文路径和特殊字符正常处理
 import PIL.Image
 PIL.Image.MAX_IMAGE_PIXELS = None
 
+# 音频分块解码的帧数（每块只占用 块大小 x 原声道数 的float32内存）
+AUDIO_BLOCK_FRAMES = 256 * 1024
+
+# 音频（非图片内容）的下载大小上限（字节，默认0表示不限制）；图片内容仍受 URL_LOADER_MAX_IMAGE_BYTES 限制
+MAX_AUDIO_BYTES = int(os.environ.get("URL_LOADER_MAX_AUDIO_BYTES", 0))
+
+# 下载前无法区分图片和音频：下载时使用两者中较大的上限（任一为0即不限制），识别出图片后再按图片上限中止
+DOWNLOAD_MAX_BYTES = max(MAX_IMAGE_BYTES, MAX_AUDIO_BYTES) if MAX_IMAGE_BYTES and MAX_AUDIO_BYTES else 0
+
+
+class _ImageSizeGuard:
+    """下载回调：边下载边增量解码，数据识别为图片后超过 MAX_IMAGE_BYTES 时中止下载"""
+
+    def __init__(self, decoder):
+        self.decoder = decoder
+        self.received = 0
+
+    def __call__(self, chunk):
+        self.decoder(chunk)
+        self.received += len(chunk)
+        if MAX_IMAGE_BYTES and self.decoder.format and self.received > MAX_IMAGE_BYTES:
+            raise ValueError(f"Resource too large: exceeded image limit of {MAX_IMAGE_BYTES} bytes")
+
+
+def read_audio_channels(file, channels, block_frames=AUDIO_BLOCK_FRAMES):
+    """
+    分块解码音频为 float32 [channels, frames] 张量
+    输出缓冲区一次性分配，声道转换（多转单取平均、单转立体声复制、多转立体声取前两个声道）在逐块写入时完成
+    """
+    import soundfile as sf  # 导入较慢，首次解码音频时才导入
+    with sf.SoundFile(file) as f:
+        sample_rate = f.samplerate
+        out = torch.empty((channels, f.frames), dtype=torch.float32)
+        block = np.empty((min(block_frames, max(f.frames, 1)), f.channels), dtype=np.float32)
+        pos = 0
+        while pos < f.frames:
+            data = torch.from_numpy(f.read(out=block[:f.frames - pos]))
+            n = data.shape[0]
+            if n == 0:
+                break
+            if channels == 1 and data.shape[1] > 1:
+                torch.mean(data, dim=1, out=out[0, pos:pos + n])
+            else:
+                # 单声道广播到所有输出声道；多声道取前 channels 个声道
+                out[:, pos:pos + n] = data[:, :channels].T
+            pos += n
+    return out[:, :pos], sample_rate
+
+
 # 注册节点
 class URLResourceLoader:
     """从URL加载图片或音频资源的ComfyUI节点"""
@@ -46,6 +97,10 @@ class URLResourceLoader:
                 "audio_channels": (["1", "2"], {
                     "default": "1",
                     "description": "输出音频声道数：1=单声道（推荐），2=立体声"
+                }),
+                "image_dtype": (list(OUTPUT_DTYPES), {
+                    "default": "float32",
+                    "description": "输出图片张量精度：float16/bfloat16 可节省一半内存（需下游节点支持）"
                 })
             }
         }
@@ -56,60 +111,51 @@ class URLResourceLoader:
     CATEGORY = "mixlab/URL Loader"
     DESCRIPTION = "从URL加载图片或音频文件，自动识别类型并转换为ComfyUI可用格式"
 
-    def load_from_url(self, url, timeout, audio_output_format="dict", audio_channels="1"):
+    @metrics.instrument("URLResourceLoader", "url")
+    def load_from_url(self, url, timeout, audio_output_format="dict", audio_channels="1", image_dtype="float32"):
         """核心函数：从URL加载资源"""
+        import requests  # 导入较慢，首次执行时才导入
         try:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
             
-            response = requests.get(url, headers=headers, timeout=timeout, stream=True)
-            response.raise_for_status()
+            # 下载到共享缓存（重复URL仅发送条件请求校验），图片数据边下载边增量解码
+            # 音频不受图片大小上限限制：数据识别为图片后才按 URL_LOADER_MAX_IMAGE_BYTES 中止下载
+            decoder = StreamingImageDecoder()
+            entry = get_cache().fetch(url, headers=headers, timeout=timeout, max_bytes=DOWNLOAD_MAX_BYTES,
+                                      on_chunk=_ImageSizeGuard(decoder))
+            streamed_image = decoder.close()
+            
+            # 内容与参数都未变化时直接复用上次的输出（跳过解码和格式转换）
+            cache_key = ("URLResourceLoader", url, entry.sha256, audio_output_format, audio_channels, image_dtype)
+            cached = output_cache.get(cache_key)
+            if cached is not None:
+                return self._with_timing(cached)
             
-            content_type = response.headers.get('content-type', '')
+            content_type = entry.content_type
             
             image_tensor = None
             audio_output = None
             info = ""
 
-            # 处理图片
+            # 处理图片（缓存命中或共享下载时没有经过下载回调，在此检查图片大小上限）
             if 'image' in content_type:
-                image = Image.open(io.BytesIO(response.content)).convert("RGB")
-                image_np = np.array(image).astype(np.float32) / 255.0
-                image_tensor = torch.from_numpy(image_np).unsqueeze(0).permute(0, 3, 1, 2)
+                if MAX_IMAGE_BYTES and entry.size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Resource too large: {entry.size} bytes (limit {MAX_IMAGE_BYTES} bytes)")
+                with metrics.phase("decode"):
+                    image = (streamed_image or Image.open(entry.path)).convert("RGB")
+                # ComfyUI标准图片张量格式 [B,H,W,C]
+                image_tensor = pil_to_tensor(image, resolve_dtype(image_dtype)).unsqueeze(0)
                 info = f"✅ 图片加载成功\n地址：{url}\n尺寸：{image.size} (宽x高)"
                 
             # 处理音频 - 完整修复维度和声道数问题
             elif 'audio' in content_type or any(ext in url.lower() for ext in ['.mp3', '.wav', '.flac', '.ogg', '.m4a']):
-                temp_dir = folder_paths.get_temp_directory()
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav', dir=temp_dir) as temp_file:
-                    temp_file.write(response.content)
-                    temp_file_path = temp_file.name
-                
-                # 读取音频数据
-                audio_data, sample_rate = sf.read(temp_file_path)
+                # 直接从缓存文件分块解码为float32，并在写入 [channels, frames] 缓冲区时完成声道转换
                 target_channels = int(audio_channels)
-                
-                # 步骤1：标准化音频数据维度（确保是2维：[samples, channels]）
-                if len(audio_data.shape) == 1:
-                    # 单声道：[samples] -> [samples, 1]
-                    audio_data = audio_data.reshape(-1, 1)
-                # 步骤2：调整声道数到目标值（1或2）
-                if audio_data.shape[1] != target_channels:
-                    if target_channels == 1:
-                        # 多声道转单声道：取平均值
-                        audio_data = np.mean(audio_data, axis=1, keepdims=True)
-                    elif target_channels == 2:
-                        # 单声道转立体声：复制声道
-                        if audio_data.shape[1] == 1:
-                            audio_data = np.repeat(audio_data, 2, axis=1)
-                        else:
-                            # 多声道转立体声：取前两个声道
-                            audio_data = audio_data[:, :2]
-                
-                # 步骤3：转换为ComfyUI标准张量格式 [channels, frames]
-                # 原始audio_data是 [samples, channels]，需要转置为 [channels, samples]
-                audio_waveform = torch.from_numpy(audio_data.T).float()
+                with metrics.phase("decode"):
+                    audio_waveform, sample_rate = read_audio_channels(entry.path, target_channels)
+                frames = audio_waveform.shape[1]
                 
                 # 验证维度（确保是2维：[channels, frames]）
                 assert len(audio_waveform.shape) == 2, f"音频张量维度错误，应为2维，实际：{audio_waveform.shape}"
@@ -120,7 +166,7 @@ class URLResourceLoader:
                     audio_output = {
                         "waveform": audio_waveform,  # 2维张量：[channels, frames]
                         "sample_rate": sample_rate,
-                        "duration": audio_data.shape[0] / sample_rate,
+                        "duration": frames / sample_rate,
                         "channels": target_channels  # 明确指定声道数
                     }
                 else:
@@ -131,19 +177,19 @@ class URLResourceLoader:
                     f"✅ 音频加载成功\n"
                     f"地址：{url}\n"
                     f"采样率：{sample_rate}Hz\n"
-                    f"时长：{audio_data.shape[0]/sample_rate:.2f}秒\n"
+                    f"时长：{frames/sample_rate:.2f}秒\n"
                     f"声道数：{target_channels}\n"
                     f"张量维度：{audio_waveform.shape} (channels, frames)\n"
                     f"输出格式：{audio_output_format}"
                 )
                 
-                # 清理临时文件
-                os.unlink(temp_file_path)
-                
             else:
                 info = f"❌ 不支持的文件类型\nContent-Type：{content_type}\n请确认URL指向图片或音频文件"
+                return self._with_timing((image_tensor, audio_output, info))
 
-            return (image_tensor, audio_output, info)
+            result = (image_tensor, audio_output, info)
+            output_cache.put(cache_key, result)
+            return self._with_timing(result)
 
         except requests.exceptions.Timeout:
             return (None, None, f"❌ 请求超时\n超时时间：{timeout}秒\n地址：{url}")
@@ -154,6 +200,15 @@ class URLResourceLoader:
         except Exception as e:
             return (None, None, f"❌ 资源处理失败\n错误信息：{str(e)}\n地址：{url}")
 
+    @staticmethod
+    def _with_timing(result):
+        """在加载信息末尾附加本次调用的各阶段耗时（缓存的输出不含耗时，每次调用单独附加）"""
+        image_tensor, audio_output, info = result
+        timer = metrics.current()
+        if timer is None:
+            return result
+        return (image_tensor, audio_output, f"{info}\n耗时：{timer.format()}")
+
 # 节点映射表（供__init__.py导入）
 NODE_CLASS_MAPPINGS = {
     "URLResourceLoader": URLResourceLoader